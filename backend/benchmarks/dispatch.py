@@ -0,0 +1,76 @@
+'''Measures the overhead of dispatching a socket.io event to a server command.
+
+The reflective dispatch which was used before commands were compiled at
+registration is reproduced here so that both can be compared against the same
+command. Run from the `backend/` directory:
+
+    python benchmarks/dispatch.py
+'''
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable
+import inspect
+import sys
+import timeit
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from roller_derby.bout import TEAMS  # noqa: E402
+from server import URI, ClientException, _Command  # noqa: E402
+
+
+async def setTrip(uri: URI, team: TEAMS, tripNum: int, points: int,
+                  timestamp: datetime, validPass: bool = True) -> None:
+    pass  # Only the dispatch overhead is measured
+
+
+def reflectiveDispatch(func: Callable, json: dict[str, Any]) -> None:
+    if 'uri' in json.keys() and isinstance(json['uri'], dict):
+        rawURI: dict[str, Any] = json['uri']
+        if 'bout' not in rawURI:
+            raise ClientException('bout must be specified')
+        period: int = rawURI['period'] if 'period' in rawURI else -1
+        jam: int = rawURI['jam'] if 'jam' in rawURI else -1
+        json['uri'] = URI(rawURI['bout'], period, jam)
+    params: set[str] = set(
+        [param.name for param in inspect.signature(func).parameters.values()]
+    )
+    json = {k: v for k, v in json.items() if k in params}
+    try:
+        func(**json).send(None)
+    except StopIteration:
+        pass
+
+
+def compiledDispatch(command: _Command, json: dict[str, Any]) -> None:
+    try:
+        command.func(**command.bind(json)).send(None)
+    except StopIteration:
+        pass
+
+
+def getPayload() -> dict[str, Any]:
+    return {
+        'uri': {'bout': 'c2f4', 'period': 0, 'jam': 3},
+        'team': 'home',
+        'tripNum': 2,
+        'points': 4,
+        'timestamp': datetime.now(),
+        'session': 'abcdef',
+    }
+
+
+if __name__ == '__main__':
+    number: int = 100_000
+    command: _Command = _Command.compile('setTrip', setTrip)
+    results: dict[str, float] = {
+        'reflective': min(timeit.repeat(
+            lambda: reflectiveDispatch(setTrip, getPayload()),
+            number=number, repeat=5)),
+        'compiled': min(timeit.repeat(
+            lambda: compiledDispatch(command, getPayload()),
+            number=number, repeat=5)),
+    }
+    for name, seconds in results.items():
+        print(f'{name:>10}: {seconds / number * 1e6:.2f} us per dispatch')
+    print(f'   speedup: {results['reflective'] / results['compiled']:.1f}x')
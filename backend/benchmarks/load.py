@@ -0,0 +1,368 @@
+'''Generates a synthetic game load against a local server and reports how well
+it keeps up.
+
+A server is started in a subprocess with the commands of `main.py` and
+`scoreApi.py`. Headless Socket.IO clients then play a game against it: a jam
+timer starts and stops jams and calls timeouts, scorekeepers enter and correct
+trips, and displays query the bout and the current jam while receiving every
+broadcast. All random choices are seeded, so runs with the same arguments send
+the same command mix and can be compared between releases.
+
+The report contains the round-trip latency of each command, the delivery lag
+of broadcasts to the displays, and the CPU time used by the server. The
+clients run in this process, which should have a core of its own. Requires
+the Socket.IO client dependencies (`aiohttp`). Run from the `backend/`
+directory, e.g.:
+
+    python benchmarks/load.py --scorekeepers 4 --displays 50 --duration 30
+'''
+from __future__ import annotations
+from argparse import SUPPRESS, ArgumentParser, Namespace
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+import asyncio
+import json
+import os
+import random
+import resource
+import socketio
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+
+@dataclass
+class Game:
+    '''The state of the game as seen by the clients.'''
+    jam: int = 0
+    running: bool = False
+    trips: dict[str, int] = field(
+        default_factory=lambda: {'home': 0, 'away': 0})
+
+
+@dataclass
+class Results:
+    '''The measurements collected during a run.'''
+    latencies: dict[str, list[float]] = field(default_factory=dict)
+    errors: dict[str, int] = field(default_factory=dict)
+    sent: list[tuple[float, str]] = field(default_factory=list)
+    arrivals: list[dict[str, list[float]]] = field(default_factory=list)
+
+
+class Client:
+    '''A headless Socket.IO client which times its commands.'''
+
+    def __init__(self, results: Results) -> None:
+        self._socket: socketio.AsyncClient = socketio.AsyncClient()
+        self._results: Results = results
+        # Reply to the clock probes of the server
+        self._socket.on('clock', lambda *_: time.time() * 1000)
+
+    async def connect(self, url: str, auth: dict[str, Any]) -> None:
+        await self._socket.connect(url, transports=['websocket'], auth=auth)
+
+    async def disconnect(self) -> None:
+        await self._socket.disconnect()
+
+    def track(self, events: tuple[str, ...]) -> None:
+        '''Records the arrival time of each broadcast of the given events.'''
+        arrivals: dict[str, list[float]] = {event: [] for event in events}
+        self._results.arrivals.append(arrivals)
+        for event in events:
+            # Bind the event name of this iteration to the handler
+            def handler(*_: Any, event: str = event) -> None:
+                arrivals[event.removesuffix('Delta')].append(
+                    time.perf_counter())
+            self._socket.on(event, handler)
+            self._socket.on(f'{event}Delta', handler)
+
+    async def call(self, command: str, broadcast: None | str = None,
+                   **payload: Any) -> bool:
+        '''Sends a command and waits for its response.
+
+        Args:
+            command (str): The name of the command.
+            broadcast (None | str, optional): The event which the command
+            causes to be broadcast, used to measure the delivery lag. Defaults
+            to None.
+            payload (Any): The arguments of the command.
+
+        Returns:
+            bool: True if the command succeeded.
+        '''
+        start: float = time.perf_counter()
+        if broadcast is not None:
+            self._results.sent.append((start, broadcast))
+        response: dict[str, Any] = await self._socket.call(
+            command, {'clientTime': time.time() * 1000, **payload},
+            timeout=30)
+        self._results.latencies.setdefault(command, []).append(
+            time.perf_counter() - start)
+        if response['status'] != 'ok':
+            self._results.errors[command] = (
+                self._results.errors.get(command, 0) + 1)
+            return False
+        return True
+
+
+def getURI(jam: int) -> dict[str, Any]:
+    return {'bout': '', 'period': 0, 'jam': jam}
+
+
+async def pause(seconds: float, deadline: float) -> bool:
+    '''Sleeps for a number of seconds, but not past the deadline.
+
+    Returns:
+        bool: True if the deadline has not passed.
+    '''
+    await asyncio.sleep(max(0, min(seconds, deadline - time.perf_counter())))
+    return time.perf_counter() < deadline
+
+
+async def runJamTimer(client: Client, game: Game, args: Namespace,
+                      rng: random.Random, deadline: float) -> None:
+    while time.perf_counter() < deadline:
+        game.trips = {'home': 0, 'away': 0}
+        game.running = await client.call('startJam', 'bout',
+                                         uri=getURI(game.jam))
+        await pause(args.jam_seconds, deadline)
+        game.running = False
+        await client.call('stopJam', 'bout', uri=getURI(game.jam))
+        game.jam += 1
+        if rng.random() < args.timeout_chance:
+            await client.call('callTimeout', 'bout', uri=getURI(game.jam))
+            await client.call('assignTimeout', 'bout', uri=getURI(game.jam),
+                              team=rng.choice(('home', 'away')))
+            await pause(args.lineup_seconds, deadline)
+            await client.call('endTimeout', 'bout', uri=getURI(game.jam))
+        await pause(args.lineup_seconds, deadline)
+
+
+async def runScorekeeper(client: Client, game: Game, team: str,
+                         isLead: bool, args: Namespace, rng: random.Random,
+                         deadline: float) -> None:
+    while await pause(rng.expovariate(args.trip_rate), deadline):
+        if not game.running:
+            continue
+        jam: int = game.jam
+        count: int = game.trips[team]
+        points: int = rng.choice((0, 2, 3, 4, 4, 4))
+        if isLead:
+            # The lead scorekeeper of each team enters new trips
+            if await client.call('setTrip', 'jam', uri=getURI(jam),
+                                 team=team, tripNum=count, points=points):
+                if jam == game.jam:
+                    game.trips[team] = count + 1
+        elif count > 0:
+            # The other scorekeepers correct existing trips
+            await client.call('setTrip', 'jam', uri=getURI(jam), team=team,
+                              tripNum=rng.randrange(count), points=points)
+
+
+async def runDisplay(client: Client, game: Game, args: Namespace,
+                     rng: random.Random, deadline: float) -> None:
+    if args.query_rate <= 0:
+        return
+    while await pause(rng.expovariate(args.query_rate), deadline):
+        if rng.random() < 0.5:
+            await client.call('bout', uri=getURI(game.jam))
+        else:
+            await client.call('jam', uri=getURI(game.jam))
+
+
+def getCPUSeconds(url: str, pid: int) -> float:
+    '''Gets the CPU time used by the server process and its workers. The
+    times are read from `/proc` where it exists. Elsewhere, only the time of
+    the primary process is known, which is reported by the server.
+    '''
+    proc: Path = Path('/proc')
+    if not proc.is_dir():
+        with urllib.request.urlopen(f'{url}/metrics') as response:
+            for line in response.read().decode().splitlines():
+                if line.startswith('nsobridge_cpu_seconds_total '):
+                    return float(line.split()[1])
+        return 0
+
+    # Sum the user and system times of the server and its descendants
+    times: dict[int, tuple[int, int]] = dict()
+    for path in proc.glob('[0-9]*/stat'):
+        try:
+            stat: str = path.read_text()
+        except OSError:
+            continue  # The process has exited
+        fields: list[str] = stat[stat.rindex(')') + 2:].split()
+        times[int(path.parent.name)] = (int(fields[1]),
+                                        int(fields[11]) + int(fields[12]))
+    ticks: int = 0
+    for process, (parent, used) in times.items():
+        while process != pid and parent in times:
+            process, parent = parent, times[parent][0]
+        if process == pid:
+            ticks += used
+    return ticks / os.sysconf('SC_CLK_TCK')
+
+
+def getPercentiles(values: list[float]) -> str:
+    if len(values) < 2:
+        return 'n/a'
+    quantiles: list[float] = statistics.quantiles(values, n=100,
+                                                     method='inclusive')
+    return ' '.join(f'{name}={value * 1000:7.2f}' for name, value in (
+        ('p50', quantiles[49]), ('p90', quantiles[89]),
+        ('p99', quantiles[98]), ('max', max(values))))
+
+
+def getLags(results: Results) -> list[float]:
+    '''Matches each command to the first broadcast of the event it causes
+    which each display received after the command was sent.
+    '''
+    lags: list[float] = []
+    for arrivals in results.arrivals:
+        for sent, event in results.sent:
+            times: list[float] = arrivals[event]
+            index: int = bisect_left(times, sent)
+            if index < len(times):
+                lags.append(times[index] - sent)
+    return lags
+
+
+async def run(args: Namespace, pid: int) -> dict[str, Any]:
+    url: str = f'http://127.0.0.1:{args.port}'
+    rng: random.Random = random.Random(args.seed)
+    results: Results = Results()
+    game: Game = Game()
+
+    # Connect the clients
+    timer: Client = Client(results)
+    scorekeepers: list[Client] = [Client(results)
+                                  for _ in range(args.scorekeepers)]
+    displays: list[Client] = [Client(results) for _ in range(args.displays)]
+    auth: dict[str, Any] = {'delta': args.delta, 'formats': [args.format]}
+    for client in (timer, *scorekeepers, *displays):
+        await client.connect(url, auth)
+    for display in displays:
+        display.track(('bout', 'jam'))
+
+    # Play the game
+    cpu: float = await asyncio.to_thread(getCPUSeconds, url, pid)
+    start: float = time.perf_counter()
+    deadline: float = start + args.duration
+    await asyncio.gather(
+        runJamTimer(timer, game, args, random.Random(rng.random()),
+                    deadline),
+        *(runScorekeeper(client, game, ('home', 'away')[i % 2], i < 2, args,
+                         random.Random(rng.random()), deadline)
+          for i, client in enumerate(scorekeepers)),
+        *(runDisplay(client, game, args, random.Random(rng.random()),
+                     deadline)
+          for client in displays),
+    )
+    await asyncio.sleep(0.5)  # Let the last broadcasts arrive
+    elapsed: float = time.perf_counter() - start
+    cpu = await asyncio.to_thread(getCPUSeconds, url, pid) - cpu
+
+    for client in (timer, *scorekeepers, *displays):
+        await client.disconnect()
+    return {
+        'elapsed': elapsed,
+        'cpu': cpu,
+        'latencies': results.latencies,
+        'errors': results.errors,
+        'lags': getLags(results),
+    }
+
+
+def serve(args: Namespace) -> None:
+    sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+    import main  # noqa: F401
+    import scoreApi  # noqa: F401
+    import server
+    server.log.setLevel('WARNING')
+    asyncio.run(server.serve(args.port, updateWindow=args.window,
+                             workers=args.workers))
+
+
+def startServer(args: Namespace) -> subprocess.Popen:
+    process: subprocess.Popen = subprocess.Popen([
+        sys.executable, __file__, '--serve', '--port', str(args.port),
+        '--window', str(args.window), '--workers', str(args.workers),
+    ])
+    deadline: float = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            # The index page is served once the frontend build is compressed,
+            # which would otherwise use CPU time while playing
+            urllib.request.urlopen(f'http://127.0.0.1:{args.port}/').close()
+            return process
+        except urllib.error.HTTPError:
+            return process  # The frontend isn't built
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError('the server did not start')
+
+
+if __name__ == '__main__':
+    parser: ArgumentParser = ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--duration', type=float, default=20,
+                        help='seconds of play to measure')
+    parser.add_argument('--scorekeepers', type=int, default=4)
+    parser.add_argument('--displays', type=int, default=20)
+    parser.add_argument('--trip-rate', type=float, default=2,
+                        help='trips per second entered by each scorekeeper')
+    parser.add_argument('--query-rate', type=float, default=0.2,
+                        help='queries per second sent by each display')
+    parser.add_argument('--jam-seconds', type=float, default=4)
+    parser.add_argument('--lineup-seconds', type=float, default=1)
+    parser.add_argument('--timeout-chance', type=float, default=0.2,
+                        help='probability of a timeout after each jam')
+    parser.add_argument('--delta', action='store_true',
+                        help='displays receive patches')
+    parser.add_argument('--format', default='json',
+                        choices=('json', 'msgpack'))
+    parser.add_argument('--window', type=float, default=0,
+                        help='the update window of the server')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true',
+                        help='print the results as JSON')
+    parser.add_argument('--serve', action='store_true', help=SUPPRESS)
+    args: Namespace = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        sys.exit()
+
+    server: subprocess.Popen = startServer(args)
+    try:
+        report: dict[str, Any] = asyncio.run(run(args, server.pid))
+    finally:
+        server.terminate()
+        server.wait()
+    usage: resource.struct_rusage = resource.getrusage(
+        resource.RUSAGE_CHILDREN)
+    report['cpuTotal'] = usage.ru_utime + usage.ru_stime
+
+    if args.json:
+        print(json.dumps(report))
+        sys.exit()
+    commands: int = sum(len(v) for v in report['latencies'].values())
+    print(f'{commands} commands in {report['elapsed']:.1f} s '
+          f'({commands / report['elapsed']:.0f}/s), '
+          f'{args.scorekeepers} scorekeepers, {args.displays} displays')
+    print('round-trip latency (ms):')
+    for command, values in sorted(report['latencies'].items()):
+        errors: int = report['errors'].get(command, 0)
+        print(f'  {command:>14} n={len(values):<6} {getPercentiles(values)}'
+              + (f' errors={errors}' if errors else ''))
+    print(f'broadcast lag (ms):\n  {'displays':>14} '
+          f'n={len(report['lags']):<6} {getPercentiles(report['lags'])}')
+    print(f'server cpu: {report['cpu']:.2f} s while playing '
+          f'({report['cpu'] / report['elapsed']:.0%} of a core), '
+          f'{report['cpuTotal']:.2f} s in total')
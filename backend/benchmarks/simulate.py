@@ -0,0 +1,273 @@
+'''Simulates whole bouts against the game model on a virtual clock and checks
+and reports them.
+
+The commands of `main.py` and `scoreApi.py` are applied directly, without
+clients, while a `VirtualClock` stands in for real time. Between commands the
+clock is advanced, which calls the timer alarms at exactly their deadlines, so
+a bout of two full periods runs in milliseconds with the same alarm semantics
+as a real game. Jams, trips, timeouts, and the intermission are chosen at
+random from a seed, so runs with the same arguments play the same bouts.
+
+Bouts may be played concurrently on several tracks, as at a tournament. Every
+bout is added to the series and addressed by its UUID, so the tracks check
+that the clocks and alarms of concurrent bouts don't interfere, and the rate
+of commands shows whether their cost grows with the number of bouts.
+
+Every bout is checked: its periods must end, the intermission clock must be
+stopped by its alarm at exactly its length, and the points of the trips must
+add up to the points which were entered. A batch which fails part way must
+be rolled back without broadcasting anything. The report contains the number
+of commands and alarms, the simulated game time, and how much faster than
+real time the bouts ran. Alarms are never late on a virtual clock, so the late
+alarms which are reported are those of clocks which were started after their
+alarm had passed, e.g. a lineup clock which kept running through a timeout.
+Run from the `backend/` directory, e.g.:
+
+    python benchmarks/simulate.py --bouts 1000 --tracks 3
+'''
+from __future__ import annotations
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+from typing import Any, Iterator
+import asyncio
+import heapq
+import itertools
+import json
+import random
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from clock import VirtualClock, getClock, setClock  # noqa: E402
+from roller_derby.bout import Bout, series  # noqa: E402
+from scheduler import Scheduler  # noqa: E402
+import main  # noqa: E402, F401
+import scoreApi  # noqa: E402, F401
+import server  # noqa: E402
+
+# The number of nanoseconds in a second
+SECOND: int = 1_000_000_000
+
+
+class Simulation:
+    '''Plays seeded bouts by applying commands and advancing a VirtualClock.
+    Each track waits for the clock with `sleep()`, and once every track is
+    waiting, the clock is advanced to the earliest time at which one of them
+    wakes, so the commands of concurrent bouts interleave as in real time.
+    '''
+
+    def __init__(self, args: Namespace) -> None:
+        self._args: Namespace = args
+        self._random: random.Random = random.Random(args.seed)
+        self._clock: VirtualClock = VirtualClock()
+        self.commands: int = 0
+        self.failures: list[str] = []
+        self._sleepers: list[tuple[int, int, asyncio.Future]] = []
+        self._counter: itertools.count = itertools.count()
+        setClock(self._clock)
+
+    async def call(self, command: str, **payload: Any) -> Any:
+        '''Applies a command at the current time of the clock.
+
+        Returns:
+            Any: The data of the response.
+        '''
+        response: dict[str, Any] = await server._applyCommand(
+            command, 'simulation', payload, getClock().time())
+        self.commands += 1
+        if response['status'] != 'ok':
+            raise RuntimeError(f'\'{command}\' failed: {response["error"]}')
+        return response['data']
+
+    async def sleep(self, seconds: float) -> None:
+        '''Waits until the clock has been advanced by a number of seconds.'''
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._sleepers, (
+            self._clock.now() + round(seconds * SECOND), next(self._counter),
+            future))
+        await future
+
+    async def play(self) -> None:
+        '''Plays every bout, taking the next bout on whichever track is
+        free.'''
+        numbers: Iterator[int] = iter(range(self._args.bouts))
+
+        async def playTrack() -> None:
+            for number in numbers:
+                await self.playBout(number)
+
+        tracks: list[asyncio.Task] = [asyncio.create_task(playTrack())
+                                      for _ in range(self._args.tracks)]
+        while True:
+            await asyncio.sleep(0)  # Let the tracks run until they wait
+            running: int = sum(not track.done() for track in tracks)
+            if running == 0:
+                break
+            if len(self._sleepers) < running:
+                continue
+            deadline, _, future = heapq.heappop(self._sleepers)
+            self._clock.advance(deadline - self._clock.now())
+            future.set_result(None)
+        for track in tracks:
+            track.result()  # Raise the exception of a failed track
+
+    async def playBout(self, number: int) -> None:
+        '''Plays a bout of two periods with an intermission between them.'''
+        encoding: dict[str, Any] = await self.call('addBout')
+        bout: Bout = series.getBout(encoding['uuid'])
+        bout.periodClock.setAlarm(minutes=self._args.period_minutes)
+        entered: int = 0
+        for period in (0, 1):
+            if period == 1:
+                await self.call('startIntermission', uri={'bout': bout.uuid,
+                                                          'period': 1})
+                await self.sleep(
+                    bout.intermissionClock.getAlarm().total_seconds()
+                    + self._random.uniform(0, 60))
+                if (bout.intermissionClock.isRunning()
+                        or bout.intermissionClock.getRemaining()
+                        .total_seconds() != 0):
+                    self.failures.append(f'Bout {number}: the intermission '
+                                         'clock was not stopped by its alarm')
+                # The period clock is not reset by the model between periods
+                bout.periodClock.setElapsed(seconds=0)
+            while bout.periodClock.getRemainingNanoseconds() > 0:
+                entered += await self.playJam(bout, period)
+            await self.call('endPeriod', uri={'bout': bout.uuid,
+                                              'period': period})
+            if not bout[period].isStopped():
+                self.failures.append(f'Bout {number}: period {period} did '
+                                     'not end')
+        await self.call('finalizePeriod', uri={'bout': bout.uuid,
+                                               'period': 1})
+
+        scored: int = sum(trip.points for period in bout._periods
+                          for jam in period._jams
+                          for team in ('home', 'away')
+                          for trip in jam.score[team]._trips)
+        if scored != entered:
+            self.failures.append(f'Bout {number}: {scored} points were '
+                                 f'scored instead of {entered}')
+        await self.checkRollback(number, bout)
+        await asyncio.sleep(0)  # Let the broadcasts of the bout run
+
+    async def checkRollback(self, number: int, bout: Bout) -> None:
+        '''Applies a batch which fails at its last command and checks that it
+        changes nothing and broadcasts nothing.'''
+        uri: dict[str, Any] = {'bout': bout.uuid, 'period': 0, 'jam': 0}
+        tripNum: int = len(bout[0][0].score.home._trips)
+        before: dict[str, Any] = bout.getState()
+        bouts: int = len(series.bouts)
+        pending: int = server._broadcaster.pending
+        response: dict[str, Any] = await server._applyCommand(
+            'batch', 'simulation', {'commands': [
+                {'command': 'addBout'},
+                {'command': 'setTrip', 'args': {
+                    'uri': uri, 'team': 'home', 'tripNum': tripNum,
+                    'points': 4}},
+                {'command': 'setTrip', 'args': {
+                    'uri': {**uri, 'bout': 'unknown'}, 'team': 'home',
+                    'tripNum': 0, 'points': 4}},
+            ]}, getClock().time())
+        self.commands += 1
+        if response['status'] == 'ok':
+            self.failures.append(f'Bout {number}: the failing batch was '
+                                 'applied')
+        elif (bout.getState() != before or len(series.bouts) != bouts
+                or server._broadcaster.pending != pending):
+            self.failures.append(f'Bout {number}: the failed batch was not '
+                                 'rolled back')
+
+    async def playJam(self, bout: Bout, period: int) -> int:
+        '''Plays a jam, the lineup which follows it, and perhaps a timeout.
+
+        Returns:
+            int: The number of points which were entered.
+        '''
+        uri: dict[str, Any] = {'bout': bout.uuid, 'period': period,
+                               'jam': len(bout[period]) - 1}
+        await self.call('startJam', uri=uri)
+
+        # Jams are called off or end when the jam clock runs out
+        length: float = min(self._random.uniform(15, 150),
+                            bout.jamClock.getAlarm().total_seconds())
+        points: int = 0
+        trips: dict[str, int] = {'home': 0, 'away': 0}
+        elapsed: float = 0
+        while True:
+            step: float = self._random.expovariate(self._args.trip_rate)
+            if elapsed + step >= length:
+                break
+            await self.sleep(step)
+            elapsed += step
+            team: str = self._random.choice(('home', 'away'))
+            tripPoints: int = self._random.randint(0, 4)
+            await self.call('setTrip', uri=uri, team=team,
+                            tripNum=trips[team], points=tripPoints)
+            trips[team] += 1
+            points += tripPoints
+        await self.sleep(length - elapsed)
+        await self.call('stopJam', uri=uri)
+
+        if self._random.random() < self._args.timeout_chance:
+            await self.call('callTimeout', uri=uri)
+            await self.call('assignTimeout', uri=uri,
+                            team=self._random.choice(('home', 'away')))
+            await self.sleep(60 + self._random.uniform(0, 5))
+            await self.call('endTimeout', uri=uri)
+        await self.sleep(self._random.uniform(20, 30))
+        return points
+
+
+async def run(args: Namespace) -> dict[str, Any]:
+    simulation: Simulation = Simulation(args)
+    server._state = series  # Batches are rolled back in the game state
+    start: float = time.perf_counter()
+    await simulation.play()
+    elapsed: float = time.perf_counter() - start
+    scheduler: Scheduler = Scheduler.get()
+    simulated: float = getClock().now() / SECOND
+    return {
+        'bouts': args.bouts,
+        'tracks': args.tracks,
+        'commands': simulation.commands,
+        'alarms': scheduler.stats['fired'],
+        'late_alarms': scheduler.lateness.count - scheduler.lateness
+        .getBuckets()[0][1],
+        'simulated_hours': simulated / 3600,
+        'elapsed': elapsed,
+        'speedup': simulated / elapsed,
+        'failures': simulation.failures,
+    }
+
+
+if __name__ == '__main__':
+    parser: ArgumentParser = ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--bouts', type=int, default=100)
+    parser.add_argument('--tracks', type=int, default=1,
+                        help='bouts which are played concurrently')
+    parser.add_argument('--period-minutes', type=float, default=30)
+    parser.add_argument('--trip-rate', type=float, default=0.1,
+                        help='trips per second entered during a jam')
+    parser.add_argument('--timeout-chance', type=float, default=0.1,
+                        help='probability of a timeout after each jam')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true',
+                        help='print the results as JSON')
+    args: Namespace = parser.parse_args()
+    server.log.setLevel('WARNING')
+
+    report: dict[str, Any] = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f'{report["bouts"]} bouts on {report["tracks"]} tracks, '
+              f'{report["commands"]} commands, '
+              f'{report["alarms"]} alarms ({report["late_alarms"]} late)')
+        print(f'{report["simulated_hours"]:.1f} h of play simulated in '
+              f'{report["elapsed"]:.2f} s ({report["speedup"]:.0f}x real '
+              'time)')
+        for failure in report['failures']:
+            print(f'FAILED: {failure}')
+    sys.exit(1 if len(report['failures']) > 0 else 0)
@@ -0,0 +1,222 @@
+from __future__ import annotations
+from pathlib import Path
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response
+from typing import Callable, ClassVar
+import brotli
+import gzip
+import hashlib
+import logging
+import mimetypes
+
+
+class Asset:
+    '''A file of the frontend build which is held in memory together with its
+    compressed variants, so that serving it requires no disk access, template
+    rendering, or compression.
+
+    Each variant has a strong ETag derived from the SHA-256 digest of the
+    uncompressed file, with the content coding as a suffix because the
+    variants differ byte for byte. Requests whose `If-None-Match` header
+    contains the ETag are answered with 304 Not Modified.
+    '''
+
+    # The content codings in the order in which they are preferred
+    CODINGS: ClassVar[dict[str, Callable[[bytes], bytes]]] = {
+        'br': lambda data: brotli.compress(data, quality=11),
+        'gzip': lambda data: gzip.compress(data, compresslevel=9, mtime=0),
+    }
+
+    # The prefixes of the media types which are worth compressing
+    COMPRESSIBLE: ClassVar[tuple[str, ...]] = (
+        'text/', 'application/javascript', 'application/json',
+        'application/manifest+json', 'application/wasm', 'application/xml',
+        'image/svg+xml',
+    )
+
+    # Files smaller than this many bytes are not compressed
+    MIN_SIZE: ClassVar[int] = 256
+
+    def __init__(self, data: bytes, mediaType: str, *,
+                 immutable: bool = False,
+                 precompressed: None | dict[str, bytes] = None) -> None:
+        '''Instantiates a new Asset and compresses it with every supported
+        content coding which makes it smaller.
+
+        Args:
+            data (bytes): The contents of the file.
+            mediaType (str): The media type of the file.
+            immutable (bool, optional): True if the contents of the file never
+            change under the same URL, e.g. because its name contains a hash
+            of its contents. Such files are cached by browsers for a year
+            without revalidation. Other files are revalidated on every use.
+            Defaults to False.
+            precompressed (None | dict, optional): Variants which were already
+            compressed by the build, by content coding. Defaults to None.
+        '''
+        digest: str = hashlib.sha256(data).hexdigest()[:32]
+        self._mediaType: str = mediaType
+        self._cacheControl: str = ('public, max-age=31536000, immutable'
+                                   if immutable else 'no-cache')
+        self._variants: dict[str, tuple[bytes, str]] = {
+            'identity': (data, f'"{digest}"'),
+        }
+        if (len(data) < Asset.MIN_SIZE
+                or not mediaType.startswith(Asset.COMPRESSIBLE)):
+            return
+        for coding, compress in Asset.CODINGS.items():
+            compressed: bytes = (precompressed or {}).get(coding) or compress(
+                data)
+            if len(compressed) < len(data):
+                self._variants[coding] = (compressed, f'"{digest}-{coding}"')
+
+    @property
+    def size(self) -> int:
+        '''The size of the uncompressed file in bytes.'''
+        return len(self._variants['identity'][0])
+
+    @property
+    def codings(self) -> list[str]:
+        '''The content codings of the variants, including `identity`.'''
+        return list(self._variants)
+
+    def respond(self, request: Request) -> Response:
+        '''Responds to a request with the smallest variant which the client
+        accepts.
+
+        Args:
+            request (Request): The Request object received from the Starlette
+            app.
+
+        Returns:
+            Response: The variant, or an empty 304 Not Modified response if the
+            client already has it.
+        '''
+        coding: str = self._negotiate(
+            request.headers.get('accept-encoding', ''))
+        data, etag = self._variants[coding]
+        headers: dict[str, str] = {
+            'ETag': etag,
+            'Cache-Control': self._cacheControl,
+        }
+        if len(self._variants) > 1:
+            headers['Vary'] = 'Accept-Encoding'
+        if Asset.matches(request.headers.get('if-none-match', ''), etag):
+            return Response(status_code=304, headers=headers)
+        if coding != 'identity':
+            headers['Content-Encoding'] = coding
+        return Response(data, headers=headers, media_type=self._mediaType)
+
+    def _negotiate(self, header: str) -> str:
+        accepted: set[str] = set()
+        for item in header.lower().split(','):
+            coding, *parameters = (part.strip() for part in item.split(';'))
+            try:
+                if any(parameter.startswith('q=') and float(parameter[2:]) == 0
+                       for parameter in parameters):
+                    continue
+            except ValueError:
+                continue  # Ignore codings with an invalid quality value
+            accepted.add(coding)
+        for coding in Asset.CODINGS:
+            if coding in self._variants and (coding in accepted
+                                             or '*' in accepted):
+                return coding
+        return 'identity'
+
+    @staticmethod
+    def matches(header: str, etag: str) -> bool:
+        '''Checks whether an `If-None-Match` header matches an ETag, i.e.
+        whether the client already has the representation.
+
+        Args:
+            header (str): The value of the `If-None-Match` header.
+            etag (str): The ETag of the representation.
+
+        Returns:
+            bool: True if the client should be answered with 304 Not Modified.
+        '''
+        # If-None-Match uses the weak comparison, which ignores the W/ prefix
+        tags: list[str] = [tag.strip().removeprefix('W/')
+                           for tag in header.split(',')]
+        return '*' in tags or etag in tags
+
+
+class Frontend:
+    '''An in-memory index of the frontend build. Every file is read and
+    compressed once when the index is loaded. HTML files in the root of the
+    build are Jinja2 templates which are rendered once when the index is
+    loaded, so they can't depend on the request. Files in the `assets/`
+    directory are named with a hash of their contents by the build and are
+    therefore served as immutable.
+    '''
+
+    def __init__(self, directory: Path) -> None:
+        '''Instantiates a new Frontend. The index is empty until it is loaded.
+
+        Args:
+            directory (Path): The directory of the frontend build.
+        '''
+        self._directory: Path = directory
+        self._files: dict[str, Asset] = dict()
+
+    def load(self) -> None:
+        '''Reads, renders, and compresses the files of the frontend build.
+        This function blocks while the files are compressed, so it should be
+        called from a background thread.
+        '''
+        from starlette.templating import Jinja2Templates
+
+        if not self._directory.is_dir():
+            log.warning(f'The frontend build \'{self._directory}\' doesn\'t '
+                        'exist')
+            return
+        templates: Jinja2Templates = Jinja2Templates(directory=self._directory)
+        files: dict[str, Asset] = dict()
+        for file in sorted(self._directory.rglob('*')):
+            name: str = file.relative_to(self._directory).as_posix()
+            if not file.is_file() or any(part.startswith('.')
+                                         for part in name.split('/')):
+                continue
+            if file.suffix in ('.br', '.gz') and file.with_suffix('').exists():
+                continue  # Precompressed variants are loaded with their file
+            data: bytes = file.read_bytes()
+            if file.suffix == '.html' and '/' not in name:
+                data = templates.get_template(name).render().encode()
+            precompressed: dict[str, bytes] = dict()
+            for coding, suffix in (('br', '.br'), ('gzip', '.gz')):
+                variant: Path = file.with_name(f'{file.name}{suffix}')
+                if variant.is_file():
+                    precompressed[coding] = variant.read_bytes()
+            files[name] = Asset(
+                data,
+                mimetypes.guess_type(name)[0] or 'application/octet-stream',
+                immutable=name.startswith('assets/'),
+                precompressed=precompressed,
+            )
+        self._files = files
+        size: int = sum(asset.size for asset in files.values())
+        compressed: int = sum(len(asset.codings) > 1
+                              for asset in files.values())
+        log.info(f'Loaded {len(files)} frontend files ({size} bytes, '
+                 f'{compressed} compressed)')
+
+    def respond(self, request: Request, name: str) -> Response:
+        '''Responds to a request for a file of the frontend build.
+
+        Args:
+            request (Request): The Request object received from the Starlette
+            app.
+            name (str): The path of the file relative to the build directory.
+
+        Returns:
+            Response: The file, or 404 Not Found if it isn't in the build.
+        '''
+        asset: None | Asset = self._files.get(name, None)
+        if asset is None:
+            return PlainTextResponse('Not Found', status_code=404)
+        return asset.respond(request)
+
+
+# The assets logging instance
+log: logging.Logger = logging.getLogger(__name__)
@@ -0,0 +1,597 @@
+from __future__ import annotations
+from collections import deque, OrderedDict
+from dataclasses import dataclass, field
+from delta import diff
+from itertools import islice
+from typing import Any, Awaitable, Callable, TYPE_CHECKING
+from weakref import WeakKeyDictionary, WeakValueDictionary
+import asyncio
+import logging
+import msgpack
+
+if TYPE_CHECKING:
+    from server import Encodable
+
+
+@dataclass
+class _Subscriber:
+    delta: bool
+    format: str
+    scopes: set[str] = field(default_factory=set)
+    token: None | str = None
+    resumed: bool = False
+
+
+@dataclass
+class _Broadcast:
+    sequence: int
+    uuid: None | str
+    event: str
+    data: Any
+    rooms: list[str]
+
+
+class Broadcaster:
+    '''Collects Encodable updates and sends them to clients in batches. Every
+    Encodable which is updated more than once within the broadcast window is
+    only encoded and sent once, using its most recent state. Batches are sent
+    in the order in which they were drained so that clients never receive an
+    older state after a newer one.
+
+    Clients may opt in to delta mode. Clients in delta mode receive the event
+    name suffixed with `Delta` and a payload containing the UUID of the
+    Encodable, its version number, and a JSON Patch against the previous
+    version. A client which has not seen the previous version should request a
+    full snapshot of the Encodable and apply later patches to it.
+
+    Each Encodable is broadcast to a scope, which is the value of its `scope`
+    attribute, if it exists. Sessions which haven't subscribed to any scope
+    receive the broadcasts of all scopes.
+
+    Clients may also negotiate the format in which broadcasts are serialized.
+    Each broadcast is serialized once per format and the same payload is sent
+    to every client which uses that format. Each combination of scope, delta
+    mode, and format is a separate Socket.IO room so that every event is sent
+    only once to exactly the sessions which need it.
+
+    Every broadcast carries a sequence number as a second argument, which
+    increases with every Encodable which is sent. The most recent broadcasts
+    are kept so that a client which reconnects after a short outage can
+    resume its previous session by presenting its session ID, its token, and
+    the last sequence number which it received. It is then sent only the
+    broadcasts which it missed, or only the most recent one of each Encodable
+    if it isn't in delta mode, instead of fetching everything again.
+    '''
+
+    ALL_SCOPE: str = '*'
+
+    # The number of most recent broadcasts which are kept for resumed sessions
+    HISTORY: int = 1024
+
+    # The number of disconnected sessions which can be resumed
+    DETACHED: int = 256
+
+    # The serializer of each format, or None if Socket.IO serializes it
+    FORMATS: dict[str, None | Callable[[Any], bytes]] = {
+        'json': None,
+        'msgpack': msgpack.packb,
+    }
+
+    def __init__(self, emit: Callable[..., Awaitable[None]], *,
+                 window: float = 0) -> None:
+        '''Instantiates a new Broadcaster.
+
+        Args:
+            emit (Callable): The coroutine function used to send each event
+            and its data to the clients. It is called with the event name, the
+            data, the list of rooms to which the event is sent, and the key
+            of an event which carries the full state of an Encodable, so that
+            a queued event can be replaced by a newer one.
+            window (float, optional): The number of seconds to wait after a
+            flush is requested before the pending updates are sent. A window
+            of zero sends the pending updates on the next tick of the event
+            loop. Defaults to 0.
+        '''
+        self._emit: Callable[..., Awaitable[None]] = emit
+        self._window: float = 0
+        self._pending: dict[Encodable, None] = dict()
+        self._handle: None | asyncio.Handle = None
+        self._task: None | asyncio.Task = None
+        self._sessions: dict[str, _Subscriber] = dict()
+        self._profiles: dict[tuple[bool, str], int] = dict()
+        self._rooms: dict[str, int] = dict()
+        self._versions: WeakKeyDictionary[
+            Encodable, tuple[int, dict[str, Any]]] = WeakKeyDictionary()
+        self._tracked: WeakValueDictionary[str, Encodable] = (
+            WeakValueDictionary())
+        self._sequence: int = 0
+        self._history: deque[_Broadcast] = deque(maxlen=Broadcaster.HISTORY)
+        self._detached: OrderedDict[str, _Subscriber] = OrderedDict()
+        self._detachedProfiles: dict[tuple[bool, str], int] = dict()
+        self._updates: int = 0
+        self._coalesced: int = 0
+        self._resumed: int = 0
+        self._sent: int = 0
+        self._patches: int = 0
+        self._batches: int = 0
+        self.window = window
+
+    @property
+    def window(self) -> float:
+        return self._window
+
+    @window.setter
+    def window(self, window: float) -> None:
+        if not isinstance(window, (int, float)) or isinstance(window, bool):
+            raise TypeError(f'window must be float, not '
+                            f'{type(window).__name__}')
+        if window < 0:
+            raise ValueError('window must not be negative')
+        self._window = float(window)
+
+    @property
+    def pending(self) -> int:
+        '''The number of Encodables waiting to be sent.'''
+        return len(self._pending)
+
+    @property
+    def version(self) -> int:
+        '''A number which increases whenever an Encodable is marked as
+        changed, so that anything which is derived from the game state can be
+        cached until the state changes.'''
+        return self._updates
+
+    @property
+    def sessions(self) -> int:
+        '''The number of connected client sessions.'''
+        return len(self._sessions)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        '''The counters of this Broadcaster. The `updates` counter is the
+        number of updates requested, `coalesced` is the number of updates which
+        were merged into an update that was already pending, `sent` is the
+        number of events which were sent, `patches` is the number of those
+        events which were sent to clients in delta mode, and `batches` is the
+        number of batches in which those events were sent. The `sessions`
+        counter is the number of connected client sessions, `resumed` is the
+        number of sessions which were resumed without fetching everything
+        again, and `sequence` is the sequence number of the last broadcast.
+        '''
+        return {
+            'updates': self._updates,
+            'coalesced': self._coalesced,
+            'resumed': self._resumed,
+            'sequence': self._sequence,
+            'sent': self._sent,
+            'patches': self._patches,
+            'batches': self._batches,
+            'pending': len(self._pending),
+            'sessions': len(self._sessions),
+        }
+
+    @staticmethod
+    def getEventName(encodable: Encodable) -> str:
+        '''Gets the name of the event used to broadcast the Encodable.
+
+        Args:
+            encodable (Encodable): The Encodable to broadcast.
+
+        Returns:
+            str: The value of the `API_NAME` class attribute, if it exists.
+            Otherwise, the name of the Encodable's class.
+        '''
+        eventName: str = type(encodable).__name__
+        if hasattr(encodable, 'API_NAME'):
+            eventName = getattr(encodable, 'API_NAME')
+        return eventName
+
+    @staticmethod
+    def getScope(encodable: Encodable) -> str:
+        '''Gets the scope to which the Encodable is broadcast.
+
+        Args:
+            encodable (Encodable): The Encodable to broadcast.
+
+        Returns:
+            str: The value of the `scope` attribute, if it exists. Otherwise,
+            the scope which includes every session.
+        '''
+        scope: str = Broadcaster.ALL_SCOPE
+        if hasattr(encodable, 'scope'):
+            scope = getattr(encodable, 'scope')
+        return scope
+
+    @staticmethod
+    def getRoom(scope: str, delta: bool, format: str) -> str:
+        '''Gets the name of the Socket.IO room of a scope.
+
+        Args:
+            scope (str): The scope of the room.
+            delta (bool): True if the room is for sessions in delta mode.
+            format (str): The format of the sessions in the room.
+
+        Returns:
+            str: The name of the room.
+        '''
+        return f'{scope}:{'delta' if delta else 'snapshot'}:{format}'
+
+    @staticmethod
+    def negotiateFormat(formats: Any) -> str:
+        '''Chooses the format of a client session.
+
+        Args:
+            formats (Any): The formats supported by the client in order of
+            preference.
+
+        Returns:
+            str: The first supported format, or `json` if none of the formats
+            are supported.
+        '''
+        if isinstance(formats, list):
+            for format in formats:
+                if isinstance(format, str) and format in Broadcaster.FORMATS:
+                    return format
+        return 'json'
+
+    def connect(self, sessionId: str, *, delta: bool = False,
+                format: str = 'json', token: None | str = None,
+                resume: None | str = None) -> list[str]:
+        '''Registers a client session with this Broadcaster. New sessions
+        receive the broadcasts of all scopes until they subscribe to a scope.
+        A session which resumes a disconnected session with the same token,
+        delta mode, and format keeps the scopes of that session instead.
+
+        Args:
+            sessionId (str): The session ID of the client.
+            delta (bool, optional): Set to True if the client should receive
+            patches instead of full encodings. Defaults to False.
+            format (str, optional): The format in which the client receives
+            broadcasts. Defaults to 'json'.
+            token (None | str, optional): The token which identifies the
+            client across sessions. Sessions without a token can't be
+            resumed. Defaults to None.
+            resume (None | str, optional): The session ID of the previous
+            session of the client, if the client still has its state and wants
+            to resume it. Defaults to None.
+
+        Raises:
+            ValueError: if the format is not supported.
+
+        Returns:
+            list[str]: The names of the rooms which the session must join in
+            order to receive broadcasts.
+        '''
+        if format not in Broadcaster.FORMATS:
+            raise ValueError(f'unsupported format \'{format}\'')
+        self.disconnect(sessionId)
+        subscriber: _Subscriber = _Subscriber(delta, format,
+                                              {Broadcaster.ALL_SCOPE}, token)
+        detached: None | _Subscriber = (self._undetach(resume)
+                                        if resume is not None else None)
+        if (detached is not None and token is not None
+                and detached.token == token and detached.delta == delta
+                and detached.format == format):
+            subscriber.scopes = detached.scopes
+            subscriber.resumed = True
+        self._sessions[sessionId] = subscriber
+        profile: tuple[bool, str] = (delta, format)
+        self._profiles[profile] = self._profiles.get(profile, 0) + 1
+        rooms: list[str] = [Broadcaster.getRoom(scope, delta, format)
+                            for scope in subscriber.scopes]
+        for room in rooms:
+            self._enterRoom(room)
+        return rooms
+
+    def disconnect(self, sessionId: str) -> None:
+        '''Unregisters a client session from this Broadcaster. Sessions with
+        a token are kept, without their rooms, so that they can be resumed.
+        The encodings which are kept to create patches are discarded once
+        there are no more clients in delta mode.
+
+        Args:
+            sessionId (str): The session ID of the client.
+        '''
+        if sessionId not in self._sessions:
+            return
+        subscriber: _Subscriber = self._sessions.pop(sessionId)
+        for scope in subscriber.scopes:
+            self._leaveRoom(Broadcaster.getRoom(scope, subscriber.delta,
+                                                subscriber.format))
+        profile: tuple[bool, str] = (subscriber.delta, subscriber.format)
+        self._profiles[profile] -= 1
+        if self._profiles[profile] == 0:
+            del self._profiles[profile]
+        if subscriber.token is not None:
+            self._detach(sessionId, subscriber)
+        if not any(delta for delta, _ in self._getProfiles()):
+            self._versions.clear()
+            self._tracked.clear()
+
+    def replay(self, sessionId: str, sequence: int) -> bool:
+        '''Sends a resumed session the broadcasts which it missed after the
+        broadcast with a sequence number. Sessions which aren't in delta mode
+        are only sent the most recent broadcast of each Encodable. The
+        broadcasts are sent after the batches which were already drained, so
+        the session must already have joined its rooms.
+
+        Args:
+            sessionId (str): The session ID of the client.
+            sequence (int): The sequence number of the last broadcast which
+            the client received.
+
+        Returns:
+            bool: False if the session wasn't resumed or if some of the
+            broadcasts which it missed are no longer kept, in which case the
+            client must fetch everything again.
+        '''
+        subscriber: None | _Subscriber = self._sessions.get(sessionId, None)
+        if (subscriber is None or not subscriber.resumed
+                or sequence > self._sequence
+                or (len(self._history) > 0
+                    and sequence < self._history[0].sequence - 1)):
+            return False
+        subscriber.resumed = False
+        rooms: set[str] = {Broadcaster.getRoom(scope, subscriber.delta,
+                                               subscriber.format)
+                           for scope in subscriber.scopes}
+        missed: dict[Any, _Broadcast] = dict()
+        for broadcast in self._history:
+            if broadcast.sequence <= sequence or rooms.isdisjoint(
+                    broadcast.rooms):
+                continue
+            key: Any = broadcast.sequence
+            if not subscriber.delta and broadcast.uuid is not None:
+                # Only the most recent encoding of an Encodable is needed
+                key = (broadcast.event, broadcast.uuid)
+                missed.pop(key, None)
+            missed[key] = broadcast
+        self._resumed += 1
+        if len(missed) > 0:
+            self._sent += len(missed)
+            self._task = asyncio.get_running_loop().create_task(self._send(
+                [(broadcast.event, (broadcast.data, broadcast.sequence),
+                  [sessionId], None) for broadcast in missed.values()],
+                self._task))
+        return True
+
+    def _detach(self, sessionId: str, subscriber: _Subscriber) -> None:
+        self._detached[sessionId] = subscriber
+        profile: tuple[bool, str] = (subscriber.delta, subscriber.format)
+        self._detachedProfiles[profile] = (
+            self._detachedProfiles.get(profile, 0) + 1)
+        if len(self._detached) > Broadcaster.DETACHED:
+            self._undetach(next(iter(self._detached)))
+
+    def _undetach(self, sessionId: str) -> None | _Subscriber:
+        subscriber: None | _Subscriber = self._detached.pop(sessionId, None)
+        if subscriber is not None:
+            profile: tuple[bool, str] = (subscriber.delta, subscriber.format)
+            self._detachedProfiles[profile] -= 1
+            if self._detachedProfiles[profile] == 0:
+                del self._detachedProfiles[profile]
+        return subscriber
+
+    def _getProfiles(self) -> list[tuple[bool, str]]:
+        # Broadcasts are also kept for the profiles of detached sessions
+        return sorted(self._profiles.keys() | self._detachedProfiles.keys())
+
+    def subscribe(self, sessionId: str,
+                  scope: str) -> tuple[list[str], list[str]]:
+        '''Subscribes a client session to the broadcasts of a scope. The
+        session stops receiving the broadcasts of all other scopes to which it
+        hasn't subscribed.
+
+        Args:
+            sessionId (str): The session ID of the client.
+            scope (str): The scope to which to subscribe.
+
+        Raises:
+            KeyError: if the session is not connected.
+
+        Returns:
+            tuple: The names of the rooms which the session must enter and the
+            names of the rooms which the session must leave.
+        '''
+        subscriber: _Subscriber = self._sessions[sessionId]
+        leave: list[str] = []
+        if Broadcaster.ALL_SCOPE in subscriber.scopes:
+            subscriber.scopes.remove(Broadcaster.ALL_SCOPE)
+            leave.append(Broadcaster.getRoom(Broadcaster.ALL_SCOPE,
+                                             subscriber.delta,
+                                             subscriber.format))
+            self._leaveRoom(leave[-1])
+        room: str = Broadcaster.getRoom(scope, subscriber.delta,
+                                        subscriber.format)
+        if scope not in subscriber.scopes:
+            subscriber.scopes.add(scope)
+            self._enterRoom(room)
+        return [room], leave
+
+    def unsubscribe(self, sessionId: str, scope: str) -> list[str]:
+        '''Unsubscribes a client session from the broadcasts of a scope.
+
+        Args:
+            sessionId (str): The session ID of the client.
+            scope (str): The scope from which to unsubscribe.
+
+        Raises:
+            KeyError: if the session is not connected.
+
+        Returns:
+            list: The names of the rooms which the session must leave.
+        '''
+        subscriber: _Subscriber = self._sessions[sessionId]
+        room: str = Broadcaster.getRoom(scope, subscriber.delta,
+                                        subscriber.format)
+        if scope in subscriber.scopes:
+            subscriber.scopes.remove(scope)
+            self._leaveRoom(room)
+        return [room]
+
+    def getRecipients(self, rooms: list[str]) -> int:
+        '''Counts the client sessions which receive an event sent to a list of
+        rooms. Each session is in exactly one room per subscribed scope, and
+        the rooms of an event never share a scope, so this is exact. Each
+        session is also alone in the room named after its session ID.
+
+        Args:
+            rooms (list[str]): The names of the rooms.
+
+        Returns:
+            int: The number of sessions in the rooms.
+        '''
+        return sum(self._rooms.get(room, int(room in self._sessions))
+                   for room in rooms)
+
+    def _enterRoom(self, room: str) -> None:
+        self._rooms[room] = self._rooms.get(room, 0) + 1
+
+    def _leaveRoom(self, room: str) -> None:
+        self._rooms[room] -= 1
+        if self._rooms[room] == 0:
+            del self._rooms[room]
+
+    def snapshot(self, uuid: str) -> None | dict[str, Any]:
+        '''Gets the most recently broadcast encoding of an Encodable so that a
+        client in delta mode may apply subsequent patches to it.
+
+        Args:
+            uuid (str): The UUID of the Encodable.
+
+        Returns:
+            None | dict: A dictionary containing the UUID, version number, and
+            encoding of the Encodable, or None if the Encodable has not been
+            broadcast to clients in delta mode.
+        '''
+        encodable: None | Encodable = self._tracked.get(uuid, None)
+        if encodable is None or encodable not in self._versions:
+            return None
+        version, encoding = self._versions[encodable]
+        return {'uuid': uuid, 'version': version, 'snapshot': encoding}
+
+    def update(self, encodable: Encodable) -> None:
+        '''Marks an Encodable as changed so that it is sent to the clients
+        during the next flush. Marking an Encodable which is already pending
+        does not send it more than once.
+
+        Args:
+            encodable (Encodable): The Encodable which has changed.
+        '''
+        self._updates += 1
+        if encodable in self._pending:
+            self._coalesced += 1
+            return
+        self._pending[encodable] = None
+
+    def discard(self, keep: int = 0) -> None:
+        '''Discards the pending updates without sending them, e.g. because
+        the changes which they would send were rolled back. The version is
+        increased so that anything derived from the discarded changes is no
+        longer cached.
+
+        Args:
+            keep (int, optional): The number of updates which were already
+            pending before the discarded changes, and which are kept. Defaults
+            to 0.
+        '''
+        self._updates += 1
+        self._pending = dict.fromkeys(islice(self._pending, keep))
+
+    def flush(self) -> None:
+        '''Requests that the pending updates are sent once the broadcast window
+        has elapsed. Requests which are made while a flush is already scheduled
+        are merged into the scheduled flush. If there is no running event loop,
+        the updates remain pending until the next flush.
+        '''
+        if self._handle is not None:
+            return  # A flush is already scheduled
+        try:
+            loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # Don't emit updates if there isn't an event loop
+        if self._window > 0:
+            self._handle = loop.call_later(self._window, self._drain)
+        else:
+            self._handle = loop.call_soon(self._drain)
+
+    def _drain(self) -> None:
+        self._handle = None
+        if len(self._pending) == 0:
+            return
+
+        # Swap out the pending updates so that new updates start a new batch
+        pending: dict[Encodable, None] = self._pending
+        self._pending = dict()
+        batch: list[tuple[str, Any, list[str], None | str]] = []
+        profiles: list[tuple[bool, str]] = self._getProfiles()
+        isDelta: bool = any(delta for delta, _ in profiles)
+        for encodable in pending:
+            self._sequence += 1
+            eventName: str = Broadcaster.getEventName(encodable)
+            uuid: None | str = (encodable.uuid if hasattr(encodable, 'uuid')
+                                else None)
+            scopes: tuple[str, ...] = (Broadcaster.getScope(encodable),
+                                       Broadcaster.ALL_SCOPE)
+            encoding: dict[str, Any] = encodable.encode()
+            payload: None | dict[str, Any] = (
+                self._getDelta(encodable, encoding) if isDelta else None)
+            for delta, format in profiles:
+                if delta and payload is None:
+                    continue  # The Encodable hasn't changed
+                data: Any = payload if delta else encoding
+                serializer: None | Callable[[Any], bytes] = (
+                    Broadcaster.FORMATS[format])
+                if serializer is not None:
+                    data = serializer(data)  # Serialize once per format
+                event: str = f'{eventName}Delta' if delta else eventName
+                rooms: list[str] = [Broadcaster.getRoom(scope, delta, format)
+                                    for scope in scopes]
+                self._history.append(_Broadcast(self._sequence, uuid, event,
+                                                data, rooms))
+                if (delta, format) not in self._profiles:
+                    continue  # Only detached sessions use this profile
+                # A full encoding replaces any queued encoding of the same
+                # Encodable, so its key is computed once for every recipient
+                key: None | str = (f'{event}:{uuid}' if not delta
+                                   and uuid is not None else None)
+                batch.append((event, (data, self._sequence), rooms, key))
+                self._patches += int(delta)
+        if len(batch) == 0:
+            return
+        self._sent += len(batch)
+        self._batches += 1
+
+        # Send the batch after the previous batch has finished sending
+        self._task = asyncio.get_running_loop().create_task(
+            self._send(batch, self._task))
+
+    def _getDelta(self, encodable: Encodable,
+                  encoding: dict[str, Any]) -> None | dict[str, Any]:
+        uuid: str = encodable.uuid
+        if encodable not in self._versions:
+            # Clients can't have a previous version, so send the full encoding
+            self._versions[encodable] = (0, encoding)
+            self._tracked[uuid] = encodable
+            return {'uuid': uuid, 'version': 0, 'snapshot': encoding}
+        version, previous = self._versions[encodable]
+        patch: list[dict[str, Any]] = diff(previous, encoding)
+        if len(patch) == 0:
+            return None  # Nothing has changed since the last broadcast
+        self._versions[encodable] = (version + 1, encoding)
+        return {'uuid': uuid, 'version': version + 1, 'patch': patch}
+
+    async def _send(self, batch: list[tuple[str, Any, list[str], None | str]],
+                    previous: None | asyncio.Task) -> None:
+        if previous is not None and not previous.done():
+            await asyncio.wait((previous,))
+        for event, data, rooms, key in batch:
+            try:
+                await self._emit(event, data, room=rooms, key=key)
+            except Exception as e:
+                log.error(f'Unable to emit \'{event}\': {type(e).__name__}: '
+                          f'{str(e)}')
+
+
+# The broadcaster logging instance
+log: logging.Logger = logging.getLogger(__name__)
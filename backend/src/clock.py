@@ -0,0 +1,191 @@
+from __future__ import annotations
+from datetime import datetime
+from typing import Callable
+import asyncio
+import heapq
+import itertools
+import time
+
+
+class Clock:
+    '''The time source of the server and the game model. Times are integer
+    nanoseconds of a monotonic counter, so they can be compared and
+    subtracted without allocating objects, and they don't jump when the
+    system clock is corrected, e.g. by NTP in the middle of a bout.
+
+    The wall-clock time of a monotonic time is derived using the offset of
+    the system clock from the counter when the Clock was created, and is
+    only needed to encode and export times. Every time which is sent to the
+    clients is derived in this way, so the clients agree with the game model
+    even after the system clock was corrected.
+    '''
+
+    def __init__(self) -> None:
+        '''Instantiates a new Clock whose wall-clock time is the time of the
+        system clock now.'''
+        self._offset: int = time.time_ns() - time.monotonic_ns()
+
+    def now(self) -> int:
+        '''Gets the current time.
+
+        Returns:
+            int: The current time in nanoseconds of the monotonic counter.
+        '''
+        return time.monotonic_ns()
+
+    def time(self) -> float:
+        '''Gets the current wall-clock time.
+
+        Returns:
+            float: The current time in seconds since the epoch.
+        '''
+        return (self.now() + self._offset) / 1_000_000_000
+
+    def toEpoch(self, nanoseconds: int) -> int:
+        '''Converts a monotonic time to wall-clock time.
+
+        Args:
+            nanoseconds (int): The time in nanoseconds of the monotonic
+            counter.
+
+        Returns:
+            int: The time in nanoseconds since the epoch.
+        '''
+        return nanoseconds + self._offset
+
+    def toDatetime(self, nanoseconds: int) -> datetime:
+        '''Converts a monotonic time to a naive datetime in local time, like
+        those of `datetime.now()`.
+
+        Args:
+            nanoseconds (int): The time in nanoseconds of the monotonic
+            counter.
+
+        Returns:
+            datetime: The wall-clock time, truncated to microseconds.
+        '''
+        seconds, remainder = divmod(self.toEpoch(nanoseconds), 1_000_000_000)
+        return datetime.fromtimestamp(seconds).replace(
+            microsecond=remainder // 1000)
+
+    def fromDatetime(self, timestamp: datetime) -> int:
+        '''Converts a datetime to a monotonic time. Naive datetimes are in
+        local time, like those of `datetime.now()`.
+
+        Args:
+            timestamp (datetime): The wall-clock time.
+
+        Returns:
+            int: The time in nanoseconds of the monotonic counter.
+        '''
+        return Clock._getEpoch(timestamp) - self._offset
+
+    def callAt(self, loop: asyncio.AbstractEventLoop, deadline: int,
+               callback: Callable[[], None]) -> asyncio.Handle:
+        '''Calls a function in an event loop once the Clock reaches a time.
+
+        Args:
+            loop (asyncio.AbstractEventLoop): The event loop in which to call
+            the function.
+            deadline (int): The time in nanoseconds of the Clock at which to
+            call the function.
+            callback (Callable): The function to call.
+
+        Returns:
+            asyncio.Handle: The handle with which the call is cancelled.
+        '''
+        return loop.call_later(max(deadline - self.now(), 0) / 1_000_000_000,
+                               callback)
+
+    @staticmethod
+    def _getEpoch(timestamp: datetime) -> int:
+        seconds: int = int(timestamp.replace(microsecond=0).timestamp())
+        return seconds * 1_000_000_000 + timestamp.microsecond * 1000
+
+
+class VirtualClock(Clock):
+    '''A Clock whose time only moves when it is advanced, so that whole bouts
+    can be simulated without waiting for them, e.g. to test or benchmark the
+    game model. Install it with `setClock()` before the game state is
+    created.
+
+    Advancing the Clock calls the functions whose times it passes in order of
+    their times, and the Clock reads exactly the time of each function while
+    it is called. Alarms therefore behave as with real time, except that they
+    are never late.
+    '''
+
+    def __init__(self, start: None | datetime = None) -> None:
+        '''Instantiates a new VirtualClock which is stopped at a time.
+
+        Args:
+            start (None | datetime, optional): The wall-clock time at which the
+            Clock starts. Defaults to the time of the system clock now.
+        '''
+        super().__init__()
+        self._now: int = 0
+        self._offset = Clock._getEpoch(start or datetime.now())
+        self._calls: list[tuple[int, int, asyncio.Handle,
+                                Callable[[], None]]] = []
+        self._counter: itertools.count = itertools.count()
+
+    def now(self) -> int:
+        return self._now
+
+    def callAt(self, loop: asyncio.AbstractEventLoop, deadline: int,
+               callback: Callable[[], None]) -> asyncio.Handle:
+        if deadline <= self._now:
+            return loop.call_soon(callback)
+        # The handle is only used to cancel the call, so it is never
+        # scheduled in the event loop
+        handle: asyncio.Handle = asyncio.TimerHandle(
+            deadline / 1_000_000_000, callback, (), loop)
+        heapq.heappush(self._calls, (deadline, next(self._counter), handle,
+                                     callback))
+        return handle
+
+    def advance(self, nanoseconds: int) -> None:
+        '''Moves the time of the Clock forward, calling the functions whose
+        times it passes in order.
+
+        Args:
+            nanoseconds (int): The number of nanoseconds by which to move the
+            time forward.
+
+        Raises:
+            ValueError: if the number of nanoseconds is negative.
+        '''
+        if nanoseconds < 0:
+            raise ValueError('the time of a Clock can\'t move backward')
+        end: int = self._now + nanoseconds
+        while len(self._calls) > 0 and self._calls[0][0] <= end:
+            deadline, _, handle, callback = heapq.heappop(self._calls)
+            if handle.cancelled():
+                continue
+            self._now = deadline
+            callback()
+        self._now = end
+
+
+def getClock() -> Clock:
+    '''Gets the time source of the server and the game model.
+
+    Returns:
+        Clock: The current Clock.
+    '''
+    return _clock
+
+
+def setClock(clock: Clock) -> None:
+    '''Replaces the time source of the server and the game model. The Clock
+    should be replaced before the game state is created or restored, because
+    the times which were already taken are times of the previous Clock.
+
+    Args:
+        clock (Clock): The new Clock.
+    '''
+    global _clock
+    _clock = clock
+
+
+_clock: Clock = Clock()
@@ -0,0 +1,126 @@
+from __future__ import annotations
+from collections import deque
+from typing import ClassVar
+import math
+
+
+class ClockEstimator:
+    '''Estimates the offset of a client's clock from the server clock and the
+    round-trip delay between them, in the manner of NTP. The server sends
+    probes to the client, which replies with the time of its clock. Each probe
+    yields a sample of the delay and the offset, assuming that the reply was
+    sent halfway through the round trip.
+
+    The sample with the shortest delay of the most recent samples is used as
+    the estimate, because it was least affected by queuing on the network and
+    in the event loops. Samples whose delay is much longer than the shortest
+    delay are outliers which are ignored when measuring the jitter, the RMS
+    deviation of the other offsets from the estimate.
+
+    All times are in seconds since the epoch.
+    '''
+
+    # The number of most recent samples which are kept
+    SAMPLES: ClassVar[int] = 8
+
+    # Samples which took longer than this many times the shortest delay, plus
+    # a millisecond of allowance for fast networks, are outliers
+    OUTLIER_RATIO: ClassVar[float] = 2
+
+    # The number of probes sent in quick succession after a client connects,
+    # and the number of seconds between them
+    PROBE_BURST: ClassVar[int] = 4
+    PROBE_BURST_INTERVAL: ClassVar[float] = 0.25
+
+    # The number of seconds between probes after the burst, and the number of
+    # seconds to wait for a reply
+    PROBE_INTERVAL: ClassVar[float] = 15
+    PROBE_TIMEOUT: ClassVar[float] = 5
+
+    # Client times which differ from the time at which the command was
+    # received by more than this many seconds are not trusted
+    MAX_AGE: ClassVar[float] = 5
+
+    def __init__(self) -> None:
+        '''Instantiates a new ClockEstimator without any samples.'''
+        self._samples: deque[tuple[float, float]] = deque(
+            maxlen=ClockEstimator.SAMPLES)
+        self._delay: None | float = None
+        self._offset: None | float = None
+        self._jitter: float = 0
+        self._outliers: int = 0
+
+    @property
+    def delay(self) -> None | float:
+        '''The estimated round-trip delay in seconds, or None if there are no
+        samples.'''
+        return self._delay
+
+    @property
+    def offset(self) -> None | float:
+        '''The estimated number of seconds by which the client clock is ahead
+        of the server clock, or None if there are no samples.'''
+        return self._offset
+
+    @property
+    def jitter(self) -> float:
+        '''The RMS deviation in seconds of the offsets of the recent samples
+        which are not outliers from the estimated offset.'''
+        return self._jitter
+
+    @property
+    def outliers(self) -> int:
+        '''The number of recent samples which are outliers.'''
+        return self._outliers
+
+    def addSample(self, sent: float, clientTime: float,
+                  received: float) -> bool:
+        '''Adds a sample from a probe and updates the estimate.
+
+        Args:
+            sent (float): The server time at which the probe was sent.
+            clientTime (float): The client time in the reply to the probe.
+            received (float): The server time at which the reply was received.
+
+        Returns:
+            bool: False if the sample was discarded because it is invalid,
+            e.g. because the server clock was set back during the probe.
+        '''
+        delay: float = received - sent
+        if delay < 0 or not math.isfinite(clientTime):
+            return False
+        self._samples.append((delay, clientTime - (sent + received) / 2))
+
+        # Use the sample with the shortest delay as the estimate
+        self._delay, self._offset = min(self._samples)
+        limit: float = self._delay * ClockEstimator.OUTLIER_RATIO + 0.001
+        deviations: list[float] = [(offset - self._offset) ** 2
+                                   for delay, offset in self._samples
+                                   if delay <= limit]
+        self._jitter = math.sqrt(sum(deviations) / len(deviations))
+        self._outliers = len(self._samples) - len(deviations)
+        return True
+
+    def correct(self, clientTime: None | float, received: float) -> float:
+        '''Converts the client time at which a command was sent to server
+        time. Without a client time, the command is assumed to have been sent
+        half of the estimated round-trip delay before it was received.
+
+        Args:
+            clientTime (None | float): The client time at which the command
+            was sent, if the client sent it.
+            received (float): The server time at which the command was
+            received.
+
+        Returns:
+            float: The server time at which the command was sent, which is
+            never after it was received.
+        '''
+        if self._offset is None or self._delay is None:
+            return received
+        if clientTime is not None:
+            timestamp: float = clientTime - self._offset
+            # Fall back to the delay if the client clock was changed
+            if abs(timestamp - received) <= ClockEstimator.MAX_AGE:
+                return min(timestamp, received)
+        return received - self._delay / 2
@@ -0,0 +1,388 @@
+from __future__ import annotations
+from outbox import OutboxServer
+from pathlib import Path
+from socketio.async_pubsub_manager import AsyncPubSubManager
+from typing import Any, AsyncIterator, Awaitable, Callable, ClassVar
+import asyncio
+import itertools
+import logging
+import msgpack
+import socket
+import struct
+
+
+'''Creates the pub/sub manager of a process. Factories must be picklable so
+that they can be sent to worker processes, e.g. a module-level class or a
+`functools.partial` of one. They are called with the `write_only` keyword.
+'''
+ManagerFactory = Callable[..., AsyncPubSubManager]
+
+
+class Hub:
+    '''Connects the worker processes of a multi-worker deployment to the
+    primary process over a Unix socket. The primary process holds the game
+    state and the worker processes hold the client connections.
+
+    The Hub serves two purposes. Workers call the handlers of the primary
+    process, e.g. to apply a command, and receive the result. The Hub also
+    relays pub/sub messages between processes so that it can stand in for a
+    dedicated pub/sub backend such as Redis. Messages are relayed as received,
+    without decoding them, so every broadcast is serialized once no matter how
+    many workers there are.
+    '''
+
+    _HEADER: ClassVar[struct.Struct] = struct.Struct('>I')
+
+    def __init__(self, path: Path,
+                 handlers: dict[str, Callable[..., Awaitable[Any]]]) -> None:
+        '''Instantiates a new Hub. The Hub must be started before workers can
+        connect to it.
+
+        Args:
+            path (Path): The path of the Unix socket.
+            handlers (dict): The coroutine functions which workers may call,
+            by name.
+        '''
+        self._path: Path = path
+        self._handlers: dict[str, Callable[..., Awaitable[Any]]] = handlers
+        self._server: None | asyncio.Server = None
+        self._connections: set[asyncio.StreamWriter] = set()
+        self._subscribers: set[asyncio.StreamWriter] = set()
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @staticmethod
+    async def read(reader: asyncio.StreamReader) -> bytes:
+        '''Reads a frame from a Hub connection.
+
+        Args:
+            reader (StreamReader): The stream of the connection.
+
+        Raises:
+            IncompleteReadError: if the connection was closed.
+
+        Returns:
+            bytes: The MessagePack payload of the frame.
+        '''
+        header: bytes = await reader.readexactly(Hub._HEADER.size)
+        return await reader.readexactly(Hub._HEADER.unpack(header)[0])
+
+    @staticmethod
+    def write(writer: asyncio.StreamWriter, message: Any) -> int:
+        '''Writes a message as a frame to a Hub connection.
+
+        Args:
+            writer (StreamWriter): The stream of the connection.
+            message (Any): The message, which must be serializable using
+            MessagePack.
+
+        Returns:
+            int: The size of the serialized message in bytes.
+        '''
+        payload: bytes = msgpack.packb(message)
+        writer.write(Hub._HEADER.pack(len(payload)) + payload)
+        return len(payload)
+
+    async def start(self) -> None:
+        '''Starts listening for worker connections.'''
+        self._path.unlink(missing_ok=True)
+        self._server = await asyncio.start_unix_server(self._handleClient,
+                                                       path=self._path)
+
+    async def close(self) -> None:
+        '''Closes the Unix socket and all worker connections.'''
+        if self._server is None:
+            return
+        self._server.close()
+        for writer in tuple(self._connections):
+            writer.close()
+        await self._server.wait_closed()
+        self._server = None
+        self._path.unlink(missing_ok=True)
+
+    async def _handleClient(self, reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter) -> None:
+        tasks: set[asyncio.Task] = set()
+        self._connections.add(writer)
+        try:
+            while True:
+                frame: bytes = await Hub.read(reader)
+                message: dict[str, Any] = msgpack.unpackb(frame)
+                if message['method'] == 'publish':
+                    # Relay the frame to every other subscriber
+                    data: bytes = Hub._HEADER.pack(len(frame)) + frame
+                    for subscriber in self._subscribers:
+                        if subscriber is not writer:
+                            subscriber.write(data)
+                elif message['method'] == 'subscribe':
+                    self._subscribers.add(writer)
+                elif message['method'] == 'call':
+                    task: asyncio.Task = asyncio.create_task(
+                        self._call(writer, message))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass  # The worker disconnected
+        finally:
+            self._connections.discard(writer)
+            self._subscribers.discard(writer)
+            writer.close()
+
+    async def _call(self, writer: asyncio.StreamWriter,
+                    message: dict[str, Any]) -> None:
+        response: dict[str, Any] = {'method': 'result', 'id': message['id']}
+        try:
+            handler: Callable[..., Awaitable[Any]] = (
+                self._handlers[message['name']])
+            response['data'] = await handler(*message['args'])
+        except Exception as e:
+            log.error(f'Worker call \'{message['name']}\' failed: '
+                      f'{type(e).__name__}: {str(e)}')
+            response['error'] = f'{type(e).__name__}: {str(e)}'
+        if not writer.is_closing():
+            Hub.write(writer, response)
+
+
+class HubClient:
+    '''A connection from a worker process to the Hub of the primary
+    process.
+    '''
+
+    def __init__(self, path: Path) -> None:
+        '''Instantiates a new HubClient. The HubClient must be connected
+        before it can be used.
+
+        Args:
+            path (Path): The path of the Unix socket of the Hub.
+        '''
+        self._path: Path = path
+        self._reader: None | asyncio.StreamReader = None
+        self._writer: None | asyncio.StreamWriter = None
+        self._receiver: None | asyncio.Task = None
+        self._ids: itertools.count = itertools.count()
+        self._calls: dict[int, asyncio.Future] = dict()
+        self._messages: None | asyncio.Queue[dict[str, Any]] = None
+        self._closed: asyncio.Event = asyncio.Event()
+
+    @property
+    def closed(self) -> asyncio.Event:
+        '''An event which is set once the connection to the Hub is lost.'''
+        return self._closed
+
+    async def connect(self) -> None:
+        '''Connects to the Hub.'''
+        self._reader, self._writer = await asyncio.open_unix_connection(
+            self._path)
+        self._receiver = asyncio.create_task(self._receive())
+
+    async def close(self) -> None:
+        '''Closes the connection to the Hub.'''
+        if self._writer is None:
+            return
+        self._writer.close()
+        self._receiver.cancel()
+        self._writer = None
+
+    async def call(self, name: str, *args: Any) -> Any:
+        '''Calls a handler of the primary process and waits for its result.
+
+        Args:
+            name (str): The name of the handler.
+            args (Any): The positional arguments of the handler, which must be
+            serializable using MessagePack.
+
+        Raises:
+            ConnectionError: if the HubClient is not connected.
+            RuntimeError: if the handler raised an exception.
+
+        Returns:
+            Any: The return value of the handler.
+        '''
+        if self._writer is None or self._closed.is_set():
+            raise ConnectionError('not connected to the Hub')
+        id: int = next(self._ids)
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._calls[id] = future
+        Hub.write(self._writer, {'method': 'call', 'id': id, 'name': name,
+                                 'args': args})
+        return await future
+
+    async def publish(self, message: dict[str, Any]) -> int:
+        '''Publishes a message to the other subscribers of the Hub.
+
+        Args:
+            message (dict): The message, which must be serializable using
+            MessagePack.
+
+        Returns:
+            int: The size of the serialized message in bytes.
+        '''
+        if self._writer is None:
+            raise ConnectionError('not connected to the Hub')
+        size: int = Hub.write(self._writer, {'method': 'publish',
+                                             'message': message})
+        await self._writer.drain()
+        return size
+
+    async def listen(self) -> AsyncIterator[dict[str, Any]]:
+        '''Subscribes to the messages published by other processes.
+
+        Yields:
+            dict: Each published message.
+        '''
+        if self._writer is None:
+            raise ConnectionError('not connected to the Hub')
+        if self._messages is None:
+            self._messages = asyncio.Queue()
+            Hub.write(self._writer, {'method': 'subscribe'})
+        while True:
+            yield await self._messages.get()
+
+    async def _receive(self) -> None:
+        try:
+            while True:
+                message: dict[str, Any] = msgpack.unpackb(
+                    await Hub.read(self._reader))
+                if message['method'] == 'publish':
+                    if self._messages is not None:
+                        self._messages.put_nowait(message['message'])
+                elif message['method'] == 'result':
+                    future: None | asyncio.Future = self._calls.pop(
+                        message['id'], None)
+                    if future is None or future.done():
+                        continue
+                    if 'error' in message:
+                        future.set_exception(RuntimeError(message['error']))
+                    else:
+                        future.set_result(message.get('data', None))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            if self._writer is not None:
+                log.error('The connection to the primary process was lost')
+        finally:
+            self._closed.set()
+            for future in self._calls.values():
+                if not future.done():
+                    future.set_exception(
+                        ConnectionError('not connected to the Hub'))
+            self._calls.clear()
+
+
+class UnixSocketManager(AsyncPubSubManager):
+    '''A Socket.IO client manager which uses a Hub as its pub/sub backend.
+    This allows a multi-worker deployment on a single host without an external
+    message queue.
+    '''
+
+    name: str = 'hub'
+
+    def __init__(self, path: Path, channel: str = 'socketio',
+                 write_only: bool = False,
+                 logger: None | logging.Logger = None) -> None:
+        '''Instantiates a new UnixSocketManager.
+
+        Args:
+            path (Path): The path of the Unix socket of the Hub.
+            channel (str, optional): Unused, because the Hub relays a single
+            channel. Defaults to 'socketio'.
+            write_only (bool, optional): If True, the manager only publishes
+            messages and never listens to them. Defaults to False.
+            logger (None | Logger, optional): The logger instance. Defaults to
+            None.
+        '''
+        super().__init__(channel=channel, write_only=write_only,
+                         logger=logger)
+        self._client: HubClient = HubClient(path)
+        self._connected: None | asyncio.Task = None
+
+    async def close(self) -> None:
+        '''Closes the connection to the Hub.'''
+        await self._client.close()
+
+    async def _connect(self) -> HubClient:
+        if self._connected is None:
+            self._connected = asyncio.create_task(self._client.connect())
+        await self._connected
+        return self._client
+
+    async def _publish(self, data: dict[str, Any]) -> None:
+        # Relay the key of an emitted event, which isn't part of the message
+        if data.get('method', None) != 'emit':
+            await (await self._connect()).publish(data)
+            return
+        data['key'] = OutboxServer.key.get()
+        size: int = await (await self._connect()).publish(data)
+        sizes: None | dict[int, int] = OutboxServer.sizes.get()
+        if sizes is not None:
+            sizes[id(data)] = size
+
+    async def _handle_emit(self, message: dict[str, Any]) -> None:
+        token: Any = OutboxServer.key.set(
+            message.get('key', OutboxServer.key.get()))
+        try:
+            await super()._handle_emit(message)
+        finally:
+            OutboxServer.key.reset(token)
+
+    async def _listen(self) -> AsyncIterator[dict[str, Any]]:
+        async for message in (await self._connect()).listen():
+            yield message
+
+
+def runWorker(port: int, path: Path, manager: ManagerFactory,
+              debug: bool, logSampling: int = 1) -> None:
+    '''The entry point of a worker process. Workers serve the scoreboard app
+    and hold the client connections, but forward every Socket.IO event to the
+    primary process.
+
+    Args:
+        port (int): The port number on which the workers share connections.
+        path (Path): The path of the Unix socket of the Hub.
+        manager (ManagerFactory): Creates the pub/sub manager of the worker.
+        debug (bool): Turns on debug log messages.
+        logSampling (int, optional): Only one of every this many debug
+        messages about high-rate events is logged. Defaults to 1.
+    '''
+    try:
+        asyncio.run(_serveWorker(port, path, manager, debug, logSampling))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _serveWorker(port: int, path: Path, manager: ManagerFactory,
+                       debug: bool, logSampling: int) -> None:
+    from startup import startup
+    import server
+    import uvicorn
+
+    startup.mark('imports')
+    if debug:
+        server.log.setLevel(logging.DEBUG)
+    server._sampler.every = logSampling
+    primary: HubClient = HubClient(path)
+    await primary.connect()
+    startup.mark('primary')
+    server._useWorker(primary, manager(write_only=False))
+
+    # Every worker listens on the same port and the kernel balances the
+    # connections between them
+    sock: socket.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(('0.0.0.0', port))
+    config: uvicorn.Config = uvicorn.Config(server.createApp(),
+                                            log_level='critical')
+    worker: uvicorn.Server = uvicorn.Server(config)
+    serving: asyncio.Task = asyncio.create_task(worker.serve(sockets=[sock]))
+    closed: asyncio.Task = asyncio.create_task(primary.closed.wait())
+    await asyncio.wait((serving, closed), return_when=asyncio.FIRST_COMPLETED)
+    if not serving.done():
+        worker.should_exit = True
+        await serving
+    closed.cancel()
+    await primary.close()
+
+
+# The cluster logging instance
+log: logging.Logger = logging.getLogger(__name__)
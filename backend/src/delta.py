@@ -0,0 +1,51 @@
+from typing import Any
+
+
+def _escape(key: str) -> str:
+    return key.replace('~', '~0').replace('/', '~1')
+
+
+def diff(old: Any, new: Any, path: str = '') -> list[dict[str, Any]]:
+    '''Creates a structural patch which transforms one encoding into another.
+    The patch is a list of JSON Patch (RFC 6902) operations so that clients
+    may apply it using any JSON Patch library. Patches are only created on the
+    server; the frontend doesn't opt in to delta mode yet, so clients in delta
+    mode bring their own JSON Patch implementation.
+
+    Args:
+        old (Any): The encoding which the client currently has.
+        new (Any): The encoding which the client should have.
+        path (str, optional): The JSON Pointer of the encodings within the root
+        encoding. Defaults to the root.
+
+    Returns:
+        list: A list of `add`, `remove`, and `replace` operations. The list is
+        empty if the encodings are equal.
+    '''
+    if old is new:
+        return []  # Unchanged sub-trees are often the same object
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops: list[dict[str, Any]] = []
+        for key, value in new.items():
+            child: str = f'{path}/{_escape(key)}'
+            if key not in old:
+                ops.append({'op': 'add', 'path': child, 'value': value})
+            else:
+                ops.extend(diff(old[key], value, child))
+        for key in old:
+            if key not in new:
+                ops.append({'op': 'remove', 'path': f'{path}/{_escape(key)}'})
+        return ops
+    if isinstance(old, list) and isinstance(new, list):
+        ops = []
+        common: int = min(len(old), len(new))
+        for i in range(common):
+            ops.extend(diff(old[i], new[i], f'{path}/{i}'))
+        for i in range(common, len(new)):
+            ops.append({'op': 'add', 'path': f'{path}/{i}', 'value': new[i]})
+        for i in reversed(range(common, len(old))):
+            ops.append({'op': 'remove', 'path': f'{path}/{i}'})
+        return ops
+    if type(old) is type(new) and old == new:
+        return []
+    return [{'op': 'replace', 'path': path, 'value': new}]
@@ -1,4 +1,19 @@
-from PySide6.QtCore import QThreadPool, Slot, QFile, Qt, QEvent
+from pathlib import Path
+import sys
+
+# The server modules are in the parent directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import startup  # noqa: E402 Imported first so that it times the other imports
+from PySide6.QtCore import (
+    QObject,
+    QRunnable,
+    QThreadPool,
+    Signal,
+    Slot,
+    QFile,
+    Qt,
+    QEvent,
+)
 from PySide6.QtUiTools import QUiLoader
 from PySide6.QtGui import QCloseEvent, QIcon
 from PySide6.QtWidgets import (
@@ -12,10 +27,8 @@ from PySide6.QtWidgets import (
     QMessageBox,
     QSystemTrayIcon,
 )
-import src.server
-import requests
+import asyncio
 import socket
-import sys
 
 
 # @socket.event
@@ -43,6 +56,55 @@ import sys
 #         pass
 
 
+class ControllerSignals(QObject):
+    running = Signal(bool)
+    error = Signal()
+
+
+class Controller(QRunnable):
+    """Runs the scoreboard server on a thread of the Qt thread pool. The server
+    modules are imported when the server first starts instead of when the app
+    starts, so that the window appears without waiting for them.
+    """
+
+    def __init__(self, port: int) -> None:
+        super().__init__()
+        self.setAutoDelete(False)
+        self.port: int = port
+        self.signals: ControllerSignals = ControllerSignals()
+        self._loop: None | asyncio.AbstractEventLoop = None
+
+    def run(self) -> None:
+        import main
+        import scoreApi  # noqa: F401
+        import server
+
+        self._loop = asyncio.new_event_loop()
+        self.signals.running.emit(True)
+        try:
+            self._loop.run_until_complete(
+                server.serve(
+                    self.port,
+                    journal=Path("nsobridge.journal"),
+                    snapshot=Path("nsobridge.snapshot"),
+                    state=main.series,
+                )
+            )
+        except OSError:
+            self.signals.error.emit()
+        finally:
+            self._loop.close()
+            self._loop = None
+            self.signals.running.emit(False)
+
+    def stop(self) -> None:
+        if self._loop is None:
+            raise RuntimeError("the server is not running")
+        import server
+
+        self._loop.call_soon_threadsafe(server.stop)
+
+
 class MainWindow(QMainWindow):
     def __init__(self, *, defaultPort: int, hideWhenMinimized: bool) -> None:
         super().__init__()
@@ -95,26 +157,10 @@ class MainWindow(QMainWindow):
         # TODO: self.tray.setContextMenu()
         self.tray.hide()
 
-        # Check for app updates on the GitHub repository
-        githubUser: str = "someweisguy"
-        repoName: str = "NSOBridge"
-        try:
-            response = requests.get(
-                f"https://api.github.com/repos/{githubUser}/{repoName}/releases/latest"
-            )
-            response.json()["name"]
-            # TODO: get update link
-        except KeyError:
-            errorStr: str = "Could not get the latest app version."
-        except requests.ConnectionError:
-            errorStr: str = "Could not connect to the internet."
-        finally:
-            updatesLabel.setText(f"Unable to check for updates. {errorStr}")
-            updatesLabel.show()
-
         # Start the application server
         self.controller: Controller = Controller(defaultPort)
         self.controller.signals.running.connect(self.serverRunCallback)
+        self.controller.signals.error.connect(self.serverErrorCallback)
         self.startStopServer()
 
     def closeEvent(self, event: QCloseEvent) -> None:
@@ -221,4 +267,5 @@ if __name__ == "__main__":
     qt.setHighDpiScaleFactorRoundingPolicy(Qt.Round)  # Compensate for scaling
     mainWindow: MainWindow = MainWindow(defaultPort=8000, hideWhenMinimized=True)
     mainWindow.show()
+    startup.startup.mark("window")
     exit(qt.exec())
@@ -0,0 +1,251 @@
+from __future__ import annotations
+from dataclasses import asdict, is_dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, BinaryIO, ClassVar, Iterator
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+
+class Journal:
+    '''An append-only log of the commands which were applied to the game
+    state. Entries are written and synced to disk by a background thread so
+    that appending an entry never blocks the event loop. Entries which are
+    appended while the previous entries are being synced are written together
+    and synced once.
+
+    A new journal starts with an entry which holds the complete game state
+    to which its commands are applied, e.g. the UUIDs which they refer to.
+    '''
+
+    # The command name of an entry which holds the complete game state
+    STATE: ClassVar[str] = '$state'
+
+    def __init__(self, path: Path, *, interval: float = 0.01) -> None:
+        '''Instantiates a new Journal. The Journal must be opened before
+        entries can be appended.
+
+        Args:
+            path (Path): The path of the journal file.
+            interval (float, optional): The maximum number of seconds to wait
+            for more entries before writing and syncing a batch of entries.
+            Defaults to 0.01.
+        '''
+        self._path: Path = path
+        self._interval: float = interval
+        self._queue: queue.SimpleQueue[None | int | bytes] = (
+            queue.SimpleQueue())
+        self._thread: None | threading.Thread = None
+        self._sequence: int = 0
+        self._writes: int = 0
+        self._syncs: int = 0
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def sequence(self) -> int:
+        '''The sequence number of the most recently appended entry.'''
+        return self._sequence
+
+    @property
+    def stats(self) -> dict[str, int]:
+        '''The number of entries which were written to disk and the number of
+        times the journal file was synced.
+        '''
+        return {'writes': self._writes, 'syncs': self._syncs}
+
+    @staticmethod
+    def read(path: Path) -> Iterator[dict[str, Any]]:
+        '''Reads the entries of a journal file in the order in which they were
+        appended. A partially written entry at the end of the file, which is
+        left behind if the process crashed while writing it, is ignored.
+
+        Args:
+            path (Path): The path of the journal file.
+
+        Yields:
+            dict: Each entry containing its sequence number `seq`, the
+            `command` name, the command `args`, and the `timestamp` of the
+            command.
+        '''
+        if not path.exists():
+            return
+        with open(path, 'rb') as file:
+            for line in file:
+                try:
+                    entry: dict[str, Any] = json.loads(line)
+                except ValueError:
+                    log.warning(f'Ignoring a corrupt entry in \'{path}\'')
+                    continue
+                entry['timestamp'] = datetime.fromisoformat(
+                    entry['timestamp'])
+                yield entry
+
+    def open(self, sequence: int = 0) -> None:
+        '''Starts the background thread which appends entries to the journal
+        file. A partially written entry at the end of the journal file is
+        removed first, so that it doesn't hide the next entry.
+
+        Args:
+            sequence (int, optional): The sequence number of the last entry in
+            the journal file. Defaults to 0.
+
+        Raises:
+            RuntimeError: if the Journal is already open.
+        '''
+        if self._thread is not None:
+            raise RuntimeError('this Journal is already open')
+        self._truncate()
+        self._sequence = sequence
+        self._thread = threading.Thread(target=self._run, name='Journal',
+                                        daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        '''Writes all pending entries to the journal file and stops the
+        background thread.
+        '''
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def append(self, command: str, args: dict[str, Any],
+               timestamp: datetime) -> int:
+        '''Appends a command to the journal. The entry is written to disk in
+        the background.
+
+        Args:
+            command (str): The name of the command.
+            args (dict): The arguments with which the command was called.
+            Arguments which are dataclasses, such as URIs, are stored as
+            dictionaries.
+            timestamp (datetime): The server timestamp of the command.
+
+        Raises:
+            RuntimeError: if the Journal is not open.
+
+        Returns:
+            int: The sequence number of the entry.
+        '''
+        if self._thread is None:
+            raise RuntimeError('this Journal is not open')
+        self._sequence += 1
+        entry: dict[str, Any] = {
+            'seq': self._sequence,
+            'command': command,
+            'args': args,
+            'timestamp': timestamp.isoformat(),
+        }
+        line: str = json.dumps(entry, separators=(',', ':'),
+                               default=Journal._encodeDefault)
+        self._queue.put(line.encode() + b'\n')
+        return self._sequence
+
+    def compact(self, sequence: int) -> None:
+        '''Removes the entries up to and including a sequence number from the
+        journal file, e.g. once they are included in a snapshot. The journal
+        file is rewritten in the background after all previously appended
+        entries have been written.
+
+        Args:
+            sequence (int): The sequence number of the last entry to remove.
+
+        Raises:
+            RuntimeError: if the Journal is not open.
+        '''
+        if self._thread is None:
+            raise RuntimeError('this Journal is not open')
+        self._queue.put(sequence)
+
+    def _truncate(self) -> None:
+        # Remove a partially written entry at the end of the file, which is
+        # left behind if the process crashed while writing it, so that the
+        # next entry isn't appended to it and lost with it
+        if not self._path.exists():
+            return
+        with open(self._path, 'r+b') as file:
+            end: int = file.seek(0, os.SEEK_END)
+            position: int = end
+            while position > 0:
+                start: int = max(0, position - 4096)
+                file.seek(start)
+                index: int = file.read(position - start).rfind(b'\n')
+                if index >= 0:
+                    position = start + index + 1
+                    break
+                position = start
+            if position < end:
+                file.truncate(position)
+                file.flush()
+                os.fsync(file.fileno())
+                log.warning(f'Removed a partially written entry from '
+                            f'\'{self._path}\' ({end - position} bytes)')
+
+    @staticmethod
+    def _encodeDefault(value: Any) -> Any:
+        if is_dataclass(value) and not isinstance(value, type):
+            return asdict(value)
+        if isinstance(value, datetime):
+            return value.isoformat()
+        raise TypeError(f'{type(value).__name__} can\'t be journaled')
+
+    def _run(self) -> None:
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        file: BinaryIO = open(self._path, 'ab')
+        try:
+            item: None | int | bytes = b''
+            while item is not None:
+                # Wait for an entry, then collect the entries which follow it
+                item = self._queue.get()
+                batch: list[bytes] = []
+                deadline: float = time.monotonic() + self._interval
+                while isinstance(item, bytes):
+                    batch.append(item)
+                    remaining: float = deadline - time.monotonic()
+                    try:
+                        item = (self._queue.get(timeout=remaining)
+                                if remaining > 0 else self._queue.get_nowait())
+                    except queue.Empty:
+                        item = b''
+                        break
+
+                # Write the batch and sync it to disk once
+                if len(batch) > 0:
+                    file.write(b''.join(batch))
+                    file.flush()
+                    os.fsync(file.fileno())
+                    self._writes += len(batch)
+                    self._syncs += 1
+
+                if isinstance(item, int):
+                    file.close()
+                    self._rewrite(item)
+                    file = open(self._path, 'ab')
+        finally:
+            file.close()
+
+    def _rewrite(self, sequence: int) -> None:
+        temporary: Path = self._path.with_name(f'{self._path.name}.tmp')
+        with open(self._path, 'rb') as source, open(temporary, 'wb') as file:
+            for line in source:
+                try:
+                    if json.loads(line)['seq'] <= sequence:
+                        continue
+                except ValueError:
+                    continue  # Drop corrupt entries
+                file.write(line)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self._path)
+
+
+# The journal logging instance
+log: logging.Logger = logging.getLogger(__name__)
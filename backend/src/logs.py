@@ -0,0 +1,160 @@
+from __future__ import annotations
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, ClassVar, Hashable
+import atexit
+import copy
+import logging
+import queue
+
+
+class Sampler(logging.Filter):
+    '''A filter which passes only the first of every `every` records with the
+    same message, so that events which happen many times per second can be
+    logged during a game without flooding the log or the logging thread.
+
+    Records are grouped by their unformatted message, so sampled records must
+    be logged with lazy arguments, e.g. `log.debug('Emit: %s', event)`, rather
+    than with an f-string. Records which pass have a `sampled` attribute with
+    the sampling rate.
+    '''
+
+    def __init__(self, every: int = 1) -> None:
+        '''Instantiates a new Sampler.
+
+        Args:
+            every (int, optional): One of every this many records with the
+            same message is passed. Defaults to 1, which passes every record.
+
+        Raises:
+            ValueError: if the sampling rate is less than one.
+        '''
+        super().__init__()
+        self._every: int = 1
+        self._counts: dict[tuple[str, Hashable], int] = dict()
+        self.every = every
+
+    @property
+    def every(self) -> int:
+        '''One of every this many records with the same message is passed.'''
+        return self._every
+
+    @every.setter
+    def every(self, every: int) -> None:
+        if every < 1:
+            raise ValueError('the sampling rate must be at least one')
+        self._every = every
+        self._counts.clear()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self._every == 1:
+            return True
+        key: tuple[str, Hashable] = (record.name, record.msg)
+        count: int = self._counts.get(key, 0)
+        self._counts[key] = count + 1
+        if count % self._every != 0:
+            return False
+        record.sampled = self._every
+        return True
+
+
+class FieldFormatter(logging.Formatter):
+    '''A formatter which appends the structured fields of a record to its
+    message as `key=value` pairs. Fields are passed to the logger as a
+    dictionary with `extra={'fields': {...}}`. Values which contain spaces or
+    quotes are quoted, so that the pairs can be parsed by log processors.
+    '''
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        message: str = super().formatMessage(record)
+        pairs: list[str] = [
+            f'{key}={FieldFormatter._quote(value)}'
+            for key, value in getattr(record, 'fields', {}).items()
+        ]
+        sampled: int = getattr(record, 'sampled', 1)
+        if sampled > 1:
+            pairs.append(f'sampled=1/{sampled}')
+        return ' '.join((message, *pairs)) if len(pairs) > 0 else message
+
+    @staticmethod
+    def _quote(value: Any) -> str:
+        text: str = str(value)
+        if text == '' or any(c in text for c in ' "=\n'):
+            text = '"' + text.replace('\\', '\\\\').replace(
+                '"', '\\"').replace('\n', '\\n') + '"'
+        return text
+
+
+class DeferredQueueHandler(QueueHandler):
+    '''A handler which hands records to a queue without formatting them. The
+    records are formatted and written by the handlers of a QueueListener in a
+    background thread, so that logging never blocks the event loop on string
+    formatting or on a slow terminal.
+
+    Arguments which are mutable containers are copied shallowly, so that
+    changes which are made to them after the record was logged are not
+    logged. Records which don't fit into the queue are dropped and counted.
+    '''
+
+    # The maximum number of records waiting to be written
+    DEPTH: ClassVar[int] = 10000
+
+    def __init__(self, depth: int = DEPTH) -> None:
+        '''Instantiates a new DeferredQueueHandler with an empty queue.
+
+        Args:
+            depth (int, optional): The maximum number of records waiting to
+            be written. Defaults to `DeferredQueueHandler.DEPTH`.
+        '''
+        super().__init__(queue.Queue(depth))
+        self._dropped: int = 0
+
+    @property
+    def dropped(self) -> int:
+        '''The number of records which were dropped because the queue was
+        full.'''
+        return self._dropped
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if isinstance(record.args, tuple):
+            record.args = tuple(
+                copy.copy(arg) if isinstance(arg, (dict, list, set)) else arg
+                for arg in record.args)
+        elif isinstance(record.args, dict):
+            record.args = dict(record.args)
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self._dropped += 1
+
+
+def configure(level: int = logging.INFO) -> None | DeferredQueueHandler:
+    '''Configures the root logger to hand every record to a background thread
+    which formats it and writes it to stderr. The thread writes the remaining
+    records when the process exits. Like `logging.basicConfig()`, this
+    function does nothing if the root logger already has handlers.
+
+    Args:
+        level (int, optional): The level of the root logger. Defaults to
+        `logging.INFO`.
+
+    Returns:
+        None | DeferredQueueHandler: The handler of the root logger, or None
+        if the root logger was already configured.
+    '''
+    root: logging.Logger = logging.getLogger()
+    if root.hasHandlers():
+        return None
+    stream: logging.StreamHandler = logging.StreamHandler()
+    stream.setFormatter(FieldFormatter(
+        '{levelname}: {message}', datefmt='%m/%d/%Y %H:%M:%S', style='{'))
+    handler: DeferredQueueHandler = DeferredQueueHandler()
+    listener: QueueListener = QueueListener(handler.queue, stream,
+                                            respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    root.addHandler(handler)
+    root.setLevel(level)
+    return handler
@@ -1,4 +1,6 @@
+import startup  # noqa: F401 Imported first so that it times the other imports
 from datetime import datetime
+from pathlib import Path
 from roller_derby.bout import series, Bout, Jam, TEAMS, STOP_REASONS
 from roller_derby.timeout import OFFICIAL
 from server import API, URI
@@ -7,7 +9,7 @@ import server
 
 @server.register
 async def startIntermission(uri: URI, timestamp: datetime) -> API:
-    bout: Bout = series.currentBout
+    bout: Bout = series.getBout(uri.bout)
     bout[uri.period].startIntermission(timestamp)
 
     if uri.period == 1 and not bout[0].isFinalized():
@@ -17,98 +19,130 @@ async def startIntermission(uri: URI, timestamp: datetime) -> API:
 
 @server.register
 async def stopIntermission(uri: URI, timestamp: datetime) -> API:
-    bout: Bout = series.currentBout
+    bout: Bout = series.getBout(uri.bout)
     bout[uri.period].stopIntermission(timestamp)
 
 
 @server.register
 async def beginPeriod(uri: URI, timestamp: datetime) -> API:
-    bout: Bout = series.currentBout
+    bout: Bout = series.getBout(uri.bout)
     bout[bout.currentPeriod].start(timestamp)
 
 
 @server.register
 async def endPeriod(uri: URI, timestamp: datetime) -> API:
-    bout: Bout = series.currentBout
+    bout: Bout = series.getBout(uri.bout)
     bout[bout.currentPeriod].stop(timestamp)
 
 
 @server.register
 async def finalizePeriod(uri: URI, timestamp: datetime) -> API:
-    bout: Bout = series.currentBout
+    bout: Bout = series.getBout(uri.bout)
     bout[bout.currentPeriod].finalize(timestamp)
 
 
-@server.register(name='series')
+@server.register(name='series', readOnly=True, http=True)
 async def getBouts() -> API:
     return [bout.encode() for bout in series._bouts]
 
 
+@server.register
+async def addBout() -> API:
+    # Bouts are played concurrently, e.g. on several tracks of a tournament
+    bout: Bout = series.addBout()
+    bout.update()
+    return bout.encode()
+
+
 @server.register
 async def callTimeout(uri: URI, timestamp: datetime) -> API:
-    bout: Bout = series.currentBout
+    bout: Bout = series.getBout(uri.bout)
     bout.timeout.call(timestamp)
 
 
 @server.register
 async def endTimeout(uri: URI, timestamp: datetime) -> API:
-    bout: Bout = series.currentBout
+    bout: Bout = series.getBout(uri.bout)
     bout.timeout.end(timestamp)
 
 
 @server.register
 async def assignTimeout(uri: URI, team: TEAMS | OFFICIAL) -> API:
-    bout: Bout = series.currentBout
+    bout: Bout = series.getBout(uri.bout)
     bout.timeout.assign(team)
 
 
 @server.register
 async def setTimeoutIsOfficialReview(uri: URI, isOfficialReview: bool) -> API:
-    bout: Bout = series.currentBout
+    bout: Bout = series.getBout(uri.bout)
     bout.timeout.setIsOfficialReview(isOfficialReview)
 
 
 @server.register
 async def setTimeoutIsRetained(uri: URI, isRetained: bool) -> API:
-    bout: Bout = series.currentBout
+    bout: Bout = series.getBout(uri.bout)
     bout.timeout.setIsRetained(isRetained)
 
 
 @server.register
 async def setTimeoutNotes(uri: URI, notes: str) -> API:
-    bout: Bout = series.currentBout
+    bout: Bout = series.getBout(uri.bout)
     bout.timeout.setNotes(notes)
 
 
-@server.register
+@server.register(readOnly=True, http=True)
 async def bout(uri: URI) -> API:
-    # TODO: query different bouts
-    bout: Bout = series.currentBout
+    bout: Bout = series.getBout(uri.bout)
     return bout.encode()
 
 
-@server.register
+@server.register(readOnly=True)
+async def subscribe(uri: URI, session: str) -> API:
+    bout: Bout = series.getBout(uri.bout)
+    if uri.jam == -1 and uri.period == -1:
+        await server.subscribe(session, bout)
+    else:
+        await server.subscribe(session, bout[uri.period][uri.jam])
+
+
+@server.register(readOnly=True)
+async def unsubscribe(uri: URI, session: str) -> API:
+    bout: Bout = series.getBout(uri.bout)
+    if uri.jam == -1 and uri.period == -1:
+        await server.unsubscribe(session, bout)
+    else:
+        await server.unsubscribe(session, bout[uri.period][uri.jam])
+
+
+@server.register(readOnly=True, http=True)
 async def jam(uri: URI) -> API:
-    jam: Jam = series.currentBout[uri.period][uri.jam]
+    jam: Jam = series.getBout(uri.bout)[uri.period][uri.jam]
     return jam.encode()
 
 
+@server.register(readOnly=True, http=True)
+async def clocks(uri: URI) -> API:
+    bout: Bout = series.getBout(uri.bout)
+    return {name: getattr(bout, f'{name}Clock').encode()
+            for name in Bout.CLOCKS}
+
+
 @server.register
 async def startJam(uri: URI, timestamp: datetime) -> API:
     # Start the Jam
-    jam: Jam = series.currentBout[uri.period][uri.jam]
+    jam: Jam = series.getBout(uri.bout)[uri.period][uri.jam]
     jam.start(timestamp)
 
 
 @server.register
 async def stopJam(uri: URI, timestamp: datetime) -> API:
-    jam: Jam = series.currentBout[uri.period][uri.jam]
+    jam: Jam = series.getBout(uri.bout)[uri.period][uri.jam]
     jam.stop(timestamp)
 
 
 @server.register
 async def setJamStopReason(uri: URI, stopReason: STOP_REASONS) -> API:
-    jam: Jam = series.currentBout[uri.period][uri.jam]
+    jam: Jam = series.getBout(uri.bout)[uri.period][uri.jam]
     jam.stopReason = stopReason
 
 
@@ -118,6 +152,8 @@ if __name__ == '__main__':
     import socket
 
     port: int = 8000
+    journal: Path = Path('nsobridge.journal')
+    snapshot: Path = Path('nsobridge.snapshot')
     serverAddress: str = '0.0.0.0'
     with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
         sock.settimeout(0)
@@ -126,4 +162,5 @@ if __name__ == '__main__':
     httpStr: str = f'http://{serverAddress}:{port}'
     server.log.info(f'Starting server at \'{httpStr}\'.')
 
-    asyncio.run(server.serve(port, debug=True))
+    asyncio.run(server.serve(port, debug=True, journal=journal,
+                             snapshot=snapshot, state=series))
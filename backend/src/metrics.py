@@ -0,0 +1,193 @@
+from __future__ import annotations
+from bisect import bisect_left
+from typing import ClassVar, Literal, TypeAlias
+
+
+'''Type alias for the kinds of command errors. Client errors are caused by an
+invalid request and internal errors are caused by a server bug.'''
+ERROR_KINDS: TypeAlias = Literal['client', 'internal']
+
+
+class Histogram:
+    '''Counts observed values in cumulative buckets, as in the Prometheus
+    histogram type.
+    '''
+
+    # The upper bounds of the default buckets, in seconds
+    BUCKETS: ClassVar[tuple[float, ...]] = (
+        0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+        0.1, 0.25, 0.5, 1.0,
+    )
+
+    def __init__(self, buckets: tuple[float, ...] = BUCKETS) -> None:
+        '''Instantiates a new Histogram.
+
+        Args:
+            buckets (tuple[float, ...], optional): The upper bounds of the
+            buckets in ascending order. Values greater than the last bound are
+            only counted in the implicit `+Inf` bucket. Defaults to
+            `Histogram.BUCKETS`.
+        '''
+        self._buckets: tuple[float, ...] = buckets
+        self._counts: list[int] = [0] * (len(buckets) + 1)
+        self._sum: float = 0
+        self._count: int = 0
+
+    @property
+    def sum(self) -> float:
+        return self._sum
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def observe(self, value: float) -> None:
+        '''Counts a value in the first bucket whose upper bound is greater
+        than or equal to it.
+
+        Args:
+            value (float): The value to observe.
+        '''
+        self._counts[bisect_left(self._buckets, value)] += 1
+        self._sum += value
+        self._count += 1
+
+    def getBuckets(self) -> list[tuple[str, int]]:
+        '''Gets the cumulative count of each bucket.
+
+        Returns:
+            list: The upper bound of each bucket as a string, ending with
+            `+Inf`, and the number of observed values less than or equal to it.
+        '''
+        buckets: list[tuple[str, int]] = []
+        total: int = 0
+        for bound, count in zip((*self._buckets, '+Inf'), self._counts):
+            total += count
+            buckets.append((str(bound), total))
+        return buckets
+
+
+class Metrics:
+    '''Collects the performance metrics of the server and renders them in
+    the Prometheus text exposition format. Recording a metric is a few
+    dictionary operations, so it is cheap enough to do on every command and
+    every emit.
+    '''
+
+    PREFIX: ClassVar[str] = 'nsobridge'
+
+    def __init__(self) -> None:
+        '''Instantiates a new Metrics collection.'''
+        self._commands: dict[str, Histogram] = dict()
+        self._errors: dict[tuple[str, ERROR_KINDS], int] = dict()
+        self._emits: dict[str, list[int]] = dict()
+
+    def observeCommand(self, command: str, seconds: float,
+                       error: None | ERROR_KINDS = None) -> None:
+        '''Records the handling of a command.
+
+        Args:
+            command (str): The name of the command.
+            seconds (float): The time spent handling the command.
+            error (None | ERROR_KINDS, optional): The kind of error raised by
+            the command, or None if it succeeded. Defaults to None.
+        '''
+        if command not in self._commands:
+            self._commands[command] = Histogram()
+        self._commands[command].observe(seconds)
+        if error is not None:
+            key: tuple[str, ERROR_KINDS] = (command, error)
+            self._errors[key] = self._errors.get(key, 0) + 1
+
+    def observeEmit(self, event: str, recipients: int, size: int) -> None:
+        '''Records an emitted event.
+
+        Args:
+            event (str): The name of the event.
+            recipients (int): The number of client sessions the event reached.
+            size (int): The size of the encoded event in bytes, which is
+            counted once however many sessions it reached.
+        '''
+        if event not in self._emits:
+            self._emits[event] = [0, 0, 0]
+        counters: list[int] = self._emits[event]
+        counters[0] += 1
+        counters[1] += recipients
+        counters[2] += size
+
+    def render(self,
+               counters: None | dict[str, tuple[str, int | float]] = None,
+               gauges: None | dict[str, tuple[str, int | float]] = None,
+               histograms: None | dict[str, tuple[str, Histogram]] = None
+               ) -> str:
+        '''Renders the metrics in the Prometheus text exposition format.
+
+        Args:
+            counters (None | dict, optional): Additional unlabeled counters to
+            render, by name, as a tuple of their help text and value. Defaults
+            to None.
+            gauges (None | dict, optional): The unlabeled gauges to render, by
+            name, as a tuple of their help text and value. Defaults to None.
+            histograms (None | dict, optional): Additional unlabeled
+            histograms to render, by name, as a tuple of their help text and
+            Histogram. Defaults to None.
+
+        Returns:
+            str: The rendered metrics.
+        '''
+        lines: list[str] = []
+
+        name: str = f'{Metrics.PREFIX}_command_duration_seconds'
+        Metrics._addHeader(lines, name, 'histogram',
+                           'Time spent handling each command.')
+        for command, histogram in sorted(self._commands.items()):
+            label: str = f'command="{Metrics._escape(command)}"'
+            for bound, count in histogram.getBuckets():
+                lines.append(f'{name}_bucket{{{label},le="{bound}"}} {count}')
+            lines.append(f'{name}_sum{{{label}}} {histogram.sum}')
+            lines.append(f'{name}_count{{{label}}} {histogram.count}')
+
+        name = f'{Metrics.PREFIX}_command_errors_total'
+        Metrics._addHeader(lines, name, 'counter',
+                           'Commands which failed, by kind of error.')
+        for (command, kind), count in sorted(self._errors.items()):
+            lines.append(f'{name}{{command="{Metrics._escape(command)}",'
+                         f'kind="{kind}"}} {count}')
+
+        for index, (suffix, text) in enumerate((
+                ('emits_total', 'Events emitted to clients.'),
+                ('emit_recipients_total',
+                 'Client sessions reached by emitted events.'),
+                ('emit_bytes_total',
+                 'Encoded bytes of emitted events.'))):
+            name = f'{Metrics.PREFIX}_{suffix}'
+            Metrics._addHeader(lines, name, 'counter', text)
+            for event, values in sorted(self._emits.items()):
+                lines.append(f'{name}{{event="{Metrics._escape(event)}"}} '
+                             f'{values[index]}')
+
+        for kind, metrics in (('counter', counters), ('gauge', gauges)):
+            for suffix, (text, value) in (metrics or {}).items():
+                name = f'{Metrics.PREFIX}_{suffix}'
+                Metrics._addHeader(lines, name, kind, text)
+                lines.append(f'{name} {value}')
+
+        for suffix, (text, histogram) in (histograms or {}).items():
+            name = f'{Metrics.PREFIX}_{suffix}'
+            Metrics._addHeader(lines, name, 'histogram', text)
+            for bound, count in histogram.getBuckets():
+                lines.append(f'{name}_bucket{{le="{bound}"}} {count}')
+            lines.append(f'{name}_sum {histogram.sum}')
+            lines.append(f'{name}_count {histogram.count}')
+
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _addHeader(lines: list[str], name: str, kind: str, text: str) -> None:
+        lines.append(f'# HELP {name} {text}')
+        lines.append(f'# TYPE {name} {kind}')
+
+    @staticmethod
+    def _escape(value: str) -> str:
+        return (value.replace('\\', '\\\\').replace('"', '\\"')
+                .replace('\n', '\\n'))
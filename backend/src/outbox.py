@@ -0,0 +1,298 @@
+from __future__ import annotations
+from contextvars import ContextVar
+from engineio.packet import Packet
+from functools import partial
+from typing import Any, Awaitable, Callable, ClassVar, Hashable
+import asyncio
+import itertools
+import logging
+import socketio
+import time
+
+
+class Outbox:
+    '''A bounded queue of the messages which are waiting to be sent to one
+    client session. Messages are sent strictly in order, one at a time, and
+    the next message is only handed to the transport once the client has
+    taken the previous one, so a slow client holds its backlog here instead
+    of in an unbounded transport buffer.
+
+    Messages which carry the full state of an object have a key. Queueing a
+    message replaces any queued message with the same key, because the client
+    only needs the newest state. The newer message is moved to the end of the
+    queue so that it is never sent before a message which was queued before
+    it, e.g. the state of an object which it contains.
+    '''
+
+    # The maximum number of queued messages
+    DEPTH: ClassVar[int] = 64
+
+    # Clients whose oldest queued message has waited longer than this many
+    # seconds are slow
+    SLOW_AGE: ClassVar[float] = 2
+
+    def __init__(self, send: Callable[[Packet], Awaitable[None]],
+                 drain: Callable[[], Awaitable[None]], *,
+                 depth: int = DEPTH) -> None:
+        '''Instantiates a new, empty Outbox.
+
+        Args:
+            send (Callable): The coroutine function which hands a packet to
+            the transport of the client.
+            drain (Callable): The coroutine function which waits until the
+            client has taken every packet from its transport.
+            depth (int, optional): The maximum number of queued messages.
+            Defaults to `Outbox.DEPTH`.
+        '''
+        self._send: Callable[[Packet], Awaitable[None]] = send
+        self._drain: Callable[[], Awaitable[None]] = drain
+        self._depth: int = depth
+        self._messages: dict[Hashable, tuple[float, list[Packet]]] = dict()
+        self._counter: itertools.count = itertools.count()
+        self._task: None | asyncio.Task = None
+        self._replaced: int = 0
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    @property
+    def age(self) -> float:
+        '''The number of seconds for which the oldest queued message has been
+        waiting, or zero if the Outbox is empty.'''
+        if len(self._messages) == 0:
+            return 0
+        queued, _ = next(iter(self._messages.values()))
+        return time.monotonic() - queued
+
+    @property
+    def replaced(self) -> int:
+        '''The number of queued messages which were replaced by a newer
+        message with the same key.'''
+        return self._replaced
+
+    def put(self, key: None | Hashable, packets: list[Packet]) -> bool:
+        '''Queues a message to be sent after the messages which are already
+        queued.
+
+        Args:
+            key (None | Hashable): The key of a message which carries the full
+            state of an object, or None if the message can't be replaced.
+            packets (list[Packet]): The Engine.IO packets of the message.
+
+        Returns:
+            bool: False if the message was not queued because the Outbox is
+            full.
+        '''
+        queued: float = time.monotonic()
+        if key is not None and key in self._messages:
+            # Keep waiting since the replaced message was queued
+            queued, _ = self._messages.pop(key)
+            self._replaced += 1
+        elif len(self._messages) >= self._depth:
+            return False
+        if key is None:
+            key = next(self._counter)
+        self._messages[key] = (queued, packets)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return True
+
+    def close(self) -> None:
+        '''Discards the queued messages and stops sending.'''
+        self._messages.clear()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        try:
+            while len(self._messages) > 0:
+                key: Hashable = next(iter(self._messages))
+                _, packets = self._messages.pop(key)
+                for packet in packets:
+                    await self._send(packet)
+                await self._drain()
+        except Exception as e:
+            # The client is gone, so nothing more can be sent to it
+            self._messages.clear()
+            log.debug(f'Unable to send to a client: {type(e).__name__}: '
+                      f'{str(e)}')
+        finally:
+            self._task = None
+
+
+class OutboxServer(socketio.AsyncServer):
+    '''A Socket.IO server which sends every emitted event through an Outbox
+    per client session. Events which are emitted with a key carry the full
+    state of an object, so a queued event is replaced by a newer event with
+    the same key. The key is computed once per broadcast by the emitter, e.g.
+    from the name of the event and the UUID of the object, instead of being
+    decoded from the payload for every recipient.
+
+    Sessions whose Outbox has been waiting longer than `Outbox.SLOW_AGE` are
+    reported as slow. Sessions whose Outbox is full are disconnected, so that
+    a client on a bad connection can't hold an unbounded amount of server
+    memory. Disconnected clients reconnect and receive the current state.
+
+    Acknowledgements, events with callbacks, and connection packets are sent
+    directly, so that e.g. the replies to clock probes aren't delayed behind
+    queued broadcasts. This class overrides private methods of
+    `socketio.AsyncServer`, so `backend/requirements.txt` pins its version.
+    '''
+
+    # The key of the event which is being emitted in the current context. It
+    # is a context variable so that it reaches the tasks which send the event
+    # to each recipient, and so that pub/sub managers can relay it.
+    key: ClassVar[ContextVar[None | str]] = ContextVar('key', default=None)
+
+    # The sizes of the encoded packets of the event which is being emitted in
+    # the current context, by packet, so that a packet which is sent to many
+    # sessions is only counted once
+    sizes: ClassVar[ContextVar[None | dict[int, int]]] = ContextVar(
+        'sizes', default=None)
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._outboxes: dict[str, Outbox] = dict()
+        # The header and packets of binary messages awaiting attachments
+        self._partial: dict[str, tuple[Packet, list[Packet]]] = dict()
+        self._slow: set[str] = set()
+        self._replaced: int = 0
+        self._disconnected: int = 0
+
+    @property
+    def stats(self) -> dict[str, int]:
+        '''The counters of the Outboxes. The `queued` counter is the number
+        of messages which are currently queued, `slow` is the number of
+        sessions which are currently slow, `replaced` is the number of queued
+        messages which were replaced by a newer message, and `disconnected`
+        is the number of sessions which were disconnected because their
+        Outbox was full.
+        '''
+        return {
+            'queued': sum(len(outbox) for outbox in self._outboxes.values()),
+            'slow': len(self._slow),
+            'replaced': self._replaced + sum(
+                outbox.replaced for outbox in self._outboxes.values()),
+            'disconnected': self._disconnected,
+        }
+
+    async def emit(self, *args: Any, key: None | str = None,
+                   **kwargs: Any) -> int:
+        '''Emits an event like `socketio.AsyncServer.emit()`.
+
+        Args:
+            key (None | str, optional): The key of an event which carries the
+            full state of an object, or None if the event can't be replaced by
+            a newer event. Defaults to None.
+
+        Returns:
+            int: The size of the event as it was encoded by Socket.IO, or as
+            it was published by the pub/sub manager, in bytes.
+        '''
+        sizes: dict[int, int] = dict()
+        keyToken: Any = OutboxServer.key.set(key)
+        sizesToken: Any = OutboxServer.sizes.set(sizes)
+        try:
+            await super().emit(*args, **kwargs)
+        finally:
+            OutboxServer.key.reset(keyToken)
+            OutboxServer.sizes.reset(sizesToken)
+        return sum(sizes.values())
+
+    async def _send_eio_packet(self, eio_sid: str, eio_pkt: Packet) -> None:
+        sizes: None | dict[int, int] = OutboxServer.sizes.get()
+        if sizes is not None and isinstance(eio_pkt.data, (str, bytes)):
+            # Socket.IO encodes JSON as ASCII, so characters are bytes
+            sizes[id(eio_pkt)] = len(eio_pkt.data)
+
+        # Binary events are sent as a header followed by their attachments
+        waiting: None | tuple[Packet, list[Packet]] = self._partial.pop(
+            eio_sid, None)
+        if waiting is not None:
+            header, packets = waiting
+            packets.append(eio_pkt)
+            if len(packets) <= OutboxServer._getAttachmentCount(header):
+                self._partial[eio_sid] = (header, packets)
+                return
+        elif OutboxServer._getAttachmentCount(eio_pkt) > 0:
+            self._partial[eio_sid] = (eio_pkt, [eio_pkt])
+            return
+        else:
+            packets = [eio_pkt]
+
+        if not OutboxServer._isQueued(packets[0]):
+            for packet in packets:
+                await self.eio.send_packet(eio_sid, packet)
+            return
+        outbox: None | Outbox = self._outboxes.get(eio_sid, None)
+        if outbox is None:
+            socket: Any = self.eio.sockets.get(eio_sid, None)
+            if socket is None or socket.closing:
+                return  # The session is being disconnected
+            outbox = Outbox(partial(self.eio.send_packet, eio_sid),
+                            partial(self._drain, eio_sid))
+            self._outboxes[eio_sid] = outbox
+        if not outbox.put(OutboxServer.key.get(), packets):
+            log.warning(f'Disconnecting session \'{eio_sid}\' because '
+                        f'{len(outbox)} messages are waiting to be sent')
+            self._disconnected += 1
+            self._closeOutbox(eio_sid)
+            self.start_background_task(self.eio.disconnect, eio_sid)
+            return
+        if eio_sid not in self._slow and outbox.age > Outbox.SLOW_AGE:
+            self._slow.add(eio_sid)
+            log.warning(f'Session \'{eio_sid}\' is slow: {len(outbox)} '
+                        f'messages are waiting for up to {outbox.age:.1f} s')
+        elif eio_sid in self._slow and outbox.age <= Outbox.SLOW_AGE:
+            self._slow.discard(eio_sid)
+            log.info(f'Session \'{eio_sid}\' has caught up')
+
+    async def _handle_eio_disconnect(self, eio_sid: str,
+                                     reason: Any = None) -> None:
+        self._closeOutbox(eio_sid)
+        await super()._handle_eio_disconnect(eio_sid, reason)
+
+    def _closeOutbox(self, eio_sid: str) -> None:
+        self._partial.pop(eio_sid, None)
+        self._slow.discard(eio_sid)
+        outbox: None | Outbox = self._outboxes.pop(eio_sid, None)
+        if outbox is not None:
+            self._replaced += outbox.replaced
+            outbox.close()
+
+    async def _drain(self, eio_sid: str) -> None:
+        socket: Any = self.eio.sockets.get(eio_sid, None)
+        if socket is not None and not socket.closed:
+            await socket.queue.join()
+
+    @staticmethod
+    def _isQueued(eio_pkt: Packet) -> bool:
+        # Only events are queued, unless the client must acknowledge them, in
+        # which case they have an ID before their data, e.g. '212["event"]'
+        data: Any = eio_pkt.data
+        if not isinstance(data, str):
+            return True
+        if data[:1] == '2':
+            data = data[1:]
+        elif data[:1] == '5':
+            data = data[1:].partition('-')[2]
+        else:
+            return False
+        if data[:1] == '/':
+            data = data.partition(',')[2]  # Skip the namespace
+        return not data[:1].isdigit()
+
+    @staticmethod
+    def _getAttachmentCount(eio_pkt: Packet) -> int:
+        # Binary event headers start with the type and attachment count, e.g.
+        # '51-["event",{"_placeholder":true,"num":0}]'
+        data: Any = eio_pkt.data
+        if not isinstance(data, str) or data[:1] != '5':
+            return 0
+        count, dash, _ = data[1:11].partition('-')
+        return int(count) if dash and count.isdigit() else 0
+
+
+# The outbox logging instance
+log: logging.Logger = logging.getLogger(__name__)
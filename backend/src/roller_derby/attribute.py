@@ -35,6 +35,8 @@ class TeamAttribute[U: AbstractAttribute](Encodable):
         # Don't call super().__init__() to avoid creating a UUID
         home._teamParent = self
         away._teamParent = self
+        home._encodingParent = self
+        away._encodingParent = self
         self._home: U = home
         self._away: U = away
 
@@ -54,7 +56,13 @@ class TeamAttribute[U: AbstractAttribute](Encodable):
     def away(self) -> U:
         return self._away
 
-    def encode(self) -> dict[str, Encodable.PRIMITIVE]:
+    def getState(self) -> dict[str, Encodable.PRIMITIVE]:
+        return {
+            'home': self._home.getState(),
+            'away': self._away.getState()
+        }
+
+    def _encode(self) -> dict[str, Encodable.PRIMITIVE]:
         return {
             'home': self._home.encode(),
             'away': self._away.encode()
@@ -65,6 +73,7 @@ class TeamOfficialAttribute[U: AbstractAttribute](TeamAttribute[U]):
     def __init__(self, home: U, away: U, official: U) -> None:
         super().__init__(home, away)
         official._teamParent = self
+        official._encodingParent = self
         self._official: U = official
 
     def __getitem__(self, team: TEAMS | OFFICIAL) -> U:
@@ -77,8 +86,14 @@ class TeamOfficialAttribute[U: AbstractAttribute](TeamAttribute[U]):
     def official(self) -> U:
         return self._official
 
-    def encode(self) -> dict[str, Encodable.PRIMITIVE]:
+    def getState(self) -> dict[str, Encodable.PRIMITIVE]:
+        return {
+            **super().getState(),
+            'official': self._official.getState()
+        }
+
+    def _encode(self) -> dict[str, Encodable.PRIMITIVE]:
         return {
-            **super().encode(),
+            **super()._encode(),
             'official': self._official.encode()
         }
@@ -5,8 +5,9 @@ from roller_derby.score import Score
 from roller_derby.timeout import TimeoutAttribute
 from roller_derby.timer import Timer
 from server import Encodable
-from typing import get_args, Literal, TypeAlias
+from typing import Callable, Collection, get_args, Literal, TypeAlias
 import server
+import uuid
 
 
 TEAMS: TypeAlias = Literal['home', 'away']
@@ -15,8 +16,16 @@ STOP_REASONS: TypeAlias = Literal['time', 'called', 'injury', 'other']
 
 class Series(Encodable):
     def __init__(self) -> None:
+        # The UUID of each Bout is derived from the UUID of its Series and its
+        # number. The UUID of the Series is journaled and snapshotted, so
+        # replaying the journal recreates the Bouts which the journaled
+        # commands refer to.
         super().__init__()
-        self._bouts: list[Bout] = [Bout()]
+        self._bouts: list[Bout] = []
+        # The Bouts indexed by UUID, so commands find their Bout in constant
+        # time however many Bouts are live
+        self._index: dict[str, Bout] = dict()
+        self.addBout()
 
     @property
     def bouts(self) -> list[Bout]:
@@ -26,7 +35,72 @@ class Series(Encodable):
     def currentBout(self) -> Bout:
         return self._bouts[-1]  # TODO: remove this property
 
-    def encode(self) -> dict[str, Encodable.PRIMITIVE]:
+    def getBout(self, boutUuid: str) -> Bout:
+        # An empty UUID refers to the latest Bout, for clients which predate
+        # concurrent Bouts
+        if not boutUuid:
+            return self._bouts[-1]
+        bout: None | Bout = self._index.get(boutUuid, None)
+        if bout is None:
+            raise server.ClientException(f'Unknown bout \'{boutUuid}\'.')
+        return bout
+
+    def addBout(self) -> Bout:
+        bout: Bout = Bout()
+        bout._uuid = uuid.uuid5(self._uuid, str(len(self._bouts)))
+        bout._encodingParent = self
+        self._bouts.append(bout)
+        self._index[bout.uuid] = bout
+        self.markDirty()
+        return bout
+
+    def getState(self) -> dict[str, Encodable.PRIMITIVE]:
+        return {
+            'uuid': self.uuid,
+            'bouts': [bout.getState() for bout in self._bouts],
+        }
+
+    @classmethod
+    def decode(cls, json: Encodable.PRIMITIVE, parent: None = None) -> Series:
+        series: Series = Series()
+        series.restore(json)
+        return series
+
+    def restore(self, json: Encodable.PRIMITIVE) -> None:
+        for bout in self._bouts:
+            bout.close()
+        self._uuid = uuid.UUID(json['uuid'])
+        self._bouts = [Bout.decode(bout) for bout in json['bouts']]
+        self._index = {bout.uuid: bout for bout in self._bouts}
+        for bout in self._bouts:
+            bout._encodingParent = self
+        self.markDirty()
+
+    def checkpoint(self, uris: Collection[server.URI]) -> Callable[[], None]:
+        # Only save the Bouts which the URIs refer to, which are restored in
+        # place so that other Bouts are neither copied nor marked dirty
+        count: int = len(self._bouts)
+        states: dict[str, tuple[Bout, Encodable.PRIMITIVE]] = dict()
+        for uri in uris:
+            try:
+                bout: Bout = self.getBout(uri.bout)
+            except server.ClientException:
+                continue
+            if bout.uuid not in states:
+                states[bout.uuid] = (bout, bout.getState())
+
+        def rollback() -> None:
+            for bout in self._bouts[count:]:
+                bout.close()
+                del self._index[bout.uuid]
+            if len(self._bouts) > count:
+                del self._bouts[count:]
+                self.markDirty()
+            for bout, state in states.values():
+                bout.restore(state)
+        return rollback
+
+    def _encode(self) -> dict[str, Encodable.PRIMITIVE]:
         return {
             'bouts': [bout.encode() for bout in self._bouts],
         }
@@ -34,6 +108,8 @@ class Series(Encodable):
 
 class Bout(Encodable):
     API_NAME: str = 'bout'
+    CLOCKS: tuple[str, ...] = ('intermission', 'period', 'lineup', 'jam',
+                               'timeout')
 
     def __init__(self) -> None:
         super().__init__()
@@ -52,6 +128,8 @@ class Bout(Encodable):
                                      self._jamClock, self._timeoutClock)
         for clock in clocks:
             clock.setCallback(lambda _: server.update(self))
+        for clock in (self._intermissionClock, *clocks):
+            clock._encodingParent = self
 
         self._periods: tuple[Period, Period] = (Period(self), Period(self))
         self._periods[0].addJam()
@@ -90,19 +168,61 @@ class Bout(Encodable):
     def timeout(self) -> TimeoutAttribute:
         return self._timeout
 
+    @property
+    def scope(self) -> str:
+        return self.uuid
+
     def update(self) -> None:
         server.update(self)
 
-    def encode(self) -> dict[str, Encodable.PRIMITIVE]:
+    def close(self) -> None:
+        # Cancel the alarms of a Bout which was replaced, e.g. by a restore
+        for name in Bout.CLOCKS:
+            getattr(self, f'_{name}Clock').close()
+
+    def getState(self) -> dict[str, Encodable.PRIMITIVE]:
+        return {
+            'uuid': self.uuid,
+            'clocks': {name: getattr(self, f'_{name}Clock').getState()
+                       for name in Bout.CLOCKS},
+            'periods': [period.getState() for period in self._periods],
+            'overtimeJamNum': self._overtimeJamNum,
+            'timeout': self._timeout.getState(),
+        }
+
+    @classmethod
+    def decode(cls, json: Encodable.PRIMITIVE, parent: None = None) -> Bout:
+        bout: Bout = Bout()
+        bout.restore(json)
+        for name in Bout.CLOCKS:
+            getattr(bout, f'_{name}Clock').resumeAlarm()
+        return bout
+
+    def restore(self, json: Encodable.PRIMITIVE) -> None:
+        # The clocks, Periods, and Jams are restored in place, which keeps
+        # the alarm callbacks of the clocks and the references to them valid
+        self._uuid = uuid.UUID(json['uuid'])
+        for name in Bout.CLOCKS:
+            getattr(self, f'_{name}Clock').restore(json['clocks'][name])
+        for period, state in zip(self._periods, json['periods']):
+            period.restore(state)
+        self._overtimeJamNum = json['overtimeJamNum']
+        self._timeout = TimeoutAttribute.decode(json['timeout'], self)
+        self.markDirty()
+
+    def _encodeClocks(self) -> dict[str, Encodable.PRIMITIVE]:
+        return {
+            'intermission': self._intermissionClock.encode(),
+            'period': self._periodClock.encode(),
+            'lineup': self._lineupClock.encode(),
+            'jam': self._jamClock.encode(),
+            'timeout': self._timeoutClock.encode()
+        }
+
+    def _encode(self) -> dict[str, Encodable.PRIMITIVE]:
         return {
             'uuid': self.uuid,
-            'clocks': {
-                'intermission': self._intermissionClock.encode(),
-                'period': self._periodClock.encode(),
-                'lineup': self._lineupClock.encode(),
-                'jam': self._jamClock.encode(),
-                'timeout': self._timeoutClock.encode()
-            },
+            'clocks': self._encodeClocks(),
             'currentPeriodNum': self.currentPeriod,
             'periods': [period.encode() for period in self._periods],
             'overtimeJamNum': self._overtimeJamNum,
@@ -114,6 +234,7 @@ class Period(Encodable):
     def __init__(self, parent: Bout) -> None:
         # Don't call super().__init__()
         self._parent: Bout = parent
+        self._encodingParent = parent
         self._startTime: None | datetime = None
         self._stopTime: None | datetime = None
         self._finalizedTime: None | datetime = None
@@ -156,6 +277,7 @@ class Period(Encodable):
         if self.parentBout.intermissionClock.isRunning():
             self.parentBout.intermissionClock.stop(timestamp)
         self._startTime = timestamp
+        self.markDirty()
 
         # Start the Lineup clock
         if (not self._jams[-1].isRunning()
@@ -180,6 +302,7 @@ class Period(Encodable):
             if clock.isRunning():
                 clock.stop(timestamp)
         self._stopTime = timestamp
+        self.markDirty()
 
         # Delete all unstarted Jams, if they exist
         if len(self._jams) > 0 and self._jams[0].isStarted():
@@ -195,6 +318,8 @@ class Period(Encodable):
         if self.isFinalized():
             raise RuntimeError('this Period has already been finalized')
         self._finalizedTime = timestamp
+        self.markDirty()
+        self.update()
 
     def isStarted(self) -> bool:
         return self._startTime is not None
@@ -214,12 +339,43 @@ class Period(Encodable):
         if self.isFinalized():
             raise RuntimeError('cannot add a Jam to a finalized Period')
         self._jams.append(Jam(self))
+        self.markDirty()
         self.update()
 
     def update(self) -> None:
         self.parentBout.update()
 
-    def encode(self) -> dict[str, Encodable.PRIMITIVE]:
+    def getState(self) -> dict[str, Encodable.PRIMITIVE]:
+        return {
+            'startTime': Encodable.dumpTime(self._startTime),
+            'stopTime': Encodable.dumpTime(self._stopTime),
+            'finalizedTime': Encodable.dumpTime(self._finalizedTime),
+            'jams': [jam.getState() for jam in self._jams],
+        }
+
+    @classmethod
+    def decode(cls, json: Encodable.PRIMITIVE, parent: Bout) -> Period:
+        period: Period = Period(parent)
+        period.restore(json)
+        return period
+
+    def restore(self, json: Encodable.PRIMITIVE) -> None:
+        self._startTime = Encodable.loadTime(json['startTime'])
+        self._stopTime = Encodable.loadTime(json['stopTime'])
+        self._finalizedTime = Encodable.loadTime(json['finalizedTime'])
+
+        # Keep the Jams which still exist and restore them in place
+        jams: dict[str, Jam] = {jam.uuid: jam for jam in self._jams}
+        self._jams = []
+        for state in json['jams']:
+            jam: None | Jam = jams.get(state['uuid'], None)
+            if jam is None:
+                jam = Jam(self)
+            jam.restore(state)
+            self._jams.append(jam)
+        self.markDirty()
+
+    def _encode(self) -> dict[str, Encodable.PRIMITIVE]:
         return {
             'startTime': (str(self._startTime) if self._startTime is not None
                           else None),
@@ -244,8 +400,13 @@ class Jam(Encodable):
 
         self._score: TeamAttribute[Score] = TeamAttribute(Score(self),
                                                           Score(self))
+        self._score._encodingParent = self
         # TODO: self._lineup
 
+        # Jams are never moved within their Bout, so their scope is only
+        # computed once
+        self._scope: None | str = None
+
     @property
     def parentPeriod(self) -> Period:
         return self._parent
@@ -254,6 +415,15 @@ class Jam(Encodable):
     def parentBout(self) -> Bout:
         return self._parent.parentBout
 
+    @property
+    def scope(self) -> str:
+        if self._scope is None:
+            period: Period = self.parentPeriod
+            periodNum: int = self.parentBout._periods.index(period)
+            self._scope = (f'{self.parentBout.scope}/{periodNum}/'
+                           f'{period._jams.index(self)}')
+        return self._scope
+
     @property
     def stopReason(self) -> None | STOP_REASONS:
         return self._stopReason
@@ -264,6 +434,7 @@ class Jam(Encodable):
             raise ValueError((f'stopReason must be None or one of '
                               f'{get_args(STOP_REASONS)}'))
         self._stopReason = stopReason
+        self.markDirty()
         self.update()
 
     @property
@@ -291,11 +462,14 @@ class Jam(Encodable):
         self.parentBout.jamClock.start(timestamp)
 
         self._startTime = timestamp
+        self.markDirty()
 
         # Start the Period if it isn't started already
         if not self.parentPeriod.isStarted():
             self.parentPeriod.start(timestamp)
 
+        # The clocks of the Bout have changed as well
+        self.parentBout.update()
         self.update()
 
     def stop(self, timestamp: datetime) -> None:
@@ -318,8 +492,11 @@ class Jam(Encodable):
 
         # Stop this Jam and instantiate a new one
         self._stopTime = timestamp
+        self.markDirty()
         self.parentPeriod.addJam()
 
+        # The clocks of the Bout have changed as well
+        self.parentBout.update()
         self.update()
 
     def isStarted(self) -> bool:
@@ -332,10 +509,35 @@ class Jam(Encodable):
         return self.isStarted() and not self.isStopped()
 
     def update(self) -> None:
+        # The Bout doesn't encode the contents of its Jams, so it is only
+        # updated by changes which also affect the Bout, e.g. its clocks
         server.update(self)
-        self.parentPeriod.update()
 
-    def encode(self) -> dict[str, Encodable.PRIMITIVE]:
+    def getState(self) -> dict[str, Encodable.PRIMITIVE]:
+        return {
+            'uuid': self.uuid,
+            'startTime': Encodable.dumpTime(self._startTime),
+            'stopTime': Encodable.dumpTime(self._stopTime),
+            'stopReason': self._stopReason,
+            'score': self._score.getState(),
+        }
+
+    @classmethod
+    def decode(cls, json: Encodable.PRIMITIVE, parent: Period) -> Jam:
+        jam: Jam = Jam(parent)
+        jam.restore(json)
+        return jam
+
+    def restore(self, json: Encodable.PRIMITIVE) -> None:
+        self._uuid = uuid.UUID(json['uuid'])
+        self._startTime = Encodable.loadTime(json['startTime'])
+        self._stopTime = Encodable.loadTime(json['stopTime'])
+        self._stopReason = json['stopReason']
+        for team in ('home', 'away'):
+            self._score[team].restore(json['score'][team])
+        self.markDirty()
+
+    def _encode(self) -> dict[str, Encodable.PRIMITIVE]:
         return {
             'uuid': self.uuid,
             'startTime': (str(self._startTime) if self._startTime is not None
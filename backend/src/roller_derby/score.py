@@ -4,6 +4,7 @@ from roller_derby.attribute import AbstractAttribute
 from server import Encodable
 from typing import TYPE_CHECKING
 import server
+import uuid
 
 if TYPE_CHECKING:
     from roller_derby.bout import Jam
@@ -15,7 +16,21 @@ class Trip(Encodable):
         self.points: int = points
         self.timestamp: datetime = timestamp
 
-    def encode(self) -> dict[str, Encodable.PRIMITIVE]:
+    def getState(self) -> dict[str, Encodable.PRIMITIVE]:
+        return {
+            'uuid': self.uuid,
+            'points': self.points,
+            'timestamp': Encodable.dumpTime(self.timestamp),
+        }
+
+    @classmethod
+    def decode(cls, json: Encodable.PRIMITIVE, parent: None = None) -> Trip:
+        trip: Trip = Trip(json['points'],
+                          Encodable.loadTime(json['timestamp']))
+        trip._uuid = uuid.UUID(json['uuid'])
+        return trip
+
+    def _encode(self) -> dict[str, Encodable.PRIMITIVE]:
         return {
             'uuid': self.uuid,
             'points': self.points,
@@ -41,6 +56,9 @@ class Score(AbstractAttribute):
             raise RuntimeError('this team is not eligible for lead')
         self._lead = lead
 
+        # The lead eligibility of both teams depends on this value
+        self.markDirty()
+        self.getOther().markDirty()
         server.update(self.parent)
 
     @property
@@ -51,6 +69,8 @@ class Score(AbstractAttribute):
     def lost(self, lost: bool) -> None:
         self._lost = lost
 
+        self.markDirty()
+        self.getOther().markDirty()
         server.update(self.parent)
 
     @property
@@ -63,6 +83,8 @@ class Score(AbstractAttribute):
             self._lost = True
         self._starPass = starPass
 
+        self.markDirty()
+        self.getOther().markDirty()
         server.update(self.parent)
 
     def setTrip(self, tripNum: int, points: int, timestamp: datetime) -> None:
@@ -72,9 +94,13 @@ class Score(AbstractAttribute):
 
         # Append or edit the desired Trip
         if tripNum == len(self._trips):
-            self._trips.append(Trip(points, timestamp))
+            trip: Trip = Trip(points, timestamp)
+            trip._encodingParent = self
+            self._trips.append(trip)
+            self.markDirty()
         else:
             self._trips[tripNum].points = points
+            self._trips[tripNum].markDirty()
 
         server.update(self.parent)
 
@@ -84,13 +110,39 @@ class Score(AbstractAttribute):
             raise IndexError('Trip index out of range')
         del self._trips[tripNum]
 
+        self.markDirty()
         server.update(self.parent)
 
+    def getState(self) -> dict[str, Encodable.PRIMITIVE]:
+        return {
+            'uuid': self.uuid,
+            'trips': [trip.getState() for trip in self._trips],
+            'lead': self._lead,
+            'lost': self._lost,
+            'starPass': self._starPass,
+        }
+
+    @classmethod
+    def decode(cls, json: Encodable.PRIMITIVE, parent: Jam) -> Score:
+        score: Score = Score(parent)
+        score.restore(json)
+        return score
+
+    def restore(self, json: Encodable.PRIMITIVE) -> None:
+        self._uuid = uuid.UUID(json['uuid'])
+        self._trips = [Trip.decode(trip) for trip in json['trips']]
+        for trip in self._trips:
+            trip._encodingParent = self
+        self._lead = json['lead']
+        self._lost = json['lost']
+        self._starPass = json['starPass']
+        self.markDirty()
+
     def isLeadEligible(self) -> bool:
         other: Score = self.getOther()
         return not other._lead and not self._lost
 
-    def encode(self) -> dict[str, Encodable.PRIMITIVE]:
+    def _encode(self) -> dict[str, Encodable.PRIMITIVE]:
         return {
             'uuid': self.uuid,
             'trips': [trip.encode() for trip in self._trips],
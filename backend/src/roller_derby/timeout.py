@@ -4,6 +4,7 @@ from roller_derby.attribute import AbstractAttribute, TeamAttribute
 from server import Encodable
 from typing import get_args, Literal, TypeAlias, TYPE_CHECKING
 import server
+import uuid
 
 if TYPE_CHECKING:
     from roller_derby.bout import TEAMS, Bout
@@ -31,7 +32,29 @@ class Timeout(Encodable):
     def isRunning(self) -> bool:
         return self.isStarted() and not self.isFinished()
 
-    def encode(self) -> dict[str, Encodable.PRIMITIVE]:
+    def getState(self) -> dict[str, Encodable.PRIMITIVE]:
+        return {
+            'uuid': self.uuid,
+            'team': self.team,
+            'startTime': Encodable.dumpTime(self.startTime),
+            'stopTime': Encodable.dumpTime(self.stopTime),
+            'isOfficialReview': self.isOfficialReview,
+            'isRetained': self.isRetained,
+            'notes': self.notes,
+        }
+
+    @classmethod
+    def decode(cls, json: Encodable.PRIMITIVE, parent: None = None) -> Timeout:
+        timeout: Timeout = Timeout(Encodable.loadTime(json['startTime']))
+        timeout._uuid = uuid.UUID(json['uuid'])
+        timeout.team = json['team']
+        timeout.stopTime = Encodable.loadTime(json['stopTime'])
+        timeout.isOfficialReview = json['isOfficialReview']
+        timeout.isRetained = json['isRetained']
+        timeout.notes = json['notes']
+        return timeout
+
+    def _encode(self) -> dict[str, Encodable.PRIMITIVE]:
         return {
             'team': self.team,
             'startTime': str(self.startTime),
@@ -49,7 +72,18 @@ class _TimeoutCounter(AbstractAttribute):
         self._timeoutsRemaining: int = 3
         self._officialReviewsRemaining: int = 1
 
-    def encode(self) -> dict[str, Encodable.PRIMITIVE]:
+    def getState(self) -> dict[str, Encodable.PRIMITIVE]:
+        return self._encode()
+
+    @classmethod
+    def decode(cls, json: Encodable.PRIMITIVE,
+               parent: None = None) -> _TimeoutCounter:
+        counter: _TimeoutCounter = _TimeoutCounter()
+        counter._timeoutsRemaining = json['timeoutsRemaining']
+        counter._officialReviewsRemaining = json['officialReviewsRemaining']
+        return counter
+
+    def _encode(self) -> dict[str, Encodable.PRIMITIVE]:
         return {
             'timeoutsRemaining': self._timeoutsRemaining,
             'officialReviewsRemaining': self._officialReviewsRemaining
@@ -60,6 +94,7 @@ class TimeoutAttribute(TeamAttribute[_TimeoutCounter]):
     def __init__(self, parent: Bout) -> None:
         super().__init__(_TimeoutCounter(), _TimeoutCounter())
         self._parent: Bout = parent
+        self._encodingParent = parent
         self._timeouts: list[Timeout] = []
 
     @property
@@ -69,7 +104,10 @@ class TimeoutAttribute(TeamAttribute[_TimeoutCounter]):
     def call(self, timestamp: datetime) -> None:
         if len(self._timeouts) > 0 and self._timeouts[-1].isRunning():
             raise RuntimeError('there already is a Timeout running')
-        self._timeouts.append(Timeout(timestamp))
+        timeout: Timeout = Timeout(timestamp)
+        timeout._encodingParent = self
+        self._timeouts.append(timeout)
+        self.markDirty()
 
         # Start the Timeout clock
         if self._parent._periodClock.isRunning():
@@ -88,6 +126,7 @@ class TimeoutAttribute(TeamAttribute[_TimeoutCounter]):
             raise TypeError(f'team must be one of '
                             f'{get_args(TEAMS) + get_args(OFFICIAL)}')
         self._timeouts[-1].team = team
+        self._timeouts[-1].markDirty()
 
         # Set the Timeout alarm
         if team == 'official' or self._timeouts[-1].isOfficialReview:
@@ -103,6 +142,7 @@ class TimeoutAttribute(TeamAttribute[_TimeoutCounter]):
         if self._timeouts[-1].isOfficialReview == isOfficialReview:
             return  # Do nothing
         self._timeouts[-1].isOfficialReview = isOfficialReview
+        self._timeouts[-1].markDirty()
 
         # Set the Timeout alarm
         if isOfficialReview or self._timeouts[-1].team == 'official':
@@ -116,6 +156,7 @@ class TimeoutAttribute(TeamAttribute[_TimeoutCounter]):
         if len(self._timeouts) == 0 or not self._timeouts[-1].isRunning():
             raise RuntimeError('there is no Timeout currently running')
         self._timeouts[-1].isRetained = isRetained
+        self._timeouts[-1].markDirty()
 
         server.update(self._parent)
 
@@ -123,6 +164,7 @@ class TimeoutAttribute(TeamAttribute[_TimeoutCounter]):
         if len(self._timeouts) == 0 or not self._timeouts[-1].isRunning():
             raise RuntimeError('there is no Timeout currently running')
         self._timeouts[-1].notes = notes
+        self._timeouts[-1].markDirty()
 
         server.update(self._parent)
 
@@ -133,6 +175,7 @@ class TimeoutAttribute(TeamAttribute[_TimeoutCounter]):
         if timeout.team == 'official' and timeout.isOfficialReview:
             raise RuntimeError('Official Reviews must be assigned to a Team')
         timeout.stopTime = timestamp
+        timeout.markDirty()
 
         self._parent._timeoutClock.stop(timestamp)
 
@@ -143,12 +186,34 @@ class TimeoutAttribute(TeamAttribute[_TimeoutCounter]):
                 self[timeout.team]._officialReviewsRemaining -= count
             else:
                 self[timeout.team]._timeoutsRemaining -= 1
+            self[timeout.team].markDirty()
 
         server.update(self._parent)
 
-    def encode(self) -> dict[str, Encodable.PRIMITIVE]:
+    def getState(self) -> dict[str, Encodable.PRIMITIVE]:
+        return {
+            **super().getState(),
+            'timeouts': [timeout.getState() for timeout in self._timeouts],
+        }
+
+    @classmethod
+    def decode(cls, json: Encodable.PRIMITIVE,
+               parent: Bout) -> TimeoutAttribute:
+        attribute: TimeoutAttribute = TimeoutAttribute(parent)
+        for team in ('home', 'away'):
+            counter: _TimeoutCounter = _TimeoutCounter.decode(json[team])
+            counter._teamParent = attribute
+            counter._encodingParent = attribute
+            setattr(attribute, f'_{team}', counter)
+        attribute._timeouts = [Timeout.decode(timeout)
+                               for timeout in json['timeouts']]
+        for timeout in attribute._timeouts:
+            timeout._encodingParent = attribute
+        return attribute
+
+    def _encode(self) -> dict[str, Encodable.PRIMITIVE]:
         return {
-            **super().encode(),
+            **super()._encode(),
             'current': (self._timeouts[-1].encode()
                         if len(self._timeouts) > 0
                         and self._timeouts[-1].isRunning()
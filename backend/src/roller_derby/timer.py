@@ -1,37 +1,11 @@
 from __future__ import annotations
-from abc import ABC
+from clock import Clock, getClock
 from datetime import datetime, timedelta
+from scheduler import Alarm, Scheduler
 from server import Encodable
 from typing import Callable
-import asyncio
 import server
-
-
-class Timeable(ABC):
-    def __init__(self) -> None:
-        self._startTime: None | datetime = None
-        self._stopTime: None | datetime = None
-
-    def start(self, timestamp: datetime) -> None:
-        if self.isStarted():
-            raise RuntimeError(f'this {self.__class__.__name__} has already '
-                               'started')
-        self._startTime = timestamp
-
-    def stop(self, timestamp: datetime) -> None:
-        if not self.isRunning():
-            raise RuntimeError(f'this {self.__class__.__name__} is not '
-                               'running')
-        self._stopTime = timestamp
-
-    def isStarted(self) -> bool:
-        return self._startTime is not None
-
-    def isStopped(self) -> bool:
-        return self._stopTime is not None
-
-    def isRunning(self) -> bool:
-        return self.isStarted() and not self.isStopped()
+import uuid
 
 
 class Timer(Encodable):
@@ -39,38 +13,47 @@ class Timer(Encodable):
                  minutes: float = 0, seconds: float = 0) -> None:
         super().__init__()
 
-        self._task: None | asyncio.Task = None
-        self._startTime: None | datetime = None
-        self._stopTime: None | datetime = None
-        self._alarm: None | timedelta = None
-        self._elapsed: timedelta = timedelta(seconds=0)
+        # Times are integer nanoseconds of the Clock of the server, which are
+        # only converted to wall-clock time when the Timer is encoded
+        self._scheduledAlarm: None | Alarm = None
+        self._startTime: None | int = None
+        self._stopTime: None | int = None
+        self._alarm: None | int = None
+        self._elapsed: int = 0
         self._callback: None | Callable[[datetime], None] = None
         self.setAlarm(alarm, hours=hours, minutes=minutes, seconds=seconds)
 
     @staticmethod
-    def getMilliseconds(time: None | timedelta) -> None | int:
-        return round(time.total_seconds() * 1000) if time is not None else None
+    def getMilliseconds(time: None | int) -> None | int:
+        return (time + 500_000) // 1_000_000 if time is not None else None
 
-    async def _alarmTask(self) -> None:
-        if self._alarm is None:
-            self._task = None  # This Timer does not have an alarm
-            return
-        secondsRemaining: float = self.getRemaining().total_seconds()
-        while secondsRemaining > 0:
-            await asyncio.sleep(secondsRemaining)
-            secondsRemaining = self.getRemaining().total_seconds()
+    @staticmethod
+    def getNanoseconds(time: timedelta) -> int:
+        return time // timedelta(microseconds=1) * 1000
+
+    def _scheduleAlarm(self) -> None:
+        # Alarms are called by the Scheduler of the event loop, so a Timer
+        # keeps one Alarm which it reschedules instead of a task
+        scheduler: Scheduler = Scheduler.get()
+        if (self._scheduledAlarm is None
+                or self._scheduledAlarm.scheduler is not scheduler):
+            self._scheduledAlarm = scheduler.alarm(self._onAlarm)
+        self._scheduledAlarm.scheduleAt(
+            self._startTime + self._alarm - self._elapsed)
+
+    def _onAlarm(self, late: int) -> None:
         if self._callback is not None:
-            self._callback(datetime.now())
+            # Pass the time at which the alarm was due, not when it was called
+            due: int = self._startTime + self._alarm - self._elapsed
+            self._callback(getClock().toDatetime(due))
             server.flush()
-        self._task = None
 
-    def _restartTask(self) -> None:
-        if self._task is not None:
-            self._task.cancel()
-            if self._alarm is not None:
-                self._task = asyncio.create_task(self._alarmTask())
+    def _rescheduleAlarm(self) -> None:
+        if self._scheduledAlarm is not None and self._scheduledAlarm.active:
+            if self._alarm is not None and self.isRunning():
+                self._scheduleAlarm()
             else:
-                self._task = None
+                self._scheduledAlarm.cancel()
 
     def start(self, timestamp: datetime) -> None:
         if self.isRunning():
@@ -81,22 +64,29 @@ class Timer(Encodable):
             self._elapsed += self._stopTime - self._startTime
             self._stopTime = None
 
-        self._startTime = timestamp
+        self._startTime = getClock().fromDatetime(timestamp)
+
+        self.markDirty()
 
-        # Create an alarm callback task
+        # Schedule the alarm callback
         if self._alarm is not None:
-            self._task = asyncio.create_task(Timer._alarmTask(self))
+            self._scheduleAlarm()
 
     def stop(self, timestamp: datetime) -> None:
         if not self.isRunning():
             raise RuntimeError('this Timer is not running')
 
-        self._stopTime = timestamp
+        self._stopTime = getClock().fromDatetime(timestamp)
+        self.markDirty()
 
-        # Stop the currently running task
-        if self._task is not None:
-            self._task.cancel()
-            self._task = None
+        # Cancel the scheduled alarm
+        if self._scheduledAlarm is not None:
+            self._scheduledAlarm.cancel()
+
+    def close(self) -> None:
+        # Cancel the alarm of a Timer which was replaced, e.g. by a restore
+        if self._scheduledAlarm is not None:
+            self._scheduledAlarm.cancel()
 
     def isStarted(self) -> bool:
         return self._startTime is not None
@@ -110,51 +100,124 @@ class Timer(Encodable):
     def setCallback(self, callback: None | Callable[[datetime], None]) -> None:
         self._callback = callback
 
-    def getElapsed(self) -> timedelta:
-        if self._startTime is not None and self._stopTime is not None:
-            return self._elapsed + (self._stopTime - self._startTime)
-        elif self._startTime is not None:
-            return self._elapsed + (datetime.now() - self._startTime)
-        else:
+    def getElapsedNanoseconds(self) -> int:
+        if self._startTime is None:
             return self._elapsed
+        stopTime: int = (self._stopTime if self._stopTime is not None
+                         else getClock().now())
+        return self._elapsed + (stopTime - self._startTime)
+
+    def getElapsed(self) -> timedelta:
+        return timedelta(microseconds=self.getElapsedNanoseconds() // 1000)
 
     def setElapsed(self, elapsed: None | timedelta = None, *, hours: float = 0,
                    minutes: float = 0, seconds: float = 0) -> None:
         if elapsed is None:
             elapsed = timedelta(hours=hours, minutes=minutes, seconds=seconds)
-        self._elapsed = elapsed
+        self._elapsed = Timer.getNanoseconds(elapsed)
 
         # Reset the current lap
         if not self.isRunning():
             self._startTime = None
             self._stopTime = None
+        self.markDirty()
 
-        # Restart the currently active task
-        self._restartTask()
+        # Reschedule the pending alarm
+        self._rescheduleAlarm()
 
     def getAlarm(self) -> None | timedelta:
-        return self._alarm
+        if self._alarm is None:
+            return None
+        return timedelta(microseconds=self._alarm // 1000)
 
     def setAlarm(self, alarm: None | timedelta = None, *, hours: float = 0,
                  minutes: float = 0, seconds: float = 0) -> None:
-        if alarm is not None:
-            self._alarm = alarm
-        else:
+        if alarm is None:
             alarm = timedelta(hours=hours, minutes=minutes, seconds=seconds)
-            self._alarm = alarm if alarm.total_seconds() > 0 else None
+            if alarm.total_seconds() <= 0:
+                alarm = None
+        self._alarm = (Timer.getNanoseconds(alarm) if alarm is not None
+                       else None)
+        self.markDirty()
 
-        # Restart the currently active task
-        self._restartTask()
+        # Reschedule the pending alarm
+        self._rescheduleAlarm()
 
-    def getRemaining(self) -> timedelta:
+    def getRemainingNanoseconds(self) -> None | int:
         if self._alarm is None:
+            return None
+        return self._alarm - self.getElapsedNanoseconds()
+
+    def getRemaining(self) -> timedelta:
+        remaining: None | int = self.getRemainingNanoseconds()
+        if remaining is None:
             return timedelta.max
-        return self._alarm - self.getElapsed()
+        return timedelta(microseconds=remaining // 1000)
+
+    def getState(self) -> dict[str, Encodable.PRIMITIVE]:
+        clock: Clock = getClock()
+        return {
+            'uuid': self.uuid,
+            'startTime': Encodable.dumpTime(
+                clock.toDatetime(self._startTime)
+                if self._startTime is not None else None),
+            'stopTime': Encodable.dumpTime(
+                clock.toDatetime(self._stopTime)
+                if self._stopTime is not None else None),
+            'alarm': (self._alarm // 1000 if self._alarm is not None
+                      else None),
+            'elapsed': self._elapsed // 1000,
+        }
 
-    def encode(self) -> dict[str, Encodable.PRIMITIVE]:
+    @classmethod
+    def decode(cls, json: Encodable.PRIMITIVE, parent: None = None) -> Timer:
+        timer: Timer = Timer()
+        timer.restore(json)
+        timer.resumeAlarm()
+        return timer
+
+    def resumeAlarm(self) -> None:
+        # Resume the alarm callback of a decoded Timer, even if it is already
+        # due, e.g. because it was due while the server was stopped
+        if self.isRunning() and self._alarm is not None:
+            self._scheduleAlarm()
+
+    def restore(self, json: Encodable.PRIMITIVE) -> None:
+        clock: Clock = getClock()
+        self._uuid = uuid.UUID(json['uuid'])
+        startTime: None | datetime = Encodable.loadTime(json['startTime'])
+        stopTime: None | datetime = Encodable.loadTime(json['stopTime'])
+        self._startTime = (clock.fromDatetime(startTime)
+                           if startTime is not None else None)
+        self._stopTime = (clock.fromDatetime(stopTime)
+                          if stopTime is not None else None)
+        self._alarm = (json['alarm'] * 1000 if json['alarm'] is not None
+                       else None)
+        self._elapsed = json['elapsed'] * 1000
+        self.markDirty()
+
+        # Reschedule the alarm callback unless it was already called
+        if (self.isRunning() and self._alarm is not None
+                and ((self._scheduledAlarm is not None
+                      and self._scheduledAlarm.active)
+                     or self.getRemainingNanoseconds() > 0)):
+            self._scheduleAlarm()
+        else:
+            self.close()
+
+    def _encode(self) -> dict[str, Encodable.PRIMITIVE]:
+        # A running Timer is encoded as the time elapsed when it was started
+        # and the server epoch in milliseconds at which it was started, its
+        # anchor. Clients add the server time since the anchor to render the
+        # Timer, so the encoding only changes when the Timer is started,
+        # stopped, or set.
+        running: bool = self.isRunning()
         return {
             'uuid': self.uuid,
             'alarm': Timer.getMilliseconds(self._alarm),
-            'elapsed': Timer.getMilliseconds(self.getElapsed()),
-            'isRunning': self.isRunning(),
+            'elapsed': Timer.getMilliseconds(
+                self._elapsed if running else self.getElapsedNanoseconds()),
+            'anchor': (Timer.getMilliseconds(
+                getClock().toEpoch(self._startTime)) if running else None),
+            'isRunning': running,
         }
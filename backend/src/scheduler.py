@@ -0,0 +1,239 @@
+from __future__ import annotations
+from clock import getClock
+from metrics import Histogram
+from typing import Callable, ClassVar
+from weakref import WeakKeyDictionary
+import asyncio
+import heapq
+import itertools
+import logging
+
+
+class Alarm:
+    '''A callback which a Scheduler calls once at a deadline. An Alarm may be
+    scheduled again after it was called or cancelled, so each owner keeps one
+    Alarm instead of creating a task for every deadline.
+    '''
+
+    def __init__(self, scheduler: Scheduler,
+                 callback: Callable[[int], None]) -> None:
+        '''Instantiates a new Alarm which isn't scheduled. Use
+        `Scheduler.alarm()` instead.
+
+        Args:
+            scheduler (Scheduler): The Scheduler which calls the Alarm.
+            callback (Callable): The function to call at the deadline. It is
+            passed the number of nanoseconds by which the deadline was
+            overshot.
+        '''
+        self._scheduler: Scheduler = scheduler
+        self._callback: Callable[[int], None] = callback
+        # The entry of the Alarm in the heap of the Scheduler
+        self._entry: None | list = None
+
+    @property
+    def scheduler(self) -> Scheduler:
+        '''The Scheduler which calls the Alarm.'''
+        return self._scheduler
+
+    @property
+    def active(self) -> bool:
+        '''True if the Alarm is scheduled and hasn't been called yet.'''
+        return self._entry is not None
+
+    @property
+    def deadline(self) -> None | int:
+        '''The time in nanoseconds of the Clock at which the Alarm is called,
+        or None if it isn't scheduled.'''
+        return self._entry[0] if self._entry is not None else None
+
+    def schedule(self, delay: int) -> None:
+        '''Schedules the Alarm to be called after a delay, replacing its
+        current deadline if it is already scheduled.
+
+        Args:
+            delay (int): The number of nanoseconds after which to call the
+            Alarm. Negative delays call it as soon as possible.
+        '''
+        self._scheduler._push(self, getClock().now() + delay)
+
+    def scheduleAt(self, deadline: int) -> None:
+        '''Schedules the Alarm to be called at a deadline, replacing its
+        current deadline if it is already scheduled.
+
+        Args:
+            deadline (int): The time in nanoseconds of the Clock at which to
+            call the Alarm. Past deadlines call it as soon as possible.
+        '''
+        self._scheduler._push(self, deadline)
+
+    def cancel(self) -> None:
+        '''Cancels the Alarm if it is scheduled.'''
+        self._scheduler._remove(self)
+
+
+class Scheduler:
+    '''Calls the Alarms of an event loop at their deadlines using a single
+    handle of the loop, instead of a task per deadline. The deadlines are kept
+    in a heap, so scheduling, rescheduling, and cancelling an Alarm take
+    logarithmic time. Cancelled entries are removed lazily, when they reach
+    the top of the heap or when they make up most of it.
+
+    Deadlines are times of the Clock of the server, in integer nanoseconds,
+    and the Clock is asked to call the Scheduler at the earliest one, so the
+    Alarms of a VirtualClock are called when it is advanced. The lateness of
+    every Alarm, i.e. the time between its deadline and the time at which it
+    was called, is recorded as a measure of the jitter of the event loop.
+    '''
+
+    # The heap is rebuilt without cancelled entries once it is larger than
+    # this and at least half of its entries are cancelled
+    COMPACT_SIZE: ClassVar[int] = 64
+
+    _schedulers: ClassVar[WeakKeyDictionary[asyncio.AbstractEventLoop,
+                                            Scheduler]] = WeakKeyDictionary()
+
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        '''Instantiates a new Scheduler without any Alarms. Use
+        `Scheduler.get()` to get the Scheduler of the running event loop.
+
+        Args:
+            loop (asyncio.AbstractEventLoop): The event loop in which the
+            Alarms are called.
+        '''
+        self._loop: asyncio.AbstractEventLoop = loop
+        self._heap: list[list] = []
+        self._counter: itertools.count = itertools.count()
+        self._handle: None | asyncio.Handle = None
+        self._armed: int = 0
+        self._active: int = 0
+        self._fired: int = 0
+        self._cancelled: int = 0
+        self._lateness: Histogram = Histogram()
+
+    @staticmethod
+    def get() -> Scheduler:
+        '''Gets the Scheduler of the running event loop, creating it if it
+        doesn't exist.
+
+        Raises:
+            RuntimeError: if there is no running event loop.
+
+        Returns:
+            Scheduler: The Scheduler of the running event loop.
+        '''
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        scheduler: None | Scheduler = Scheduler._schedulers.get(loop, None)
+        if scheduler is None:
+            scheduler = Scheduler(loop)
+            Scheduler._schedulers[loop] = scheduler
+        return scheduler
+
+    @property
+    def stats(self) -> dict[str, int]:
+        '''The counters of this Scheduler. The `active` counter is the number
+        of Alarms which are currently scheduled, `fired` is the number of
+        Alarms which were called, and `cancelled` is the number of deadlines
+        which were cancelled or replaced before they were reached.
+        '''
+        return {
+            'active': self._active,
+            'fired': self._fired,
+            'cancelled': self._cancelled,
+        }
+
+    @property
+    def lateness(self) -> Histogram:
+        '''The distribution of the number of seconds by which the deadlines of
+        the called Alarms were overshot.'''
+        return self._lateness
+
+    def alarm(self, callback: Callable[[int], None]) -> Alarm:
+        '''Creates an Alarm which isn't scheduled yet.
+
+        Args:
+            callback (Callable): The function to call at the deadline. It is
+            passed the number of nanoseconds by which the deadline was
+            overshot, so that it can correct for the lateness.
+
+        Returns:
+            Alarm: The new Alarm.
+        '''
+        return Alarm(self, callback)
+
+    def _push(self, alarm: Alarm, deadline: int) -> None:
+        self._remove(alarm)
+        alarm._entry = [deadline, next(self._counter), alarm]
+        heapq.heappush(self._heap, alarm._entry)
+        self._active += 1
+        self._arm()
+
+    def _remove(self, alarm: Alarm) -> None:
+        if alarm._entry is None:
+            return
+        alarm._entry[2] = None
+        alarm._entry = None
+        self._active -= 1
+        self._cancelled += 1
+        if (len(self._heap) > Scheduler.COMPACT_SIZE
+                and self._active * 2 <= len(self._heap)):
+            self._heap = [entry for entry in self._heap
+                          if entry[2] is not None]
+            heapq.heapify(self._heap)
+
+    def _arm(self) -> None:
+        # Keep a single handle of the event loop at the earliest deadline
+        while len(self._heap) > 0 and self._heap[0][2] is None:
+            heapq.heappop(self._heap)
+        if len(self._heap) == 0:
+            if self._handle is not None:
+                self._handle.cancel()
+                self._handle = None
+            return
+        deadline: int = self._heap[0][0]
+        if self._handle is not None:
+            if self._armed <= deadline:
+                return
+            self._handle.cancel()
+        self._armed = deadline
+        self._handle = getClock().callAt(self._loop, deadline, self._fire)
+
+    def runUntil(self, time: int) -> None:
+        '''Calls the Alarms whose deadlines are at or before a time in order
+        of their deadlines, as if the Clock had reached that time, e.g. to
+        replay commands at their original times, which have long passed. The
+        Alarms are called on time, so their lateness is not recorded.
+
+        Args:
+            time (int): The time in nanoseconds of the Clock up to which to
+            call the Alarms.
+        '''
+        self._callDue(time, isLive=False)
+        self._arm()
+
+    def _fire(self) -> None:
+        self._handle = None
+        self._callDue(getClock().now(), isLive=True)
+        self._arm()
+
+    def _callDue(self, now: int, isLive: bool) -> None:
+        while len(self._heap) > 0 and self._heap[0][0] <= now:
+            deadline, _, alarm = heapq.heappop(self._heap)
+            if alarm is None:
+                continue  # The Alarm was cancelled or rescheduled
+            alarm._entry = None
+            self._active -= 1
+            self._fired += 1
+            late: int = 0
+            if isLive:
+                late = now - deadline
+                self._lateness.observe(late / 1_000_000_000)
+            try:
+                alarm._callback(late)
+            except Exception as e:
+                log.error(f'Alarm callback failed: {type(e).__name__}: '
+                          f'{str(e)}')
+
+
+# The scheduler logging instance
+log: logging.Logger = logging.getLogger(__name__)
@@ -8,7 +8,7 @@ import server
 async def setTrip(uri: URI, team: TEAMS, tripNum: int, points: int,
                   timestamp: datetime, validPass: bool = True) -> API:
     # Get the desired Bout and Jam
-    bout: Bout = series.currentBout
+    bout: Bout = series.getBout(uri.bout)
     jam: Jam = bout[uri.period][uri.jam]
 
     # Attempt to set the lead jammer
@@ -21,7 +21,7 @@ async def setTrip(uri: URI, team: TEAMS, tripNum: int, points: int,
 @server.register
 async def deleteTrip(uri: URI, team: TEAMS, tripNum: int) -> API:
     # Get the desired Bout and Jam
-    bout: Bout = series.currentBout
+    bout: Bout = series.getBout(uri.bout)
     jam: Jam = bout[uri.period][uri.jam]
 
     jam.score[team].deleteTrip(tripNum)
@@ -30,7 +30,7 @@ async def deleteTrip(uri: URI, team: TEAMS, tripNum: int) -> API:
 @server.register
 async def setLead(uri: URI, team: TEAMS, lead: bool) -> API:
     # Get the desired Bout and Jam
-    bout: Bout = series.currentBout
+    bout: Bout = series.getBout(uri.bout)
     jam: Jam = bout[uri.period][uri.jam]
 
     jam.score[team].lead = lead
@@ -39,7 +39,7 @@ async def setLead(uri: URI, team: TEAMS, lead: bool) -> API:
 @server.register
 async def setLost(uri: URI, team: TEAMS, lost: bool) -> API:
     # Get the desired Bout and Jam
-    bout: Bout = series.currentBout
+    bout: Bout = series.getBout(uri.bout)
     jam: Jam = bout[uri.period][uri.jam]
 
     jam.score[team].lost = lost
@@ -48,7 +48,7 @@ async def setLost(uri: URI, team: TEAMS, lost: bool) -> API:
 @server.register
 async def setStarPass(uri: URI, team: TEAMS, tripNum: None | int) -> API:
     # Get the desired Bout and Jam
-    bout: Bout = series.currentBout
+    bout: Bout = series.getBout(uri.bout)
     jam: Jam = bout[uri.period][uri.jam]
 
     jam.score[team].starPass = tripNum
@@ -1,32 +1,50 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
+from assets import Asset, Frontend
+from broadcaster import Broadcaster
+from clock import Clock, getClock
+from clocksync import ClockEstimator
+from cluster import (Hub, HubClient, ManagerFactory, UnixSocketManager,
+                     runWorker)
+from contextlib import asynccontextmanager, suppress
 from dataclasses import dataclass
-from datetime import datetime, timedelta
+from datetime import datetime
+from functools import partial
+from journal import Journal
+from json import dumps, loads
+from logs import DeferredQueueHandler, Sampler, configure
+from metrics import ERROR_KINDS, Metrics
+from outbox import OutboxServer
 from pathlib import Path
+from scheduler import Scheduler
+from signal import SIGINT, SIGTERM
+from snapshot import Snapshot
 from starlette.applications import Starlette
 from starlette.requests import Request
-from starlette.responses import HTMLResponse
+from starlette.responses import PlainTextResponse, Response
 from starlette.routing import Mount, Route
-from starlette.staticfiles import StaticFiles
-from starlette.templating import Jinja2Templates
-from types import TracebackType
-from typing import Callable, Any, Awaitable, Collection, TypeAlias
+from startup import startup
+from types import NoneType, TracebackType, UnionType
+from typing import (Callable, Any, AsyncIterator, Awaitable, ClassVar,
+                    Collection, Literal, Self, TypeAlias, Union, get_args,
+                    get_origin, get_type_hints)
+from urllib.parse import parse_qsl, urlencode
+from views import ViewCache
 import asyncio
-import hashlib
 import inspect
+import itertools
 import logging
 import os
+import secrets
+import socket
 import socketio
+import time
 import uuid
-import uvicorn
 
 
-logging.basicConfig(
-    format='{levelname}: {message}',
-    datefmt='%m/%d/%Y %H:%M:%S',
-    style='{',
-    level=logging.INFO,
-)
+# The handler of the root logger, whose dropped records are exported as a
+# metric, or None if logging was configured elsewhere
+_logHandler: None | DeferredQueueHandler = configure(logging.INFO)
 
 '''Type alias for the types of values that can be serialized into JSON. '''
 API: TypeAlias = (
@@ -47,10 +65,136 @@ class URI:
     jam: int = -1
 
 
+@dataclass
+class _Command:
+    '''A server command which was compiled when it was registered so that
+    it can be called without inspecting its signature.'''
+
+    # Arguments that are added by the server instead of by the client
+    INJECTED: ClassVar[tuple[str, ...]] = ('timestamp', 'session')
+
+    name: str
+    func: Callable[..., Awaitable[None | Collection]]
+    # Each accepted argument with whether it is required and its validator
+    arguments: tuple[tuple[str, bool, None | Callable[[Any], Any]], ...]
+    readOnly: bool = False
+    http: bool = False
+
+    @staticmethod
+    def compile(name: str, func: Callable[..., Awaitable[None | Collection]],
+                readOnly: bool = False, http: bool = False) -> _Command:
+        '''Compiles a server command method into a _Command.
+
+        Args:
+            name (str): The name used by clients to call the command.
+            func (Callable): The server command method.
+            readOnly (bool, optional): True if the command doesn't change the
+            game state. Defaults to False.
+            http (bool, optional): True if the command is also served over
+            HTTP. Defaults to False.
+
+        Returns:
+            _Command: The compiled server command.
+        '''
+        try:
+            hints: dict[str, Any] = get_type_hints(func)
+        except Exception:
+            hints = dict()  # Don't validate unresolvable annotations
+        arguments: list[tuple[str, bool, None | Callable[[Any], Any]]] = []
+        for param in inspect.signature(func).parameters.values():
+            if param.kind in (inspect.Parameter.VAR_POSITIONAL,
+                              inspect.Parameter.VAR_KEYWORD):
+                continue
+            required: bool = param.default is inspect.Parameter.empty
+            validator: None | Callable[[Any], Any] = None
+            if param.name not in _Command.INJECTED and param.name in hints:
+                validator = _Command._getValidator(param.name,
+                                                   hints[param.name])
+            arguments.append((param.name, required, validator))
+        return _Command(name, func, tuple(arguments), readOnly, http)
+
+    @staticmethod
+    def _getValidator(name: str,
+                      annotation: Any) -> None | Callable[[Any], Any]:
+        if annotation is URI:
+            def validateURI(value: Any) -> URI:
+                if not isinstance(value, dict):
+                    raise ClientException(f'\'{name}\' must be an object')
+                if 'bout' not in value:
+                    raise ClientException('bout must be specified')
+                return URI(value['bout'], value.get('period', -1),
+                           value.get('jam', -1))
+            return validateURI
+
+        # Flatten unions of types and literals into the accepted values
+        origin: Any = get_origin(annotation)
+        types: tuple[Any, ...] = (annotation,)
+        if origin is Union or origin is UnionType:
+            types = get_args(annotation)
+        literals: list[Any] = []
+        classes: list[type] = []
+        for t in types:
+            if get_origin(t) is Literal:
+                literals.extend(get_args(t))
+            elif t is NoneType or t is None:
+                classes.append(NoneType)
+            elif t in (bool, int, float, str):
+                classes.append(t)
+            else:
+                return None  # Don't validate types that can't be checked
+        if float in classes:
+            classes.append(int)  # JSON doesn't distinguish int from float
+        accepted: tuple[type, ...] = tuple(classes)
+        allowed: tuple[Any, ...] = tuple(literals)
+
+        def validate(value: Any) -> Any:
+            if isinstance(value, bool) and bool not in accepted:
+                pass  # Don't accept booleans as integers
+            elif isinstance(value, accepted):
+                return value
+            if any(value == literal and type(value) is type(literal)
+                   for literal in allowed):
+                return value
+            expected: list[str] = ([repr(literal) for literal in allowed]
+                                   + [t.__name__ for t in accepted])
+            raise ClientException(f'\'{name}\' must be one of: '
+                                  f'{", ".join(expected)}')
+        return validate
+
+    def bind(self, json: dict[str, Any]) -> dict[str, Any]:
+        '''Selects and validates the arguments of this command from a request
+        payload.
+
+        Args:
+            json (dict): The request payload.
+
+        Raises:
+            ClientException: if a required argument is missing or if an
+            argument is invalid.
+
+        Returns:
+            dict: The keyword arguments with which to call the command.
+        '''
+        kwargs: dict[str, Any] = dict()
+        for name, required, validator in self.arguments:
+            if name in json:
+                value: Any = json[name]
+                kwargs[name] = value if validator is None else validator(value)
+            elif required:
+                raise ClientException(f'\'{self.name}\' is missing '
+                                      f'argument \'{name}\'')
+        return kwargs
+
+
 class Encodable(ABC):
     PRIMITIVE: TypeAlias = (None | int | float | str | bool | dict[str, Any] |
                             list[Any])
 
+    # Class defaults so that sub-classes which don't call super().__init__()
+    # can still cache their encoding
+    _encoding: None | dict[str, Encodable.PRIMITIVE] = None
+    _encodingParent: None | Encodable = None
+
     def __init__(self) -> None:
         self._uuid: uuid.UUID = uuid.uuid4()
 
@@ -58,8 +202,20 @@ class Encodable(ABC):
     def uuid(self) -> str:
         return str(self._uuid)
 
-    @abstractmethod
     def encode(self) -> dict[str, Encodable.PRIMITIVE]:
+        '''Gets the encoding of the Encodable. The encoding is cached until the
+        Encodable, or any Encodable which it contains, is marked dirty, so the
+        returned dictionary must not be modified.
+
+        Returns:
+            dict: A dictionary representing the Encodable.
+        '''
+        if self._encoding is None:
+            self._encoding = self._encode()
+        return self._encoding
+
+    @abstractmethod
+    def _encode(self) -> dict[str, Encodable.PRIMITIVE]:
         '''Encodes the Encodable into a dictionary which can then be sent to a
         client. This method is called recursively so that each sub-class is
         encoded into a sub-dictionary. All private members of the Encodable
@@ -71,13 +227,37 @@ class Encodable(ABC):
         '''
         raise NotImplementedError()
 
-    @staticmethod
-    # @abstractmethod # TODO
-    def decode(json: Encodable.PRIMITIVE) -> Encodable:
-        '''Creates a new Encodable object from a dictionary.
+    def markDirty(self) -> None:
+        '''Discards the cached encoding of this Encodable and of each Encodable
+        which contains it. This method must be called whenever a member which
+        is encoded by this Encodable is changed.
+        '''
+        encodable: None | Encodable = self
+        while encodable is not None:
+            encodable._encoding = None
+            encodable = encodable._encodingParent
+
+    def getState(self) -> dict[str, Encodable.PRIMITIVE]:
+        '''Gets the complete state of the Encodable, including members which
+        are not sent to clients, so that it can be restored using `decode()`.
+        Times are stored as ISO 8601 strings and durations are stored as
+        microseconds.
+
+        Returns:
+            dict: A dictionary representing the state of the Encodable.
+        '''
+        raise NotImplementedError()
+
+    @classmethod
+    def decode(cls, json: Encodable.PRIMITIVE, parent: Any = None) -> Self:
+        '''Creates a new Encodable object from a dictionary created by
+        `getState()`.
 
         Args:
             json (dict): A dictionary object created from a JSON object.
+            parent (Any, optional): The object which contains the new
+            Encodable, for Encodables which can't exist without one. Defaults
+            to None.
 
         Returns:
             Encodable: A new Encodable with the same attributes as the JSON
@@ -85,18 +265,96 @@ class Encodable(ABC):
         '''
         raise NotImplementedError()
 
+    def restore(self, json: Encodable.PRIMITIVE) -> None:
+        '''Replaces the state of this Encodable in place with a state created
+        by `getState()`, so that references to it, e.g. from other modules or
+        from pending alarms, remain valid. The restored Encodable is marked
+        dirty but isn't updated.
+
+        Args:
+            json (dict): A dictionary object created from a JSON object.
+        '''
+        raise NotImplementedError()
+
+    def checkpoint(self, uris: Collection[URI]) -> Callable[[], None]:
+        '''Saves the state of the Encodable so that changes to it can be
+        rolled back, e.g. when a batch of commands fails. Encodables which are
+        the root of the game state may only save the parts which the URIs
+        refer to. By default, the complete state is saved.
+
+        Args:
+            uris (Collection[URI]): The URIs of the objects which are about to
+            be changed.
+
+        Returns:
+            Callable: A function which restores the saved state in place.
+        '''
+        return partial(self.restore, self.getState())
+
+    @staticmethod
+    def dumpTime(time: None | datetime) -> None | str:
+        return time.isoformat() if time is not None else None
+
+    @staticmethod
+    def loadTime(time: None | str) -> None | datetime:
+        return datetime.fromisoformat(time) if time is not None else None
+
 
-async def serve(port: int, *, debug: bool = False) -> None:
-    '''Start and serve the scoreboard app on the specified port.
+async def serve(port: int, *, debug: bool = False, updateWindow: float = 0,
+                journal: None | Path = None, snapshot: None | Path = None,
+                state: None | Encodable = None,
+                snapshotInterval: float = 60, workers: int = 1,
+                manager: None | ManagerFactory = None,
+                logSampling: int = 1) -> None:
+    '''Start and serve the scoreboard app on the specified port. The server
+    runs until it is interrupted or `stop()` is called.
 
     Args:
         port (int): The port number to serve the scoreboard.
         debug (bool, optional): Turns on debug log messages. Defaults to False.
+        updateWindow (float, optional): The number of seconds during which
+        updates are collected before they are broadcast to the clients. A
+        window of zero broadcasts updates on the next tick of the event loop.
+        Defaults to 0.
+        journal (None | Path, optional): The path of the command journal. If
+        the journal exists, it is replayed before the server starts. Commands
+        which change the game state are then appended to it. A new journal
+        starts with the game state, so that replaying it recreates the UUIDs
+        which its commands refer to. Defaults to None.
+        snapshot (None | Path, optional): The path of the game state snapshot.
+        If the snapshot exists, it is restored before the journal entries
+        which follow it are replayed. New snapshots are written periodically
+        and on shutdown, after which the journal is compacted. A journal and
+        the game state are required. Defaults to None.
+        state (None | Encodable, optional): The root of the game state which
+        is snapshotted. Defaults to None.
+        snapshotInterval (float, optional): The minimum number of seconds
+        between snapshots. Defaults to 60.
+        workers (int, optional): The number of worker processes which hold
+        the client connections. If more than one, this process keeps the game
+        state and applies every command, while the workers share the port and
+        spread the broadcasts to the clients. Defaults to 1.
+        manager (None | ManagerFactory, optional): Creates the Socket.IO
+        pub/sub manager through which broadcasts reach the workers, e.g.
+        `functools.partial(socketio.AsyncRedisManager, url)`. If None, the
+        broadcasts are relayed over the Unix socket which connects the workers
+        to this process. Defaults to None.
+        logSampling (int, optional): Only one of every this many debug
+        messages about events which are sent and received many times per
+        second, e.g. emitted events, is logged, so that debug messages can be
+        left on during a game. Defaults to 1.
 
     Raises:
-        TypeError: if the port number is is not an int or the debug arg is not
-        a bool.
-        ValueError: if the port number is not between 1 and 65535 (inclusive).
+        TypeError: if the port number is is not an int, the debug arg is not
+        a bool, the update window is not a float, or the number of workers is
+        not an int.
+        ValueError: if the port number is not between 1 and 65535 (inclusive),
+        if the update window is negative, if a snapshot is requested without a
+        journal and game state, if the number of workers is less than one, or
+        if the log sampling rate is less than one.
+        RuntimeError: if multiple workers are requested on a platform which
+        doesn't support Unix sockets and shared ports.
+        OSError: if the port is already in use.
     '''
     if not isinstance(port, int):
         raise TypeError(f'port must be int, not {type(port).__name__}')
@@ -104,23 +362,294 @@ async def serve(port: int, *, debug: bool = False) -> None:
         raise ValueError('port number is invalid')
     if not isinstance(debug, bool):
         raise TypeError(f'debug must be bool, not {type(port).__name__}')
+    _broadcaster.window = updateWindow
     if debug:
         log.setLevel(logging.DEBUG)
-    _app.debug = debug
-    log.info(f'Starting NSO Bridge on port {port}')
-    config: uvicorn.Config = uvicorn.Config(
-        _app, host='0.0.0.0', port=port, log_level='critical'
-    )
-    server: uvicorn.Server = uvicorn.Server(config)
-    await server.serve()
+    _sampler.every = logSampling
+    createApp().debug = debug
+    if not isinstance(workers, int):
+        raise TypeError(f'workers must be int, not {type(workers).__name__}')
+    if workers < 1:
+        raise ValueError('there must be at least one worker')
+    if workers > 1 and not (hasattr(socket, 'AF_UNIX')
+                            and hasattr(socket, 'SO_REUSEPORT')):
+        raise RuntimeError('multiple workers are not supported on this '
+                           'platform')
+    if snapshot is not None and (journal is None or state is None):
+        raise ValueError('snapshots require a journal and game state')
+    import uvicorn
+    global _journal, _state, _stopping
+    startup.mark('imports')
+    _state = state
+    _stopping = asyncio.Event()
+
+    # Listen before restoring the game state. Clients which reconnect in the
+    # meantime wait in the backlog instead of being refused and backing off.
+    sock: None | socket.socket = None
+    if workers == 1:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(('0.0.0.0', port))
+        sock.listen(2048)
+        startup.mark('listen')
+
+    checkpoint: None | asyncio.Task = None
+    try:
+        if journal is not None:
+            sequence: int = 0
+            if snapshot is not None:
+                sequence = _restore(snapshot, state)
+                startup.mark('restore')
+            _journal = Journal(journal)
+            sequence = await replay(journal, after=sequence)
+            _journal.open(sequence)
+            if sequence == 0 and state is not None:
+                # Start a new journal with the state to which it is applied
+                clock: Clock = getClock()
+                _journal.append(Journal.STATE, state.getState(),
+                                clock.toDatetime(clock.now()))
+            startup.mark('replay')
+            if snapshot is not None:
+                checkpoint = asyncio.create_task(
+                    _checkpointPeriodically(snapshot, state, snapshotInterval))
+        log.info('Starting NSO Bridge on port %s', port)
+        if workers > 1:
+            await _serveWorkers(port, workers, manager, debug, logSampling)
+        else:
+            config: uvicorn.Config = uvicorn.Config(createApp(),
+                                                    log_level='critical')
+            server: uvicorn.Server = uvicorn.Server(config)
+            serving: asyncio.Task = asyncio.create_task(
+                server.serve(sockets=[sock]))
+            stopping: asyncio.Task = asyncio.create_task(_stopping.wait())
+            await asyncio.wait((serving, stopping),
+                               return_when=asyncio.FIRST_COMPLETED)
+            if not serving.done():
+                server.should_exit = True
+            stopping.cancel()
+            await serving
+    finally:
+        if sock is not None:
+            sock.close()
+        if checkpoint is not None:
+            checkpoint.cancel()
+            await _checkpoint(snapshot, state)
+        if _journal is not None:
+            _journal.close()
+            _journal = None
+        _state = None
+        _stopping = None
     log.info('NSO Bridge was successfully shut down.')
 
 
+def stop() -> None:
+    '''Stops the server which was started with `serve()`. This function must
+    be called from the thread of the event loop of the server, e.g. using
+    `loop.call_soon_threadsafe()`.
+    '''
+    if _stopping is not None:
+        _stopping.set()
+
+
+def createApp() -> Starlette:
+    '''Creates the Starlette app of the server. The app is only created once,
+    when it is first needed, so that importing this module stays cheap.
+
+    Returns:
+        Starlette: The Starlette app.
+    '''
+    global _app
+    if _app is None:
+        _app = Starlette(
+            routes=[
+                Route('/', _getFile),
+                Route('/metrics', _getMetrics),
+                Route('/api/{command:str}', _getView),
+                Route('/assets/{file:path}', _getFile),
+                Mount('/socket.io', app=socketio.ASGIApp(_socket)),
+                Route('/{file:str}', _getFile),
+            ],
+            lifespan=_loadFrontend,
+        )
+    return _app
+
+
+async def replay(path: Path, *, after: int = 0) -> int:
+    '''Applies the commands of a journal file to rebuild the game state. The
+    commands are applied as fast as possible using their original timestamps.
+    Changes which aren't journaled because they are made by timer alarms, e.g.
+    the intermission clock stopping at its alarm, are made again by calling
+    the alarms which were due before each command. An entry which holds the
+    game state, e.g. at the start of the journal, is restored. Commands which
+    fail are logged and skipped.
+
+    Args:
+        path (Path): The path of the journal file.
+        after (int, optional): The sequence number of the last entry which was
+        already applied, e.g. by restoring a snapshot. Entries up to and
+        including this sequence number are skipped. Defaults to 0.
+
+    Returns:
+        int: The sequence number of the last entry which was applied.
+    '''
+    sequence: int = after
+    count: int = 0
+    start: float = time.perf_counter()
+    scheduler: Scheduler = Scheduler.get()
+    for entry in Journal.read(path):
+        if entry['seq'] <= after:
+            continue
+        sequence = entry['seq']
+        scheduler.runUntil(getClock().fromDatetime(entry['timestamp']))
+        if entry['command'] == Journal.STATE:
+            if _state is not None:
+                _state.restore(entry['args'])
+            continue
+        compiled: None | _Command = _commandTable.get(entry['command'], None)
+        if compiled is None:
+            log.warning('Unable to replay unknown command \'%s\'',
+                        entry['command'])
+            continue
+        json: dict[str, Any] = {**entry['args'],
+                                'timestamp': entry['timestamp'],
+                                'session': None}
+        try:
+            await compiled.func(**compiled.bind(json))
+            count += 1
+        except Exception as e:
+            log.warning('Unable to replay \'%s\' (%s): %s: %s',
+                        entry['command'], sequence, type(e).__name__, e)
+    if count > 0:
+        milliseconds: float = (time.perf_counter() - start) * 1000
+        log.info('Replayed %s commands from \'%s\' in %.0f ms', count, path,
+                 milliseconds)
+    return sequence
+
+
+async def _serveWorkers(port: int, workers: int,
+                        manager: None | ManagerFactory, debug: bool,
+                        logSampling: int) -> None:
+    import multiprocessing
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as directory:
+        path: Path = Path(directory) / 'hub.sock'
+        hub: Hub = Hub(path, {
+            'connect': _connectSession,
+            'disconnect': _handleDisconnect,
+            'event': _applyCommand,
+            'metrics': _renderMetrics,
+            'replay': _replaySession,
+            'view': _renderView,
+        })
+        await hub.start()
+        if manager is None:
+            manager = partial(UnixSocketManager, path)
+        publisher: socketio.AsyncManager = manager(write_only=True)
+        _useManager(publisher)
+
+        context = multiprocessing.get_context('spawn')
+        processes: list[multiprocessing.Process] = [
+            context.Process(target=runWorker, name=f'Worker-{i}',
+                            args=(port, path, manager, debug, logSampling),
+                            daemon=True)
+            for i in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        log.info('Started %s workers', workers)
+
+        # Run until stopped or until every worker has exited
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        for signal in (SIGINT, SIGTERM):
+            loop.add_signal_handler(signal, stop)
+        try:
+            while (not _stopping.is_set()
+                   and any(process.is_alive() for process in processes)):
+                with suppress(TimeoutError):
+                    await asyncio.wait_for(_stopping.wait(), timeout=1)
+        finally:
+            for signal in (SIGINT, SIGTERM):
+                loop.remove_signal_handler(signal)
+            for process in processes:
+                process.terminate()
+            while any(process.is_alive() for process in processes):
+                await asyncio.sleep(0.1)
+            if isinstance(publisher, UnixSocketManager):
+                await publisher.close()
+            await hub.close()
+
+
+def _useManager(manager: socketio.AsyncManager) -> None:
+    # Must be called before the first client connects
+    _socket.manager = manager
+    manager.set_server(_socket)
+
+
+def _useWorker(primary: HubClient, manager: socketio.AsyncManager) -> None:
+    '''Turns this process into a worker which forwards every Socket.IO event
+    to the primary process. Workers only accept WebSocket connections because
+    long-polling requests of one client may reach different workers.
+
+    Args:
+        primary (HubClient): The connection to the primary process.
+        manager (AsyncManager): The pub/sub manager of the worker.
+    '''
+    global _primary
+    _primary = primary
+    _useManager(manager)
+    _socket.eio.transports = ['websocket']
+
+
+def _restore(path: Path, state: Encodable) -> int:
+    start: float = time.perf_counter()
+    snapshot: None | tuple[int, Any] = Snapshot.read(path)
+    if snapshot is None:
+        return 0
+    global _snapshotSequence
+    sequence, json = snapshot
+    state.restore(json)
+    _snapshotSequence = sequence
+    milliseconds: float = (time.perf_counter() - start) * 1000
+    log.info('Restored the snapshot \'%s\' (%s) in %.0f ms', path, sequence,
+             milliseconds)
+    return sequence
+
+
+async def _checkpoint(path: Path, state: Encodable) -> None:
+    global _snapshotSequence
+    if _journal.sequence == _snapshotSequence:
+        return  # Nothing changed since the last snapshot
+    # The state is captured on the event loop so that it can't change while
+    # it is written to disk in a background thread
+    sequence: int = _journal.sequence
+    json: Encodable.PRIMITIVE = state.getState()
+    try:
+        size: int = await asyncio.to_thread(Snapshot.write, path, sequence,
+                                            json)
+    except OSError as e:
+        log.error('Unable to write the snapshot \'%s\': %s', path, e)
+        return
+    _snapshotSequence = sequence
+    _journal.compact(sequence)
+    log.debug('Wrote the snapshot \'%s\' (%s, %s bytes)', path, sequence,
+              size)
+
+
+async def _checkpointPeriodically(path: Path, state: Encodable,
+                                  interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        await _checkpoint(path, state)
+
+
 def register(
     command: None | Callable = None,
     *,
     name: str = '',
     overwrite: bool = False,
+    readOnly: bool = False,
+    http: bool = False,
 ) -> Callable:
     '''A decorator to register server command methods. Server command methods
     must not be asynchronous functions.
@@ -134,10 +663,22 @@ def register(
         registered method name. Methods which are overwritten without setting
         this flag to True will raise a LookupError exception. Defaults to
         False.
+        readOnly (bool, optional): Set to True if the method doesn't change the
+        game state. Read-only methods are not written to the command journal.
+        Defaults to False.
+        http (bool, optional): Set to True to also serve a read-only method
+        as JSON at `/api/<name>`, e.g. to overlays which poll the game state.
+        The `uri` argument and any other arguments are passed as query
+        parameters. Defaults to False.
+
+    Raises:
+        ValueError: if a method which isn't read-only is served over HTTP.
 
     Returns:
         Callable: The original method.
     '''
+    if http and not readOnly:
+        raise ValueError('only read-only commands can be served over HTTP')
 
     def decorator(
         command: Callable[[dict[str, Any]], Any],
@@ -147,91 +688,553 @@ def register(
             raise LookupError(
                 f'The command \'{commandName}\' is already registered.')
         gerund: str = 'Adding' if not overwriting else 'Overwriting'
-        log.debug(f'{gerund} \'{commandName}\' command')
-        _commandTable[commandName] = command
+        log.debug('%s \'%s\' command', gerund, commandName)
+        _commandTable[commandName] = _Command.compile(commandName, command,
+                                                      readOnly, http)
         return command
 
     return decorator(command) if callable(command) else decorator
 
 
 def update(encodable: Encodable) -> None:
-    # TODO: documentation
-    _updates.add(encodable)
+    '''Marks an Encodable as changed so that it is broadcast to all clients
+    during the next flush. Multiple updates to the same Encodable are coalesced
+    into a single broadcast.
+
+    Args:
+        encodable (Encodable): The Encodable which has changed.
+    '''
+    _broadcaster.update(encodable)
 
 
 def flush() -> None:
-    # TODO: documentation
-    try:
-        loop = asyncio.get_running_loop()
-        for encodeable in _updates:
-            eventName: str = type(encodeable).__name__
-            if hasattr(encodeable, 'API_NAME'):
-                eventName = getattr(encodeable, 'API_NAME')
-            loop.create_task(emit(eventName, encodeable.encode()))
-    except RuntimeError:
-        pass  # Don't emit updates if there isn't an event loop
-
-
-async def emit(event: str, data: dict[str, Any], to: None | str = None,
-               room: None | str = None, skip: None | str = None,
-               namespace: None | str = None) -> None:
+    '''Broadcasts all pending updates to the clients once the update window
+    has elapsed. Updates are not broadcast if there isn't an event loop.
+    '''
+    _broadcaster.flush()
+
+
+def getBroadcastStats() -> dict[str, int]:
+    '''Gets the counters of the update broadcaster.
+
+    Returns:
+        dict: The number of updates which were requested, coalesced, and sent,
+        the number of batches which were sent, and the number of updates which
+        are currently pending.
+    '''
+    return _broadcaster.stats
+
+
+async def subscribe(sessionId: str, encodable: Encodable) -> None:
+    '''Subscribes a client session to the updates of an Encodable. Sessions
+    which have subscribed to at least one Encodable no longer receive the
+    updates of Encodables to which they haven't subscribed.
+
+    Args:
+        sessionId (str): The session ID of the client.
+        encodable (Encodable): The Encodable to which to subscribe.
+    '''
+    enter, leave = _broadcaster.subscribe(sessionId,
+                                          Broadcaster.getScope(encodable))
+    for room in enter:
+        await _socket.enter_room(sessionId, room)
+    for room in leave:
+        await _socket.leave_room(sessionId, room)
+
+
+async def unsubscribe(sessionId: str, encodable: Encodable) -> None:
+    '''Unsubscribes a client session from the updates of an Encodable.
+
+    Args:
+        sessionId (str): The session ID of the client.
+        encodable (Encodable): The Encodable from which to unsubscribe.
+    '''
+    for room in _broadcaster.unsubscribe(sessionId,
+                                         Broadcaster.getScope(encodable)):
+        await _socket.leave_room(sessionId, room)
+
+
+async def emit(event: str, data: Any, to: None | str = None,
+               room: None | str | list[str] = None, skip: None | str = None,
+               namespace: None | str = None, key: None | str = None) -> None:
     '''Sends a Socket.IO message with the desired event name and data.
 
     Args:
         event (str): The name of the event to send.
-        data (Any): The data payload.
+        data (Any): The data payload. Payloads which are bytes are sent as
+        binary attachments, and tuples are sent as multiple arguments.
         to (None | str, optional): The session ID to which to send the message.
         If None, the message is broadcast to all clients. Defaults to None.
-        room (None | str, optional): The Socket.IO room to which to send the
-        message. Defaults to None.
+        room (None | str | list[str], optional): The Socket.IO room, or list
+        of rooms, to which to send the message. Defaults to None.
         skip (None | str, optional): The session ID which should be skipped in
         a broadcast. Allows the server to send a message to all clients in a
         group except for one. Defaults to None.
         namespace (None | str, optional): The Socket.IO namespace in which to
         send the message. Defaults to None.
-        timestamp (None | int, optional): The server epoch at which the action
-        originated. Defaults to None.
+        key (None | str, optional): The key of a message which carries the full
+        state of an object, so that a newer message with the same key replaces
+        it while it is queued for a client. Defaults to None.
     '''
-    log.debug(f'Emit: \'{event}\' {data}')
-    await _socket.emit(
-        event, data, to=to, room=room, skip_sid=skip, namespace=namespace
+    trafficLog.debug('Emit: \'%s\' %s', event, data)
+    recipients: int = _broadcaster.sessions
+    if to is not None:
+        recipients = 1
+    elif room is not None:
+        recipients = _broadcaster.getRecipients(
+            room if isinstance(room, list) else [room])
+    # The size is taken from the packets which Socket.IO encoded, so the
+    # payload isn't serialized again
+    size: int = await _socket.emit(
+        event, data, to=to, room=room, skip_sid=skip, namespace=namespace,
+        key=key
     )
+    _metrics.observeEmit(event, recipients, size)
+
+
+async def _getFile(request: Request) -> Response:
+    '''Serves a file of the frontend build from memory. HTML templates are
+    rendered and all files are compressed once when the server starts.
+
+    Args:
+        request (Request): The Request object received from the Starlette app.
+
+    Returns:
+        Response: The file, compressed if the client accepts it, or 304 Not
+        Modified if the client already has it.
+    '''
+    file: str = request.url.path.removeprefix('/') or 'index.html'
+    log.debug('Handling request for \'%s\'.', file)
+    startup.finish('first connection')
+    await asyncio.shield(request.app.state.frontend)
+    return _frontend.respond(request, file)
+
+
+@asynccontextmanager
+async def _loadFrontend(app: Starlette) -> AsyncIterator[None]:
+    '''Loads the frontend build into memory in the background when the web
+    server starts, so that Socket.IO clients can connect while the frontend
+    is compressed. Requests for frontend files wait until it is loaded.
 
+    Args:
+        app (Starlette): The Starlette app.
+    '''
+    app.state.frontend = asyncio.create_task(asyncio.to_thread(_frontend.load))
+    startup.mark('app')
+    yield
+    await app.state.frontend
 
-async def _renderTemplate(request: Request) -> HTMLResponse:
-    '''Renders the HTML response using the Jinja2 templating engine. All HTML
-    templates must be found in the `web/templates/` directory.
+
+async def _getMetrics(request: Request) -> PlainTextResponse:
+    '''Renders the server metrics in the Prometheus text exposition format.
+    In a multi-worker deployment, the metrics of the primary process are
+    rendered, because it handles every command and broadcast, except for the
+    outbound queues and the client clocks, which are those of the worker
+    which answers.
 
     Args:
         request (Request): The Request object received from the Starlette app.
 
     Returns:
-        HTMLResponse: An HTML response rendered from the Jinja2 templating
-        engine.
+        PlainTextResponse: The rendered metrics.
     '''
-    file: str = 'index.html'
-    if 'file' in request.path_params:
-        file = f'{request.path_params['file']}'
-    log.debug(f'Handling request for \'{file}\'.')
-    return _jinja.TemplateResponse(request, file)
+    text: str = (await _primary.call('metrics', _socket.stats,
+                                     _getClockStats())
+                 if _primary is not None else await _renderMetrics())
+    return PlainTextResponse(text, media_type='text/plain; version=0.0.4')
+
+
+async def _getView(request: Request) -> Response:
+    '''Serves the result of a read-only command as JSON, e.g.
+    `/api/jam?bout=<uuid>&period=0&jam=2`. Results are cached until the game
+    state changes, and requests whose `If-None-Match` header matches the ETag
+    of the current result are answered with 304 Not Modified. In a
+    multi-worker deployment, the primary process renders the result.
+
+    Args:
+        request (Request): The Request object received from the Starlette app.
+
+    Returns:
+        Response: The JSON result, 304 Not Modified, 400 Bad Request if the
+        arguments are invalid, or 404 Not Found if the command isn't served
+        over HTTP or if the Period or Jam doesn't exist.
+    '''
+    command: str = request.path_params['command']
+    query: str = urlencode(sorted(request.query_params.multi_items()))
+    match: str = request.headers.get('if-none-match', '')
+    status, etag, body = (
+        await _primary.call('view', command, query, match)
+        if _primary is not None else await _renderView(command, query, match))
+    headers: dict[str, str] = {'Cache-Control': 'no-cache'}
+    if etag is not None:
+        headers['ETag'] = etag
+    return Response(body, status_code=status, headers=headers,
+                    media_type='application/json' if status != 304 else None)
+
+
+async def _renderView(command: str, query: str,
+                      match: str) -> tuple[int, None | str, bytes]:
+    compiled: None | _Command = _commandTable.get(command, None)
+    if compiled is None or not compiled.http:
+        return 404, None, dumps({'name': 'ClientException', 'message':
+                                 f'Unknown view \'{command}\'.'}).encode()
+    key: tuple[str, str] = (command, query)
+    version: int = _broadcaster.version
+    view: None | tuple[bytes, str] = _views.get(key, version)
+    if view is None:
+        try:
+            data: None | Collection = await compiled.func(
+                **compiled.bind(_parseQuery(query)))
+        except Exception as e:
+            # An index which is out of range refers to a Period or Jam which
+            # doesn't exist, which isn't an error of the server
+            status: int = (400 if isinstance(e, ClientException)
+                           else 404 if isinstance(e, IndexError) else 500)
+            if status == 500:
+                log.error('Unable to render the view \'%s\': %s: %s',
+                          command, type(e).__name__, e)
+            else:
+                log.debug('Rejected the view \'%s\' (%s): %s: %s', command,
+                          query, type(e).__name__, e)
+            return status, None, dumps({'name': type(e).__name__,
+                                        'message': str(e)}).encode()
+        view = _views.put(key, version, data)
+    body, etag = view
+    if Asset.matches(match, etag):
+        return 304, etag, b''
+    return 200, etag, body
+
+
+def _parseQuery(query: str) -> dict[str, Any]:
+    # The URI is given as separate parameters and other values as JSON
+    json: dict[str, Any] = dict()
+    uri: dict[str, Any] = {'bout': ''}
+    for name, value in parse_qsl(query):
+        if name == 'bout':
+            uri['bout'] = value
+        elif name in ('period', 'jam'):
+            try:
+                uri[name] = int(value)
+            except ValueError:
+                raise ClientException(f'\'{name}\' must be an integer')
+        else:
+            try:
+                json[name] = loads(value)
+            except ValueError:
+                json[name] = value
+    json['uri'] = uri
+    return json
+
+
+def _getClockStats() -> dict[str, float]:
+    # The worst jitter of the clients and the number of their recent clock
+    # samples which were ignored as outliers
+    return {
+        'jitter': max((estimator.jitter for estimator in _clocks.values()),
+                      default=0),
+        'outliers': sum(estimator.outliers for estimator in _clocks.values()),
+    }
+
+
+async def _renderMetrics(outbox: None | dict[str, int] = None,
+                         clocks: None | dict[str, float] = None) -> str:
+    stats: dict[str, int] = _broadcaster.stats
+    if outbox is None:
+        outbox = _socket.stats
+    if clocks is None:
+        clocks = _getClockStats()
+    scheduler: Scheduler = Scheduler.get()
+    counters: dict[str, tuple[str, int | float]] = {
+        'updates_total': ('Encodable updates requested.', stats['updates']),
+        'updates_coalesced_total': ('Updates merged into a pending update.',
+                                    stats['coalesced']),
+        'broadcast_batches_total': ('Batches of broadcast events.',
+                                    stats['batches']),
+        'sessions_resumed_total': ('Sessions resumed without a full refetch.',
+                                   stats['resumed']),
+        'cpu_seconds_total': ('CPU time used by this process.',
+                              time.process_time()),
+        'outbox_replaced_total': ('Queued events replaced by a newer state.',
+                                  outbox['replaced']),
+        'slow_disconnects_total': ('Sessions disconnected because their '
+                                   'outbound queue was full.',
+                                   outbox['disconnected']),
+        'view_cache_hits_total': ('HTTP views served from the cache.',
+                                  _views.stats['hits']),
+        'view_cache_misses_total': ('HTTP views rendered from the state.',
+                                    _views.stats['misses']),
+        'alarms_fired_total': ('Timer alarms called by the scheduler.',
+                               scheduler.stats['fired']),
+        'alarms_cancelled_total': ('Timer alarms cancelled or rescheduled.',
+                                   scheduler.stats['cancelled']),
+    }
+    if _journal is not None:
+        counters['journal_writes_total'] = ('Journal entries written.',
+                                            _journal.stats['writes'])
+        counters['journal_syncs_total'] = ('Journal file syncs.',
+                                           _journal.stats['syncs'])
+    if _logHandler is not None:
+        counters['log_records_dropped_total'] = (
+            'Log records dropped because the log queue was full.',
+            _logHandler.dropped)
+    return _metrics.render(counters, {
+        'sessions': ('Connected client sessions.', stats['sessions']),
+        'pending_updates': ('Encodables waiting to be broadcast.',
+                            stats['pending']),
+        'outbox_queued': ('Events waiting in the outbound queues.',
+                          outbox['queued']),
+        'slow_sessions': ('Sessions whose outbound queue is behind.',
+                          outbox['slow']),
+        'alarms_scheduled': ('Timer alarms waiting for their deadline.',
+                             scheduler.stats['active']),
+        'clock_jitter_seconds': ('Largest clock offset jitter of a client.',
+                                 clocks['jitter']),
+        'clock_outliers': ('Recent client clock samples ignored as '
+                           'outliers.', clocks['outliers']),
+    }, {
+        'alarm_lateness_seconds': ('Time by which timer alarms overshot '
+                                   'their deadline.', scheduler.lateness),
+    })
 
 
 async def _handleConnect(sessionId: str, environ: dict[str, Any],
                          auth: dict[str, Any]) -> None:
     '''Handles a socket.io connection event.
 
+    Clients identify themselves with the `token` in the auth dictionary. New
+    clients are sent a random token in a `userId` event, which they should
+    present when they reconnect.
+
+    Clients may opt in to receiving patches instead of full encodings by
+    setting `delta` to True in the auth dictionary. Clients may also list the
+    formats in which they can receive broadcasts in order of preference using
+    `formats` in the auth dictionary. The chosen format is sent to the client
+    in a `format` event. Command responses are always sent as JSON.
+
+    Clients which reconnect and still have the state of their previous
+    session may resume it by setting `session` to its session ID and
+    `sequence` to the sequence number of the last broadcast which they
+    received. Such clients are sent a `resume` event, which is True if they
+    are sent the broadcasts which they missed, or False if they must fetch
+    everything again.
+
     Args:
         sessionId (str): The session ID of the corresponding connection.
         environ (dict): The web browser environment of the connection.
         auth (dict): The auth dictionary from the connection.
     '''
-    userId: None | str = None if auth is None else auth.get('token', None)
-    if userId is None:
-        environStr: bytes = str(environ.items()).encode()
-        userId = hashlib.md5(environStr, usedforsecurity=False).hexdigest()
+    startup.finish('first connection')
+    if not isinstance(auth, dict):
+        auth = dict()
+    userId: Any = auth.get('token', None)
+    if not isinstance(userId, str) or userId == '':
+        userId = secrets.token_urlsafe(16)
         await _socket.emit('userId', userId, to=sessionId)
     async with _socket.session(sessionId) as session:
         session['userId'] = userId
+    delta: bool = auth.get('delta', False) is True
+    format: str = 'json'
+    if 'formats' in auth:
+        format = Broadcaster.negotiateFormat(auth['formats'])
+        await _socket.emit('format', format, to=sessionId)
+    resume: Any = auth.get('session', None)
+    sequence: Any = auth.get('sequence', None)
+    if (not isinstance(resume, str) or not isinstance(sequence, int)
+            or isinstance(sequence, bool)):
+        resume, sequence = None, None
+    rooms: list[str] = (
+        await _primary.call('connect', sessionId, delta, format, userId,
+                            resume)
+        if _primary is not None
+        else await _connectSession(sessionId, delta, format, userId, resume))
+    for room in rooms:
+        await _socket.enter_room(sessionId, room)
+    if sequence is not None:
+        # Replay the missed broadcasts once the session is in its rooms
+        resumed: bool = (await _primary.call('replay', sessionId, sequence)
+                         if _primary is not None
+                         else await _replaySession(sessionId, sequence))
+        await _socket.emit('resume', resumed, to=sessionId)
+    _clocks[sessionId] = ClockEstimator()
+    _probes[sessionId] = asyncio.create_task(_probeClock(sessionId))
+
+
+async def _connectSession(sessionId: str, delta: bool, format: str,
+                          token: str, resume: None | str) -> list[str]:
+    return _broadcaster.connect(sessionId, delta=delta, format=format,
+                                token=token, resume=resume)
+
+
+async def _replaySession(sessionId: str, sequence: int) -> bool:
+    return _broadcaster.replay(sessionId, sequence)
+
+
+async def _handleDisconnect(sessionId: str) -> None:
+    '''Handles a socket.io disconnection event.
+
+    Args:
+        sessionId (str): The session ID of the corresponding connection.
+    '''
+    _clocks.pop(sessionId, None)
+    probe: None | asyncio.Task = _probes.pop(sessionId, None)
+    if probe is not None:
+        probe.cancel()
+    if _primary is not None:
+        await _primary.call('disconnect', sessionId)
+        return
+    _broadcaster.disconnect(sessionId)
+
+
+async def _getSnapshot(uuid: str) -> API:
+    '''Gets the most recently broadcast encoding of an object and its version
+    number. Clients in delta mode use this command to recover when they have
+    missed a version.
+
+    Args:
+        uuid (str): The UUID of the object.
+
+    Raises:
+        ClientException: if the object has not been broadcast to clients in
+        delta mode. The most recent full encoding of the object can be queried
+        using its regular command.
+
+    Returns:
+        API: The UUID, version number, and encoding of the object.
+    '''
+    snapshot: None | dict[str, Any] = _broadcaster.snapshot(uuid)
+    if snapshot is None:
+        raise ClientException(f'\'{uuid}\' has no delta version')
+    return snapshot
+
+
+async def _applyBatch(commands: list, timestamp: datetime,
+                      session: None | str) -> API:
+    '''Applies an ordered list of commands all-or-nothing, e.g. to correct a
+    Jam in a single round trip. Each command is an object with the name of the
+    command as `command` and its arguments as `args`. Every command is
+    validated before any of them is applied. If a command fails, the objects
+    which the batch refers to are restored in place to their state before the
+    batch and none of the updates of the batch are broadcast. The batch is
+    journaled as a single entry and its updates are coalesced into a single
+    flush.
+
+    Args:
+        commands (list): The commands to apply in order.
+        timestamp (datetime): The time at which the client sent the batch,
+        which is passed to every command.
+        session (None | str): The session ID of the client, which is passed to
+        every command.
+
+    Raises:
+        ClientException: if the batch is malformed, if a command is unknown
+        or is itself a batch, or if the arguments of a command are invalid.
+        RuntimeError: if the server doesn't hold the game state, so that a
+        failed batch can't be rolled back.
+
+    Returns:
+        API: The result of each command, in order.
+    '''
+    if not isinstance(commands, list):
+        raise ClientException('\'commands\' must be a list')
+    calls: list[tuple[_Command, dict[str, Any]]] = []
+    for index, item in enumerate(commands):
+        if (not isinstance(item, dict)
+                or not isinstance(item.get('command'), str)):
+            raise ClientException(f'Command {index} must be an object with a '
+                                  '\'command\' name')
+        args: Any = item.get('args', dict())
+        if not isinstance(args, dict):
+            raise ClientException(f'The args of command {index} must be an '
+                                  'object')
+        compiled: None | _Command = _commandTable.get(item['command'], None)
+        if compiled is None or compiled.func is _applyBatch:
+            raise ClientException(f'Command {index} \'{item['command']}\' '
+                                  'can\'t be batched')
+        try:
+            calls.append((compiled, compiled.bind({**args,
+                                                   'timestamp': timestamp,
+                                                   'session': session})))
+        except ClientException as e:
+            raise ClientException(f'Command {index}: {str(e)}') from e
+    if _state is None:
+        raise RuntimeError('batches require the game state')
+
+    # Only save the objects which the batch refers to, and keep the updates
+    # which were already pending before the batch
+    uris: list[URI] = [value for _, kwargs in calls
+                       for value in kwargs.values() if isinstance(value, URI)]
+    keep: int = _broadcaster.pending
+    rollback: Callable[[], None] = _state.checkpoint(uris)
+    results: list[None | Collection] = []
+    for index, (compiled, kwargs) in enumerate(calls):
+        try:
+            results.append(await compiled.func(**kwargs))
+        except Exception as e:
+            # Roll back the commands which were already applied
+            _broadcaster.discard(keep)
+            rollback()
+            log.debug('Rolled back a batch at command %s \'%s\'.', index,
+                      compiled.name)
+            if isinstance(e, ClientException):
+                raise ClientException(f'Command {index}: {str(e)}') from e
+            raise
+    return results
+
+
+async def _probeClock(sessionId: str) -> None:
+    '''Periodically probes the clock of a client to keep the estimate of its
+    offset and round-trip delay up to date. A quick burst of probes after the
+    client connects yields a usable estimate within a second. Each probe
+    carries the current estimate so that clients know their latency and can
+    convert their clock to server time, e.g. to render running Timers from
+    their anchor. Clients which never reply are no longer probed.
+
+    Args:
+        sessionId (str): The session ID of the client.
+    '''
+    estimator: ClockEstimator = _clocks[sessionId]
+    unanswered: int = 0
+    for probe in itertools.count():
+        await asyncio.sleep(ClockEstimator.PROBE_BURST_INTERVAL
+                            if probe < ClockEstimator.PROBE_BURST
+                            else ClockEstimator.PROBE_INTERVAL)
+        estimate: dict[str, None | float] = {
+            'delay': estimator.delay,
+            'offset': estimator.offset,
+        }
+        sent: float = getClock().time()
+        try:
+            # The client is connected to this process, so skip the pub/sub
+            # queue which would add its own delay to the sample
+            reply: Any = await _socket.call(
+                'clock', {key: None if value is None else value * 1000
+                          for key, value in estimate.items()},
+                to=sessionId, timeout=ClockEstimator.PROBE_TIMEOUT,
+                ignore_queue=True)
+        except socketio.exceptions.TimeoutError:
+            unanswered += 1
+            if (unanswered >= ClockEstimator.PROBE_BURST
+                    and estimator.delay is None):
+                log.debug('Session \'%s\' does not reply to clock probes.',
+                          sessionId)
+                return
+            continue
+        received: float = getClock().time()
+        if isinstance(reply, (int, float)) and not isinstance(reply, bool):
+            estimator.addSample(sent, reply / 1000, received)
+
+
+def _getTimestamp(sessionId: str, json: dict[str, Any]) -> float:
+    # Clients send the time of their clock in milliseconds as `clientTime`
+    received: float = getClock().time()
+    estimator: None | ClockEstimator = _clocks.get(sessionId, None)
+    if estimator is None:
+        return received
+    clientTime: Any = json.get('clientTime', None)
+    if (not isinstance(clientTime, (int, float))
+            or isinstance(clientTime, bool)):
+        return estimator.correct(None, received)
+    return estimator.correct(clientTime / 1000, received)
 
 
 async def _dummyHandler(*_, **__) -> None:
@@ -245,8 +1248,29 @@ async def _dummyHandler(*_, **__) -> None:
 async def _handleEvent(command: str, sessionId: str,
                        json: dict[str, Any]) -> dict[str, Any]:
     '''Handles all socket.io events except for connection, disconnection, and
-    sync. This handler looks up the received command in a command table and
-    calls the appropriate function, if it exists.
+    sync. The time at which the client sent the command is estimated from the
+    `clientTime` in the payload using the clock offset estimate of the
+    session, before the command is applied.
+
+    Args:
+        command (str): The name of the command to call.
+        sessionId (str): The session ID of the corresponding connection.
+        json (dict): The payload of the command.
+
+    Returns:
+        dict: A dictionary of the command response.
+    '''
+    timestamp: float = _getTimestamp(sessionId, json)
+    if _primary is not None:
+        return await _primary.call('event', command, sessionId, json,
+                                   timestamp)
+    return await _applyCommand(command, sessionId, json, timestamp)
+
+
+async def _applyCommand(command: str, sessionId: str, json: dict[str, Any],
+                        timestamp: float) -> dict[str, Any]:
+    '''Looks up a command in the command table and calls the appropriate
+    function, if it exists.
 
     If an exception occurs while handling a command, the traceback is logged
     using the server logger instance. If the exception was a ClientException,
@@ -255,53 +1279,43 @@ async def _handleEvent(command: str, sessionId: str,
     Args:
         command (str): The name of the command to call.
         sessionId (str): The session ID of the corresponding connection.
+        json (dict): The payload of the command.
+        timestamp (float): The server time at which the client sent the
+        command, in seconds since the epoch.
 
     Returns:
         dict: A dictionary of the command response.
     '''
-    NOW: datetime = datetime.now()
-    log.debug(f'Handling event \'{command}\' with args: {json}.')
+    start: float = time.perf_counter()
     response: dict[str, Any] = dict()
+    error: None | ERROR_KINDS = None
     try:
-        # Validate the request payload has all the required JSON keys
-        requiredKeys: tuple[str, ...] = ('latency',)
-        if not all(key in json for key in requiredKeys):
-            raise ClientException('Invalid request payload.')
-
-        # Validate the latency value is between 0 and 5 seconds
-        if not isinstance(json['latency'], int) or 0 > json['latency'] > 5000:
-            raise ClientException('Client latency is invalid')
-
         # Validate the command exists
-        if command not in _commandTable:
-            log.debug(f'The \'{command}\' handler does not exist.')
+        compiled: None | _Command = _commandTable.get(command, None)
+        if compiled is None:
+            log.debug('The \'%s\' handler does not exist.', command)
             raise ClientException(f'Unknown command \'{command}\'.')
 
         # Add commonly used arguments
-        json['timestamp'] = NOW - timedelta(milliseconds=json['latency'])
+        json['timestamp'] = datetime.fromtimestamp(timestamp)
         json['session'] = sessionId
-        if 'uri' in json.keys() and isinstance(json['uri'], dict):
-            rawURI: dict[str, Any] = json['uri']
-            if 'bout' not in rawURI:
-                raise ClientException('bout must be specified')
-            period: int = rawURI['period'] if 'period' in rawURI else -1
-            jam: int = rawURI['jam'] if 'jam' in rawURI else -1
-            json['uri'] = URI(rawURI['bout'], period, jam)
-
-        # Get the function and call it with only the required arguments
-        func: Callable[..., Awaitable[None | Collection]
-                       ] = _commandTable[command]
-        params: set[str] = set(
-            [param.name for param in inspect.signature(
-                func).parameters.values()]
-        )
-        json = {k: v for k, v in json.items() if k in params}
-        data: None | Collection = await func(**json)
+
+        # Call the function with only its validated arguments
+        kwargs: dict[str, Any] = compiled.bind(json)
+        data: None | Collection = await compiled.func(**kwargs)
+
+        # Journal the command now that it has been applied
+        if _journal is not None and not compiled.readOnly:
+            _journal.append(command, {k: v for k, v in kwargs.items()
+                                      if k not in _Command.INJECTED},
+                            json['timestamp'])
 
         # Build the response payload
         response['status'] = 'ok'
         response['data'] = data
     except (Exception, ClientException) as e:
+        error = 'client' if isinstance(e, ClientException) else 'internal'
+
         # Return the exception and exception message
         response['status'] = 'error'
         response['error'] = {
@@ -320,10 +1334,25 @@ async def _handleEvent(command: str, sessionId: str,
             fileName: str = os.path.split(
                 traceback.tb_frame.f_code.co_filename)[-1]
             lineNumber: int = traceback.tb_lineno
-            log.error(f'{type(e).__name__}: {
-                str(e)} ({fileName}, {lineNumber})')
+            log.error('%s: %s (%s, %s)', type(e).__name__, e, fileName,
+                      lineNumber)
     finally:
-        log.debug(f'Ack: {str(response)}')
+        # Unknown command names are grouped so clients can't add metrics
+        duration: float = time.perf_counter() - start
+        _metrics.observeCommand(
+            command if command in _commandTable else 'unknown', duration,
+            error)
+        if commandLog.isEnabledFor(logging.DEBUG):
+            fields: dict[str, Any] = {
+                'session': sessionId,
+                'status': response['status'],
+                'ms': round(duration * 1000, 3),
+            }
+            if error is not None:
+                fields['error'] = error
+            commandLog.debug('\'%s\' %s', command, json,
+                             extra={'fields': fields})
+        trafficLog.debug('Ack: %s', response)
         flush()
         return response
 
@@ -331,26 +1360,37 @@ async def _handleEvent(command: str, sessionId: str,
 # The server logging instance
 log: logging.Logger = logging.getLogger(__name__)
 
-_updates: set[Encodable] = set()
+# The logging instance of every command which is handled, whose messages have
+# structured fields
+commandLog: logging.Logger = log.getChild('commands')
 
-_commandTable: dict[str, Callable[..., Awaitable[None | Collection]]] = dict()
-_socket: socketio.AsyncServer = socketio.AsyncServer(cors_allowed_origins='*',
-                                                     async_mode='asgi')
+# The logging instance of the events which are sent and received many times
+# per second, of which only a sample is logged
+trafficLog: logging.Logger = log.getChild('traffic')
+_sampler: Sampler = Sampler()
+trafficLog.addFilter(_sampler)
+
+_broadcaster: Broadcaster = Broadcaster(emit)
+_metrics: Metrics = Metrics()
+_journal: None | Journal = None
+_state: None | Encodable = None
+_snapshotSequence: int = 0
+_primary: None | HubClient = None
+_clocks: dict[str, ClockEstimator] = dict()
+_probes: dict[str, asyncio.Task] = dict()
+_stopping: None | asyncio.Event = None
+_app: None | Starlette = None
+
+_commandTable: dict[str, _Command] = dict()
+_views: ViewCache = ViewCache()
+_socket: OutboxServer = OutboxServer(cors_allowed_origins='*',
+                                     async_mode='asgi')
 _socket.on('connect', _handleConnect)
-_socket.on('disconnect', _dummyHandler)
+_socket.on('disconnect', _handleDisconnect)
 _socket.on('ping', _dummyHandler)
 _socket.on('*', _handleEvent)
+register(_getSnapshot, name='snapshot', readOnly=True)
+register(_applyBatch, name='batch')
 
 _webDir: Path = Path(__file__).parent.parent.parent / 'frontend' / 'build'
-_jinja: Jinja2Templates = Jinja2Templates(directory=_webDir)
-_app: Starlette = Starlette(
-    routes=[
-        Route('/', _renderTemplate),
-        # Mount('/static', app=StaticFiles(directory=f'{_webDir}/static'),
-        # name='static'),
-        Mount('/assets', app=StaticFiles(directory=_webDir / 'assets'),
-              name='assets'),
-        Mount('/socket.io', app=socketio.ASGIApp(_socket)),
-        Route('/{file:str}', _renderTemplate),
-    ],
-)
+_frontend: Frontend = Frontend(_webDir)
@@ -0,0 +1,72 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Any
+import logging
+import msgpack
+import os
+
+
+class Snapshot:
+    '''Reads and writes snapshots of the game state. A snapshot is a
+    MessagePack document containing the state and the sequence number of the
+    last journal entry which was applied to it. Snapshots are written to a
+    temporary file which then atomically replaces the previous snapshot, so a
+    crash while writing never leaves a partial snapshot behind.
+    '''
+
+    MAGIC: bytes = b'NSOB\x01'
+
+    @staticmethod
+    def read(path: Path) -> None | tuple[int, Any]:
+        '''Reads a snapshot file.
+
+        Args:
+            path (Path): The path of the snapshot file.
+
+        Returns:
+            None | tuple: The journal sequence number and the state of the
+            snapshot, or None if the snapshot doesn't exist or is invalid.
+        '''
+        if not path.exists():
+            return None
+        data: bytes = path.read_bytes()
+        if not data.startswith(Snapshot.MAGIC):
+            log.warning(f'Ignoring the invalid snapshot \'{path}\'')
+            return None
+        try:
+            snapshot: dict[str, Any] = msgpack.unpackb(
+                memoryview(data)[len(Snapshot.MAGIC):])
+        except ValueError:
+            log.warning(f'Ignoring the corrupt snapshot \'{path}\'')
+            return None
+        return snapshot['seq'], snapshot['state']
+
+    @staticmethod
+    def write(path: Path, sequence: int, state: Any) -> int:
+        '''Writes a snapshot file. This function blocks while the snapshot is
+        written, so it should be called from a background thread.
+
+        Args:
+            path (Path): The path of the snapshot file.
+            sequence (int): The sequence number of the last journal entry which
+            was applied to the state.
+            state (Any): The state to write. The state must not be changed
+            while it is being written.
+
+        Returns:
+            int: The size of the snapshot in bytes.
+        '''
+        data: bytes = Snapshot.MAGIC + msgpack.packb({'seq': sequence,
+                                                      'state': state})
+        temporary: Path = path.with_name(f'{path.name}.tmp')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(temporary, 'wb') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, path)
+        return len(data)
+
+
+# The snapshot logging instance
+log: logging.Logger = logging.getLogger(__name__)
@@ -0,0 +1,81 @@
+from __future__ import annotations
+import logging
+import os
+import time
+
+
+class Startup:
+    '''Measures how long each phase of starting the server takes, from the
+    start of the process until the first client connection is accepted. The
+    phases are reported once, when the first connection is accepted, so that
+    slow restarts can be traced to imports, restoring the game state, or
+    binding the port. Run Python with `-X importtime` for the import time of
+    each module.
+    '''
+
+    def __init__(self) -> None:
+        '''Instantiates a new Startup. The first phase starts now.'''
+        self._last: float = time.perf_counter()
+        self._phases: list[tuple[str, float]] = []
+        self._finished: bool = False
+        age: None | float = Startup._getProcessAge()
+        if age is not None:
+            self._phases.append(('interpreter', age))
+
+    @property
+    def finished(self) -> bool:
+        return self._finished
+
+    @property
+    def phases(self) -> list[tuple[str, float]]:
+        '''The name and duration in seconds of each phase which has ended.'''
+        return list(self._phases)
+
+    def mark(self, phase: str) -> None:
+        '''Ends a phase of the startup and starts the next one. Does nothing
+        once the startup is finished.
+
+        Args:
+            phase (str): The name of the phase which ended.
+        '''
+        if self._finished:
+            return
+        now: float = time.perf_counter()
+        self._phases.append((phase, now - self._last))
+        self._last = now
+
+    def finish(self, phase: str) -> None:
+        '''Ends the last phase of the startup and logs the startup report. Is
+        cheap to call again once the startup is finished, e.g. on every
+        connection.
+
+        Args:
+            phase (str): The name of the last phase.
+        '''
+        if self._finished:
+            return
+        self.mark(phase)
+        self._finished = True
+        log.info(f'Started in {sum(s for _, s in self._phases):.3f} s ('
+                 + ', '.join(f'{name} {seconds:.3f} s'
+                             for name, seconds in self._phases) + ')')
+
+    @staticmethod
+    def _getProcessAge() -> None | float:
+        # The process start time is only available on Linux, in clock ticks
+        # since boot
+        try:
+            with open('/proc/self/stat') as file:
+                stat: str = file.read()
+            ticks: int = int(stat.rpartition(')')[2].split()[19])
+            return (time.clock_gettime(time.CLOCK_BOOTTIME)
+                    - ticks / os.sysconf('SC_CLK_TCK'))
+        except (OSError, ValueError, IndexError, AttributeError):
+            return None
+
+
+# The startup logging instance
+log: logging.Logger = logging.getLogger(__name__)
+
+# The startup of this process, which begins when this module is first imported
+startup: Startup = Startup()
@@ -0,0 +1,86 @@
+from __future__ import annotations
+from collections import OrderedDict
+from json import dumps
+from typing import Any, ClassVar, Hashable
+import hashlib
+
+
+class ViewCache:
+    '''A cache of the JSON encodings of the results of read-only commands
+    which are served over HTTP, e.g. to overlays which poll the current jam.
+    Each encoding is valid for the version of the game state from which it was
+    rendered, so polling costs a dictionary lookup until the state changes.
+
+    Each encoding has a strong ETag derived from its BLAKE2 digest, so a
+    result which changed and then changed back keeps its ETag, and a client
+    which already has it is answered with 304 Not Modified.
+    '''
+
+    # The maximum number of cached encodings
+    SIZE: ClassVar[int] = 64
+
+    def __init__(self, size: int = SIZE) -> None:
+        '''Instantiates a new, empty ViewCache.
+
+        Args:
+            size (int, optional): The maximum number of cached encodings. The
+            least recently used encoding is evicted first. Defaults to
+            `ViewCache.SIZE`.
+        '''
+        self._size: int = size
+        self._views: OrderedDict[Hashable, tuple[int, bytes, str]] = (
+            OrderedDict())
+        self._hits: int = 0
+        self._misses: int = 0
+
+    def __len__(self) -> int:
+        return len(self._views)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        '''The counters of this ViewCache. The `hits` counter is the number of
+        lookups which found an encoding of the current version, and `misses`
+        is the number of lookups which didn't.
+        '''
+        return {'hits': self._hits, 'misses': self._misses}
+
+    def get(self, key: Hashable, version: int) -> None | tuple[bytes, str]:
+        '''Gets a cached encoding if it was rendered from the current version
+        of the game state.
+
+        Args:
+            key (Hashable): The command and arguments of the result.
+            version (int): The current version of the game state.
+
+        Returns:
+            None | tuple[bytes, str]: The encoding and its ETag, or None if
+            it must be rendered.
+        '''
+        view: None | tuple[int, bytes, str] = self._views.get(key, None)
+        if view is None or view[0] != version:
+            self._misses += 1
+            return None
+        self._hits += 1
+        self._views.move_to_end(key)
+        return view[1], view[2]
+
+    def put(self, key: Hashable, version: int,
+            data: Any) -> tuple[bytes, str]:
+        '''Encodes a result and caches its encoding.
+
+        Args:
+            key (Hashable): The command and arguments of the result.
+            version (int): The version of the game state from which the result
+            was rendered.
+            data (Any): The result, which must be serializable into JSON.
+
+        Returns:
+            tuple[bytes, str]: The encoding and its ETag.
+        '''
+        body: bytes = dumps(data, separators=(',', ':')).encode()
+        etag: str = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        self._views[key] = (version, body, etag)
+        self._views.move_to_end(key)
+        while len(self._views) > self._size:
+            self._views.popitem(last=False)
+        return body, etag
@@ -86,7 +86,7 @@ class WebSocketClient(WebSocketEndpoint):
         now: datetime = datetime.now()
 
         # Log the received payload
-        log.debug(f'{payload} ({self.context.socket_id})')
+        log.debug('%s (%s)', payload, self.context.socket_id)
 
         # Instantiate a boilerplate JSON response
         response: dict[str, Any] = {
@@ -0,0 +1,62 @@
+'''Tests of batched commands. Run from the `backend/` directory, e.g.:
+
+    python -m unittest discover tests
+'''
+from pathlib import Path
+from typing import Any
+import asyncio
+import sys
+import unittest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from clock import VirtualClock, getClock, setClock  # noqa: E402
+
+setClock(VirtualClock())
+
+from roller_derby.bout import Bout, series  # noqa: E402
+import main  # noqa: E402, F401
+import scoreApi  # noqa: E402, F401
+import server  # noqa: E402
+
+server._state = series
+
+
+class BatchTest(unittest.IsolatedAsyncioTestCase):
+    async def call(self, command: str, **args: Any) -> dict[str, Any]:
+        return await server._applyCommand(command, 'test', args,
+                                          getClock().time())
+
+    async def testFailedBatchChangesNothing(self) -> None:
+        bout: Bout = series.addBout()
+        uri: dict[str, Any] = {'bout': bout.uuid, 'period': 0, 'jam': 0}
+        response: dict[str, Any] = await self.call('startJam', uri=uri)
+        self.assertEqual(response['status'], 'ok')
+        await asyncio.sleep(0)
+        server._broadcaster.discard()
+
+        before: dict[str, Any] = bout.getState()
+        bouts: int = len(series.bouts)
+        pending: int = server._broadcaster.pending
+        sent: int = server._broadcaster.stats['sent']
+        response = await self.call('batch', commands=[
+            {'command': 'addBout'},
+            {'command': 'stopJam', 'args': {'uri': uri}},
+            {'command': 'setTrip', 'args': {
+                'uri': uri, 'team': 'home', 'tripNum': 0, 'points': 4}},
+            {'command': 'setTrip', 'args': {
+                'uri': {**uri, 'bout': 'unknown'}, 'team': 'home',
+                'tripNum': 0, 'points': 4}},
+        ])
+        await asyncio.sleep(0)
+
+        self.assertEqual(response['status'], 'error')
+        self.assertEqual(bout.getState(), before)
+        self.assertEqual(len(series.bouts), bouts)
+        self.assertEqual(server._broadcaster.pending, pending)
+        self.assertEqual(server._broadcaster.stats['sent'], sent)
+        self.assertTrue(bout.jamClock.isRunning())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+'''Tests of the broadcaster. Run from the `backend/` directory, e.g.:
+
+    python -m unittest discover tests
+'''
+from pathlib import Path
+from typing import Any
+from unittest import mock
+import asyncio
+import sys
+import unittest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from broadcaster import Broadcaster  # noqa: E402
+
+
+class Counter:
+    def __init__(self, uuid: str) -> None:
+        self.uuid: str = uuid
+        self.value: int = 0
+
+    def encode(self) -> dict[str, Any]:
+        return {'uuid': self.uuid, 'value': self.value}
+
+
+class ReplayTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.sent: list[tuple[str, Any, list[str]]] = []
+        with mock.patch.object(Broadcaster, 'HISTORY', 4):
+            self.broadcaster: Broadcaster = Broadcaster(self.emit)
+        self.broadcaster.connect('previous', token='token')
+        self.broadcaster.disconnect('previous')
+
+        # Send six broadcasts, of which only the last four are kept
+        counter: Counter = Counter('counter')
+        for value in range(6):
+            counter.value = value
+            self.broadcaster.update(counter)
+            self.broadcaster.flush()
+            await asyncio.sleep(0)
+
+    async def emit(self, event: str, data: Any, *, room: list[str],
+                   key: None | str) -> None:
+        self.sent.append((event, data, room))
+
+    def resume(self) -> None:
+        self.broadcaster.connect('current', token='token', resume='previous')
+
+    async def testResumeAtOldestBroadcast(self) -> None:
+        self.resume()
+        self.assertTrue(self.broadcaster.replay('current', 2))
+        await asyncio.sleep(0)
+        self.assertEqual(self.sent[-1], (
+            'Counter', ({'uuid': 'counter', 'value': 5}, 6), ['current']))
+
+    async def testResumeBeforeOldestBroadcast(self) -> None:
+        self.resume()
+        self.assertFalse(self.broadcaster.replay('current', 1))
+
+    async def testResumeAfterLastBroadcast(self) -> None:
+        self.resume()
+        self.assertFalse(self.broadcaster.replay('current', 7))
+
+
+if __name__ == '__main__':
+    unittest.main()
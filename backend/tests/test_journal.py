@@ -0,0 +1,55 @@
+'''Tests of the command journal. Run from the `backend/` directory, e.g.:
+
+    python -m unittest discover tests
+'''
+from datetime import datetime
+from pathlib import Path
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'src'))
+
+from journal import Journal  # noqa: E402
+
+
+class JournalTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._directory: tempfile.TemporaryDirectory = (
+            tempfile.TemporaryDirectory())
+        self.path: Path = Path(self._directory.name) / 'test.journal'
+
+    def tearDown(self) -> None:
+        self._directory.cleanup()
+
+    def append(self, sequence: int, count: int) -> None:
+        journal: Journal = Journal(self.path)
+        journal.open(sequence)
+        for _ in range(count):
+            journal.append('setTrip', {'points': 4}, datetime.now())
+        journal.close()
+
+    def getSequences(self) -> list[int]:
+        return [entry['seq'] for entry in Journal.read(self.path)]
+
+    def testAppendAfterTornEntry(self) -> None:
+        self.append(0, 3)
+        with open(self.path, 'ab') as file:
+            file.write(b'{"seq":4,"command":"set')  # Crashed while writing
+        with self.assertLogs('journal', 'WARNING'):
+            self.assertEqual(self.getSequences(), [1, 2, 3])
+
+        with self.assertLogs('journal', 'WARNING'):
+            self.append(3, 1)
+        self.assertEqual(self.getSequences(), [1, 2, 3, 4])
+
+    def testAppendAfterCompleteEntries(self) -> None:
+        self.append(0, 2)
+        size: int = self.path.stat().st_size
+        self.append(2, 1)
+        self.assertGreater(self.path.stat().st_size, size)
+        self.assertEqual(self.getSequences(), [1, 2, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,17 +3,32 @@ import { useEffect, useSyncExternalStore, useState, useDeferredValue } from 'rea
 
 // Client connection variables
 var latency = 0;
-var latencyIntervalId = null;
+var clockOffset = 0;
 var userId = localStorage.getItem("userId");
-const socket = io(window.location.host, { auth: { token: userId } });
+var sessionId = null;
+var lastSequence = null;
+const socket = io(window.location.host, {
+  // Reconnections resume the previous session from the last broadcast
+  auth: (callback) => callback({
+    token: userId,
+    session: sessionId,
+    sequence: lastSequence,
+  }),
+  transports: ["websocket"],
+});
 
 // External store objects
 var isOnline = false;
 var onlineListeners = [];
 var serverStores = new Map();
 
+function getClientTime() {
+  return performance.timeOrigin + performance.now();
+}
+
 export async function sendRequest(api, payload = {}) {
-  payload.latency = latency;
+  // The server converts the client time using its estimate of the clock offset
+  payload.clientTime = getClientTime();
   return socket.emitWithAck(api, payload).then((response) => {
     if (response.status === "error") {
       throw Error("Python " + response.error.name + ": '" +
@@ -23,6 +38,13 @@ export async function sendRequest(api, payload = {}) {
   });
 }
 
+// Applies a list of [api, payload] pairs all-or-nothing in one round trip
+export async function sendBatch(requests) {
+  return sendRequest("batch", {
+    commands: requests.map(([api, args]) => ({ command: api, args: args })),
+  });
+}
+
 export function onEvent(api, callback) {
   socket.on(api, callback);
   return () => socket.off(api, callback);
@@ -124,50 +146,62 @@ export function getLatency() {
   return latency;
 }
 
-async function calculateLatency(iterations) {
-  let latencySum = 0;
-  for (let i = 0; i < iterations; i++) {
-    // Calculate the round-trip latency
-    let success = true;
-    const start = window.performance.now();
-    await socket.timeout(5000).emitWithAck("ping").then(
-      null,  // Do nothing on success
-      () => { success = false; }
-    );
-    const stop = window.performance.now();
-    if (start > stop) {
-      success = false;  // Guard against negative latency value
-    }
+export function getServerTime() {
+  return getClientTime() - clockOffset;
+}
 
-    if (success) {
-      // Add round-trip latency to the accumulator
-      latencySum += stop - start;
-    } else {
-      // Decrement the iterations value for accurate averaging
-      iterations--;
-    }
+socket.on("clock", (estimate, callback) => {
+  // Reply to the clock probes of the server with the client time. Each probe
+  // carries the round-trip delay and the offset of the client clock from the
+  // server clock estimated by the server.
+  if (estimate?.delay != null) {
+    latency = Math.round(estimate.delay / 2);
   }
-
-  // Compute one-way latency (in milliseconds) using mathematical average
-  if (iterations < 1) {
-    return;  // Avoid divide-by-zero error
+  if (estimate?.offset != null) {
+    clockOffset = estimate.offset;
   }
-  return Math.round((latencySum / iterations) / 2);
-}
-
-socket.on("connect", async () => {
-  // Update client-server latency
-  calculateLatency(10).then(newLatency => latency = newLatency);
-  latencyIntervalId = setInterval(async () => {
-    latency = await calculateLatency(10);
-  }, 25000);
+  callback(getClientTime());
+});
 
-  // Update all stores
+function refreshStores() {
   serverStores.forEach(store => {
-    if (store.isStale && !store.isPending) {
-      store.getSnapshot();
+    store.isStale = true;
+    if (!store.isPending) {
+      try {
+        store.getSnapshot();
+      } catch {
+        // The store is fetching its data
+      }
     }
   });
+}
+
+socket.on("userId", (token) => {
+  userId = token;
+  localStorage.setItem("userId", token);
+});
+
+socket.onAny((event, data, sequence) => {
+  // Broadcasts carry a sequence number after their data
+  if (typeof sequence === "number") {
+    lastSequence = Math.max(lastSequence ?? 0, sequence);
+  }
+});
+
+socket.on("resume", (resumed) => {
+  // The missed broadcasts are replayed unless the gap was too long
+  if (!resumed) {
+    refreshStores();
+  }
+});
+
+socket.on("connect", async () => {
+  // Sessions which can't be resumed fetch everything again
+  const resuming = sessionId !== null && lastSequence !== null;
+  sessionId = socket.id;
+  if (!resuming) {
+    refreshStores();
+  }
 
   // Update online listeners
   isOnline = true;
@@ -175,11 +209,6 @@ socket.on("connect", async () => {
 });
 
 socket.on("disconnect", () => {
-  clearInterval(latencyIntervalId);
-
-  // Flag stores as stale
-  serverStores.forEach(store => store.isStale = true);
-
   // Update online listeners
   isOnline = false;
   onlineListeners.forEach(cb => cb());
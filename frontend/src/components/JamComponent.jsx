@@ -1,7 +1,7 @@
 import "./JamComponent.css"
 import { React, useState, useEffect, useRef, useCallback, Suspense } from "react";
 import { sendRequest } from "../client.js";
-import { useBout, useJam, ACTION_CLOCK, GAME_CLOCK, useJamNavigation, useClock, PERIOD_CLOCK } from "../customHooks.jsx";
+import { useBout, useJam, ACTION_CLOCK, GAME_CLOCK, useJamNavigation, useClock, PERIOD_CLOCK, getElapsed } from "../customHooks.jsx";
 import Clock from "./TimerComponent.jsx"
 
 const HOME = "home";
@@ -361,7 +361,7 @@ function PeriodController({ boutUuid }) {
       </>
     );
   } else {
-    const disabled = bout.clocks.period.elapsed < bout.clocks.period.alarm
+    const disabled = getElapsed(bout.clocks.period) < bout.clocks.period.alarm
       || bout.clocks.jam.isRunning;
     return (
       <button disabled={disabled} onClick={endPeriod}>
@@ -1,4 +1,4 @@
-import useGenericStore, { getLatency } from "./client";
+import useGenericStore, { getServerTime } from "./client";
 import { useState, useEffect } from "react";
 
 // Clock constants
@@ -11,6 +11,15 @@ export const GAME_CLOCK = "game"
 export const ACTION_CLOCK = "action";
 
 
+export function getElapsed(clock) {
+  // Running clocks are sent with the server time at which they last started
+  if (clock.isRunning) {
+    return clock.elapsed + getServerTime() - clock.anchor;
+  }
+  return clock.elapsed;
+}
+
+
 export function useClock(bout, virtualType, stopAtZero = true) {
   const [lap, setLap] = useState(0);
   const [clock, setClock] = useState(null);
@@ -46,7 +55,7 @@ export function useClock(bout, virtualType, stopAtZero = true) {
     // Set the new clock and set the initial lap
     const newClock = bout.clocks[concreteType];
     setClock(newClock);
-    setLap(0);
+    setLap(getElapsed(newClock) - newClock.elapsed);
 
     // Update the clock type
     if (concreteType != type) {
@@ -60,10 +69,10 @@ export function useClock(bout, virtualType, stopAtZero = true) {
       return;
     }
 
-    const lastUpdate = Date.now() - getLatency();
-
+    // The clock is rendered from its anchor, so it doesn't drift and needs no
+    // updates from the server while it runs
     const intervalId = setInterval(() => {
-      const newLap = Date.now() - lastUpdate;
+      const newLap = getElapsed(clock) - clock.elapsed;
       if (stopAtZero && clock.alarm != null
         && clock.elapsed + newLap >= clock.alarm) {
         clearInterval(intervalId);